@@ -1 +1,4 @@
 from .instance_token import InstanceAgreement, TokenAgreement
+from .engine import InstanceAgreementEngine
+from .corpus import CorpusAgreement
+from .metrics import LabelMatrices, fleiss_kappa, krippendorff_alpha
@@ -0,0 +1,178 @@
+import sqlite3
+from typing import Union, Tuple, Dict, FrozenSet, List
+from collections import namedtuple
+
+import numpy as np
+
+from .engine import span_groups
+from .matcher import Spans, matching_pairs
+
+# the annotations of all documents in one table
+CORPUS_ANNOTATIONS_QUERY = """
+    SELECT document, annotator, type, sentence, begin, end
+    FROM {table}
+    """
+CorpusAnnotations = namedtuple('CorpusAnnotations', ['annotators', 'types', 'document', 'annotator', 'type',
+                                                     'sentence', 'begin', 'end'])
+# `tp` and `errors` (false positives + false negatives) of an annotator pair for every document; both are additive
+AgreementCounts = namedtuple('AgreementCounts', ['documents', 'tp', 'errors'])
+
+
+def micro_fscore(counts: AgreementCounts) -> float:
+    """
+    :return: the F-score of the counts summed over all documents
+    """
+    tp, errors = int(counts.tp.sum()), int(counts.errors.sum())
+    return 2 * tp / (2 * tp + errors) if 2 * tp + errors > 0 else 0.0
+
+
+def macro_fscore(counts: AgreementCounts) -> float:
+    """
+    :return: the mean of the F-scores of the documents (a document without annotations has the F-score 0)
+    """
+    if len(counts.documents) == 0:
+        return 0.0
+    denominator = 2 * counts.tp + counts.errors
+    scores = np.divide(2 * counts.tp, denominator, out=np.zeros(len(counts.documents)), where=denominator > 0)
+    return float(scores.mean())
+
+
+class CorpusAgreement:
+    def __init__(self, documents: list, db_connection: sqlite3.Connection):
+        """
+        Computes the instance and token agreement counts of every document at once: the annotations of a table are
+        read with one query and kept as arrays; the counts of a type group are derived with grouped array
+        reductions (and `matching_pairs` for the token matches). The counts are those of
+        `InstanceAgreement` and `TokenAgreement` for a single annotator pair.
+
+        :param documents: ids of the documents; annotations of other documents are ignored
+        :param db_connection:
+        """
+        self.db = db_connection
+        self.documents = [str(d) for d in documents]
+        self._document_index = {d: i for i, d in enumerate(self.documents)}
+        self._annotations: Dict[str, CorpusAnnotations] = dict()
+        self._instance_groups = dict()
+        self._token_groups = dict()
+
+    @staticmethod
+    def _type_ids(instance_type: Union[str, int, list, set]) -> FrozenSet[str]:
+        return frozenset([str(instance_type)] if isinstance(instance_type, (str, int))
+                         else [str(t) for t in instance_type])
+
+    def annotations(self, table: str) -> CorpusAnnotations:
+        if table not in self._annotations:
+            rows = [row for row in self.db.execute(CORPUS_ANNOTATIONS_QUERY.format(table=table)).fetchall()
+                    if str(row[0]) in self._document_index]
+            columns = list(zip(*rows)) if len(rows) > 0 else [()] * 6
+            annotators, annotator_codes = np.unique(np.array([str(v) for v in columns[1]], dtype=str),
+                                                    return_inverse=True)
+            types, type_codes = np.unique(np.array([str(v) for v in columns[2]], dtype=str), return_inverse=True)
+            _, sentence_codes = np.unique(np.array([str(v) for v in columns[3]], dtype=str), return_inverse=True)
+            self._annotations[table] = CorpusAnnotations(
+                annotators=[str(a) for a in annotators], types=[str(t) for t in types],
+                document=np.array([self._document_index[str(v)] for v in columns[0]], dtype=np.int64),
+                annotator=annotator_codes.astype(np.int64), type=type_codes.astype(np.int64),
+                sentence=sentence_codes.astype(np.int64),
+                begin=np.array(columns[4], dtype=np.int64), end=np.array(columns[5], dtype=np.int64))
+        return self._annotations[table]
+
+    def _type_mask(self, annotations: CorpusAnnotations, type_ids: FrozenSet[str]) -> np.ndarray:
+        return np.isin(annotations.type, [i for i, t in enumerate(annotations.types) if t in type_ids])
+
+    def _per_annotator(self, keys: np.ndarray, n_keys: int, annotator: np.ndarray, n: int) -> np.ndarray:
+        # `key x annotator` matrix of the number of annotations
+        return np.bincount(keys * n + annotator, minlength=n_keys * n).reshape(n_keys, n)
+
+    def _instance_group_counts(self, table: str, type_ids: FrozenSet[str]) -> Tuple[np.ndarray, np.ndarray]:
+        # the annotations of every span (sentence, begin, end) per annotator and the document of every span
+        if (table, type_ids) not in self._instance_groups:
+            annotations = self.annotations(table)
+            mask = self._type_mask(annotations, type_ids)
+            groups, n_groups = span_groups(annotations.sentence[mask], annotations.begin[mask],
+                                           annotations.end[mask])
+            group_document = np.zeros(n_groups, dtype=np.int64)
+            group_document[groups] = annotations.document[mask]
+            self._instance_groups[(table, type_ids)] = (
+                self._per_annotator(groups, n_groups, annotations.annotator[mask], len(annotations.annotators)),
+                group_document)
+        return self._instance_groups[(table, type_ids)]
+
+    def _columns(self, counts: np.ndarray, annotators: List[str], annotator_a: str, annotator_b: str) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        # the counts of both annotators (zeros for an annotator without annotations)
+        def column(annotator: str) -> np.ndarray:
+            return counts[:, annotators.index(annotator)] if annotator in annotators \
+                else np.zeros(counts.shape[0], dtype=np.int64)
+        return column(str(annotator_a)), column(str(annotator_b))
+
+    def instance_counts(self, annotator_a: str, annotator_b: str, instance_type: Union[str, int, list, set],
+                        table: str) -> AgreementCounts:
+        """
+        :return: the instance agreement counts of the pair for every document (see `InstanceAgreement`): a span
+         with exactly two annotations of the pair is a match, a span with exactly one an error
+        """
+        counts, group_document = self._instance_group_counts(table, self._type_ids(instance_type))
+        count_a, count_b = self._columns(counts, self.annotations(table).annotators, annotator_a, annotator_b)
+        total = count_a + count_b
+        return AgreementCounts(
+            documents=self.documents,
+            tp=np.bincount(group_document, weights=total == 2, minlength=len(self.documents)).astype(np.int64),
+            errors=np.bincount(group_document, weights=total == 1, minlength=len(self.documents)).astype(np.int64))
+
+    def _token_group_counts(self, table: str, type_ids: FrozenSet[str]) \
+            -> Tuple[np.ndarray, np.ndarray, Dict[Tuple[str, str], np.ndarray]]:
+        # the annotations of every sentence per annotator, the document of every sentence and the matches of every
+        # ordered annotator pair per document
+        if (table, type_ids) not in self._token_groups:
+            annotations = self.annotations(table)
+            mask = self._type_mask(annotations, type_ids)
+            sentences, sentence_codes = np.unique(annotations.sentence[mask], return_inverse=True)
+            sentence_document = np.zeros(len(sentences), dtype=np.int64)
+            sentence_document[sentence_codes] = annotations.document[mask]
+            matches = dict()
+            # the matches (one annotation contains the other) of every ordered annotator pair per document
+            spans = [Spans(id=np.flatnonzero(mask & (annotations.annotator == i)),
+                           sentence=annotations.sentence[mask & (annotations.annotator == i)],
+                           begin=annotations.begin[mask & (annotations.annotator == i)],
+                           end=annotations.end[mask & (annotations.annotator == i)])
+                     for i in range(len(annotations.annotators))]
+            for i, annotator_a in enumerate(annotations.annotators):
+                for j, annotator_b in enumerate(annotations.annotators[i + 1:], start=i + 1):
+                    index_a, _ = matching_pairs(spans[i], spans[j])
+                    matches[(annotator_a, annotator_b)] = matches[(annotator_b, annotator_a)] = np.bincount(
+                        annotations.document[spans[i].id[index_a]], minlength=len(self.documents)).astype(np.int64)
+            self._token_groups[(table, type_ids)] = (
+                self._per_annotator(sentence_codes, len(sentences), annotations.annotator[mask],
+                                    len(annotations.annotators)),
+                sentence_document, matches)
+        return self._token_groups[(table, type_ids)]
+
+    def token_counts(self, annotator_a: str, annotator_b: str, instance_type: Union[str, int, list, set],
+                     table: str) -> AgreementCounts:
+        """
+        :return: the token agreement counts of the pair for every document (see `TokenAgreement`): every pair of
+         annotations of the same sentence where one contains the other is a match, every other pair of the same
+         sentence and every annotation in a sentence the other annotator didn't annotate is an error
+        """
+        counts, sentence_document, matches = self._token_group_counts(table, self._type_ids(instance_type))
+        count_a, count_b = self._columns(counts, self.annotations(table).annotators, annotator_a, annotator_b)
+        tp = matches.get((str(annotator_a), str(annotator_b)), np.zeros(len(self.documents), dtype=np.int64))
+        sentence_errors = count_a * count_b + np.where(count_b == 0, count_a, 0) + np.where(count_a == 0, count_b, 0)
+        errors = np.bincount(sentence_document, weights=sentence_errors, minlength=len(self.documents))
+        return AgreementCounts(documents=self.documents, tp=tp, errors=errors.astype(np.int64) - tp)
+
+    def fscores(self, annotators: list, instance_type: Union[str, int, list, set], table: str,
+                token: bool = False) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """
+        :param annotators: the annotator ids; every combination of two of them is scored
+        :param token: token instead of instance agreement
+        :return: `dict((annotator_a, annotator_b): (micro F-score, macro F-score))`
+        """
+        counts = self.token_counts if token else self.instance_counts
+        scores = dict()
+        for i, annotator_a in enumerate(annotators):
+            for annotator_b in annotators[i + 1:]:
+                pair_counts = counts(annotator_a, annotator_b, instance_type, table)
+                scores[(annotator_a, annotator_b)] = (micro_fscore(pair_counts), macro_fscore(pair_counts))
+        return scores
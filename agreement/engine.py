@@ -0,0 +1,123 @@
+import sqlite3
+from typing import Union, Tuple, Dict, FrozenSet
+from collections import namedtuple
+
+import numpy as np
+
+# the annotations of one document in one table; the composite (document, type, annotator, sentence, begin, end)
+# index of the entity tables covers the query
+ANNOTATIONS_QUERY = """
+    SELECT annotator, type, sentence, begin, end
+    FROM {table}
+    WHERE document = ?
+    """
+
+DocumentAnnotations = namedtuple('DocumentAnnotations', ['annotators', 'types', 'annotator', 'type', 'sentence',
+                                                         'begin', 'end'])
+PairCounts = namedtuple('PairCounts', ['annotators', 'tp', 'only', 'single', 'double'])
+
+
+def load_annotations(db_connection: sqlite3.Connection, doc_id: str, table: str) -> DocumentAnnotations:
+    """
+    Reads the annotations of a document into arrays: annotators, types and sentences are replaced by integer codes
+    (`annotators` and `types` hold the ids of the codes as strings).
+
+    :param db_connection:
+    :param doc_id:
+    :param table: an entity table
+    :return:
+    """
+    rows = db_connection.execute(ANNOTATIONS_QUERY.format(table=table), (doc_id,)).fetchall()
+    columns = list(zip(*rows)) if len(rows) > 0 else [()] * 5
+    annotators, annotator_codes = np.unique(np.array([str(v) for v in columns[0]], dtype=str), return_inverse=True)
+    types, type_codes = np.unique(np.array([str(v) for v in columns[1]], dtype=str), return_inverse=True)
+    _, sentence_codes = np.unique(np.array([str(v) for v in columns[2]], dtype=str), return_inverse=True)
+    return DocumentAnnotations(annotators=[str(a) for a in annotators], types=[str(t) for t in types],
+                               annotator=annotator_codes.astype(np.int64), type=type_codes.astype(np.int64),
+                               sentence=sentence_codes.astype(np.int64),
+                               begin=np.array(columns[3], dtype=np.int64), end=np.array(columns[4], dtype=np.int64))
+
+
+def span_groups(sentence: np.ndarray, begin: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    :return: the group of every annotation (annotations with the same sentence, begin and end share a group) and
+     the number of groups
+    """
+    if len(sentence) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    order = np.lexsort((end, begin, sentence))
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (np.diff(sentence[order]) != 0) | (np.diff(begin[order]) != 0) | (np.diff(end[order]) != 0)
+    groups = np.empty(len(order), dtype=np.int64)
+    groups[order] = np.cumsum(new_group) - 1
+    return groups, int(new_group.sum())
+
+
+def pair_counts(annotations: DocumentAnnotations, type_ids: FrozenSet[str]) -> PairCounts:
+    """
+    Counts the instance agreement of every annotator pair at once. The annotations of the given types are grouped
+    by span (sentence, begin, end) into a `span x annotator` matrix of annotation counts; a span that holds exactly
+    two annotations of a pair is a match, a span that holds exactly one is annotated by one annotator only.
+    Both are reductions of indicator matrices (count == 0, 1, 2) to `annotator x annotator` matrices.
+
+    :param annotations: see `load_annotations`
+    :param type_ids: the types that are compared with each other (a span annotated with any two of them matches)
+    :return: `tp[i, j]`, the matches of annotators i and j, and `only[i, j]`, the spans only annotator i annotated
+     when compared with annotator j (i.e. the false negatives of the pair (i, j) and the false positives of (j, i));
+     `single[i]` and `double[i]` are the spans annotator i annotated once and twice (what it is compared with an
+     annotator that has no annotations)
+    """
+    n = len(annotations.annotators)
+    type_mask = np.isin(annotations.type, [i for i, t in enumerate(annotations.types) if t in type_ids])
+    groups, n_groups = span_groups(annotations.sentence[type_mask], annotations.begin[type_mask],
+                                   annotations.end[type_mask])
+    counts = np.bincount(groups * n + annotations.annotator[type_mask], minlength=n_groups * n).reshape(n_groups, n)
+    none, one, two = (counts == 0).astype(np.int64), (counts == 1).astype(np.int64), (counts == 2).astype(np.int64)
+    return PairCounts(annotators=annotations.annotators,
+                      tp=one.T @ one + two.T @ none + none.T @ two,
+                      only=one.T @ none, single=one.sum(axis=0), double=two.sum(axis=0))
+
+
+class InstanceAgreementEngine:
+    def __init__(self, doc_id: str, db_connection: sqlite3.Connection):
+        """
+        Computes the instance agreement counts of a document for every annotator pair: the annotations of a table
+        are read once (see `load_annotations`) and the counts of a type group are computed for all pairs in one
+        pass (see `pair_counts`); both are kept.
+
+        :param doc_id:
+        :param db_connection:
+        """
+        self.db = db_connection
+        self.doc_id = doc_id
+        self._annotations: Dict[str, DocumentAnnotations] = dict()
+        self._counts: Dict[Tuple[str, FrozenSet[str]], PairCounts] = dict()
+
+    def annotations(self, table: str) -> DocumentAnnotations:
+        if table not in self._annotations:
+            self._annotations[table] = load_annotations(self.db, self.doc_id, table)
+        return self._annotations[table]
+
+    def counts(self, instance_type: Union[str, int, list, set], table: str) -> PairCounts:
+        type_ids = frozenset([str(instance_type)] if isinstance(instance_type, (str, int))
+                             else [str(t) for t in instance_type])
+        if (table, type_ids) not in self._counts:
+            self._counts[(table, type_ids)] = pair_counts(self.annotations(table), type_ids)
+        return self._counts[(table, type_ids)]
+
+    def pair(self, annotator_a: str, annotator_b: str, instance_type: Union[str, int, list, set],
+             table: str) -> Tuple[int, int, int]:
+        """
+        :return: `(tp, fp, fn)` of the pair; annotator b is compared against annotator a (an annotator without
+         annotations in the table has none)
+        """
+        counts = self.counts(instance_type, table)
+        a = counts.annotators.index(str(annotator_a)) if str(annotator_a) in counts.annotators else None
+        b = counts.annotators.index(str(annotator_b)) if str(annotator_b) in counts.annotators else None
+        if a is not None and b is not None:
+            return int(counts.tp[a, b]), int(counts.only[b, a]), int(counts.only[a, b])
+        if a is not None:
+            return int(counts.double[a]), 0, int(counts.single[a])
+        if b is not None:
+            return int(counts.double[b]), int(counts.single[b]), 0
+        return 0, 0, 0
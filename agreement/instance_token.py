@@ -3,39 +3,31 @@ from typing import Union
 from collections import namedtuple, defaultdict
 from itertools import combinations
 
+from .engine import InstanceAgreementEngine
+from .matcher import load_spans, same_sentence_pairs
+
+# TEMP table that holds the ids of `TokenAgreement.same_sentence_token_ids` for `_different_sentence_query`; the temp
+# database belongs to the connection (and is writable also if the database file is opened read-only)
+MATCHED_IDS_TABLE = "temp.token_agreement_matched_ids"
+
+
+def _id_list(ids: Union[str, int, list, set]) -> list:
+    # ids are compared and joined as strings; a database with the compact schema returns them as integers
+    return [str(ids)] if isinstance(ids, (str, int)) else [str(i) for i in ids]
+
 
 class InstanceAgreement:
     def __init__(self, annotators: list, doc_id: str, db_connection: sqlite3.Connection):
         # ToDo: for larger processing: list of documents?
         self.db = db_connection
-        self.annotators = sorted(annotators)
-        self.all_instance_dict = defaultdict(dict)
+        self.annotators = sorted(_id_list(annotators))
         self.doc_id = doc_id
+        self.engine = InstanceAgreementEngine(doc_id, db_connection)
 
-    def _instance_map_dict_key(self, annotators: list, instance_type: Union[str, list], table: str):
-        # ToDo: make "table" dependent on instance type?!
-        a_type = [instance_type] if isinstance(instance_type, str) else instance_type
-        key = "ann:{}_inst:{}_table:{}".format("-".join(sorted(annotators)), "-".join(sorted(a_type)), table)
-        if key not in self.all_instance_dict.keys():
-            self.all_instance_dict[key]["instances"] = [m for m in self._all_instances(
-                annotators[0], annotators[1], instance_type, table)]
-        return key
-
-    def _all_instances(self, a_id1: str, a_id2: str, instance_type: Union[str, list], table: str):
-        Instances = namedtuple("Instances", "annotators, instance_txt, count")
-        a_type = [instance_type] if isinstance(instance_type, str) else instance_type
-        cursor = self.db.cursor()
-        cursor.execute(
-            """
-            SELECT group_concat(annotator, "?"), group_concat(text, "?"), count(annotator)
-            FROM {0}
-            WHERE type in ({4})
-             AND (annotator = '{1}' OR annotator = '{2}')
-             AND document = '{3}'
-            GROUP BY begin, end, sentence
-            """.format(table, a_id1, a_id2, self.doc_id, ",".join("'{0}'".format(t) for t in a_type))
-        )
-        return map(Instances._make, cursor.fetchall())
+    def _pair_counts(self, instance_type: Union[str, list], annotators: list, table: str):
+        # (tp, fp, fn) of all combinations of two annotators; every type group is counted once for all pairs
+        return [self.engine.pair(comb[0], comb[1], instance_type, table)
+                for comb in combinations(_id_list(annotators), 2)]
 
     def true_positives(self, instance_type: Union[str, list], annotators: list, table: str):
         """
@@ -46,49 +38,13 @@ class InstanceAgreement:
         :param table:
         :return:
         """
-        tp_all = 0
-        for comb in combinations(annotators, 2):
-            tp_comb = 0
-            key = self._instance_map_dict_key(comb, instance_type, table)
-            if not self.all_instance_dict.get(key).get("tp", None):
-                for _instance in self.all_instance_dict[key]["instances"]:
-                    if _instance.count == 2:
-                        tp_comb += 1
-                self.all_instance_dict[key]["tp"] = tp_comb
-                tp_all += tp_comb
-            else:
-                tp_all += self.all_instance_dict[key]["tp"]
-        return tp_all
+        return sum(tp for tp, _, _ in self._pair_counts(instance_type, annotators, table))
 
     def false_positives(self, instance_type: Union[str, list], annotators: list, table: str):
-        fp_all = 0
-        for comb in combinations(annotators, 2):
-            fp_comb = 0
-            key = self._instance_map_dict_key(comb, instance_type, table)
-            if not self.all_instance_dict.get(key).get("fp", None):
-                for _instance in self.all_instance_dict[key]["instances"]:
-                    if _instance.count == 1 and _instance.annotators == comb[1]:
-                        fp_comb += 1
-                self.all_instance_dict[key]["fp"] = fp_comb
-                fp_all += fp_comb
-            else:
-                fp_all += self.all_instance_dict[key]["fp"]
-        return fp_all
+        return sum(fp for _, fp, _ in self._pair_counts(instance_type, annotators, table))
 
     def false_negatives(self, instance_type: Union[str, list], annotators: list, table: str):
-        fn_all = 0
-        for comb in combinations(annotators, 2):
-            fn_comb = 0
-            key = self._instance_map_dict_key(comb, instance_type, table)
-            if not self.all_instance_dict.get(key).get("fn", None):
-                for _instance in self.all_instance_dict[key]["instances"]:
-                    if _instance.count == 1 and _instance.annotators == comb[0]:
-                        fn_comb += 1
-                self.all_instance_dict[key]["fn"] = fn_comb
-                fn_all += fn_comb
-            else:
-                fn_all += self.all_instance_dict[key]["fn"]
-        return fn_all
+        return sum(fn for _, _, fn in self._pair_counts(instance_type, annotators, table))
 
     def agreement_fscore(self, instance_type: Union[str, list], annotators: list, table: str,
                          rounded: Union[int, None] = None):
@@ -104,22 +60,32 @@ class InstanceAgreement:
 
 
 class TokenAgreement:
-    def __init__(self, annotators: list, doc_id: str, db_connection: sqlite3.Connection):
+    def __init__(self, annotators: list, doc_id: str, db_connection: sqlite3.Connection, use_matcher: bool = True):
+        """
+        :param annotators:
+        :param doc_id:
+        :param db_connection:
+        :param use_matcher: pair the annotations of a sentence with `same_sentence_pairs` instead of the self-join of
+         `_same_sentence_query` (both find the same pairs)
+        """
         # ToDo: for larger processing: list of documents?
         self.db = db_connection
-        self.annotators = sorted(annotators)
+        self.annotators = sorted(_id_list(annotators))
         self.doc_id = doc_id
         self.all_token_dict = defaultdict(dict)
         self.same_sentence_token_ids = set()
+        self.use_matcher = use_matcher
+        self._matches = dict()
 
     def _token_map_dict_key(self, annotators: list, instance_type: Union[str, list], table: str):
         # ToDo: make "table" dependent on instance type?!
-        a_type = [instance_type] if isinstance(instance_type, str) else instance_type
-        return "ann:{}_inst:{}_table:{}".format("-".join(sorted(annotators)), "-".join(sorted(a_type)), table)
+        a_type = _id_list(instance_type)
+        return "ann:{}_inst:{}_table:{}".format("-".join(sorted(_id_list(annotators))), "-".join(sorted(a_type)),
+                                                table)
 
     def _same_sentence_query(self, annotators: list, annotation_types: list, table: str, between: bool):
         return """
-        SELECT a.id, b.id, a.begin, b.begin, a.end, b.end, a.text, b.text
+        SELECT a.id, b.id, a.begin, b.begin, a.end, b.end
         FROM {table} a
         INNER JOIN {table} b
         WHERE (a.type in ({annotation_types}) AND b.type in ({annotation_types}))
@@ -137,29 +103,80 @@ class TokenAgreement:
                    document_id=self.doc_id, annotator_a=annotators[0], annotator_b=annotators[1],
                    between="" if between else "NOT")
 
+    def _spans_and_pairs(self, annotators: list, annotation_types: list, table: str):
+        # the spans of both annotators and their pairs of the same sentence (see `same_sentence_pairs`)
+        key = (tuple(annotators), frozenset(annotation_types), table)
+        if key not in self._matches:
+            spans_a, spans_b = (load_spans(self.db, self.doc_id, annotator, frozenset(annotation_types), table)
+                                for annotator in annotators)
+            self._matches[key] = (spans_a, spans_b, same_sentence_pairs(spans_a, spans_b))
+        return self._matches[key]
+
+    def _same_sentence_rows(self, annotators: list, annotation_types: list, table: str, between: bool) -> list:
+        # `(a.id, b.id, a.begin, b.begin, a.end, b.end)` of the pairs `_same_sentence_query` selects
+        if not self.use_matcher:
+            cursor = self.db.cursor()
+            cursor.execute(self._same_sentence_query(annotators, annotation_types, table, between))
+            return cursor.fetchall()
+        spans_a, spans_b, (index_a, index_b, matches) = self._spans_and_pairs(annotators, annotation_types, table)
+        selected = matches if between else ~matches
+        index_a, index_b = index_a[selected], index_b[selected]
+        return list(zip(spans_a.id[index_a].tolist(), spans_b.id[index_b].tolist(),
+                        spans_a.begin[index_a].tolist(), spans_b.begin[index_b].tolist(),
+                        spans_a.end[index_a].tolist(), spans_b.end[index_b].tolist()))
+
     def _different_sentence_query(self, annotators: list, annotation_types: list, table: str):
+        # the ids of `same_sentence_token_ids` are looked up in `MATCHED_IDS_TABLE` (see `store_matched_ids`) by
+        # its primary key, so the statement neither grows with the ids nor compares every row with every id
         return """
         SELECT id
-        FROM {table}
-        WHERE id not in ({ids})
+        FROM {table} t
+        WHERE NOT EXISTS (SELECT 1 FROM {matched_ids} m WHERE m.id = t.id)
         AND document = {document_id}
         AND (annotator = {annotator_a} OR annotator = {annotator_b})
         AND type in ({annotation_types})
         """.format(annotation_types=",".join("'{0}'".format(t) for t in annotation_types), table=table,
-                   document_id=self.doc_id, annotator_a=annotators[0], annotator_b=annotators[1],
-                   ids=",".join("'{0}'".format(i) for i in self.same_sentence_token_ids))
+                   matched_ids=MATCHED_IDS_TABLE, document_id=self.doc_id, annotator_a=annotators[0],
+                   annotator_b=annotators[1])
+
+    def store_matched_ids(self) -> None:
+        """
+        Writes `same_sentence_token_ids` into `MATCHED_IDS_TABLE`, replacing what it held before. A read-only
+        connection (`PRAGMA query_only`) is opened up for these writes only.
+
+        :return:
+        """
+        cursor = self.db.cursor()
+        query_only = cursor.execute("PRAGMA query_only").fetchone()[0]
+        cursor.execute("PRAGMA query_only = OFF")
+        try:
+            cursor.execute("CREATE TABLE IF NOT EXISTS {0} (id PRIMARY KEY) WITHOUT ROWID".format(MATCHED_IDS_TABLE))
+            cursor.execute("DELETE FROM {0}".format(MATCHED_IDS_TABLE))
+            cursor.executemany("INSERT INTO {0} (id) VALUES (?)".format(MATCHED_IDS_TABLE),
+                               [(i,) for i in self.same_sentence_token_ids])
+            cursor.connection.commit()
+        finally:
+            cursor.execute("PRAGMA query_only = {0}".format(query_only))
+
+    def _different_sentence_rows(self, annotators: list, annotation_types: list, table: str) -> list:
+        # `(id,)` of the annotations of both annotators that aren't in `same_sentence_token_ids`
+        if not self.use_matcher:
+            self.store_matched_ids()
+            cursor = self.db.cursor()
+            cursor.execute(self._different_sentence_query(annotators, annotation_types, table))
+            return cursor.fetchall()
+        spans_a, spans_b, _ = self._spans_and_pairs(annotators, annotation_types, table)
+        return [(i,) for i in spans_a.id.tolist() + spans_b.id.tolist() if i not in self.same_sentence_token_ids]
 
     def true_positives(self, instance_type: Union[str, list], annotators: list, table: str):
-        a_type = [instance_type] if isinstance(instance_type, str) else instance_type
-        annotators = sorted(annotators)
+        a_type = _id_list(instance_type)
+        annotators = sorted(_id_list(annotators))
         tp_all = 0
         for comb in combinations(annotators, 2):
             key = self._token_map_dict_key(comb, instance_type, table)
             if key not in self.all_token_dict.keys() or not self.all_token_dict[key].get('tp', None):
-                Annotations = namedtuple("Annotations", "a_id, b_id, a_begin, b_begin, a_end, b_end, a_text, b_text")
-                cursor = self.db.cursor()
-                cursor.execute(self._same_sentence_query(comb, a_type, table, True))
-                l_map = list(map(Annotations._make, cursor.fetchall()))
+                Annotations = namedtuple("Annotations", "a_id, b_id, a_begin, b_begin, a_end, b_end")
+                l_map = list(map(Annotations._make, self._same_sentence_rows(comb, a_type, table, True)))
                 self.all_token_dict[key]['tp'] = l_map
                 for t in l_map:
                     self.same_sentence_token_ids.add(t.a_id)
@@ -168,16 +185,14 @@ class TokenAgreement:
         return tp_all
 
     def false_same_sentence(self, instance_type: Union[str, list], annotators: list, table: str):
-        a_type = [instance_type] if isinstance(instance_type, str) else instance_type
-        annotators = sorted(annotators)
+        a_type = _id_list(instance_type)
+        annotators = sorted(_id_list(annotators))
         fss_all = 0
         for comb in combinations(annotators, 2):
             key = self._token_map_dict_key(comb, instance_type, table)
             if key not in self.all_token_dict.keys() or not self.all_token_dict[key].get('fss', None):
-                Annotations = namedtuple("Annotations", "a_id, b_id, a_begin, b_begin, a_end, b_end, a_text, b_text")
-                cursor = self.db.cursor()
-                cursor.execute(self._same_sentence_query(comb, a_type, table, False))
-                l_map = list(map(Annotations._make, cursor.fetchall()))
+                Annotations = namedtuple("Annotations", "a_id, b_id, a_begin, b_begin, a_end, b_end")
+                l_map = list(map(Annotations._make, self._same_sentence_rows(comb, a_type, table, False)))
                 self.all_token_dict[key]['fss'] = l_map
                 for t in l_map:
                     self.same_sentence_token_ids.add(t.a_id)
@@ -186,8 +201,8 @@ class TokenAgreement:
         return fss_all
 
     def false_others(self, instance_type: Union[str, list], annotators: list, table: str):
-        a_type = [instance_type] if isinstance(instance_type, str) else instance_type
-        annotators = sorted(annotators)
+        a_type = _id_list(instance_type)
+        annotators = sorted(_id_list(annotators))
         fo_all = 0
         self.true_positives(instance_type, annotators, table)
         self.false_same_sentence(instance_type, annotators, table)
@@ -195,9 +210,7 @@ class TokenAgreement:
             key = self._token_map_dict_key(comb, instance_type, table)
             if key not in self.all_token_dict.keys() or not self.all_token_dict[key].get('fo', None):
                 Annotations = namedtuple("Annotations", "id")
-                cursor = self.db.cursor()
-                cursor.execute(self._different_sentence_query(comb, a_type, table))
-                l_map = list(map(Annotations._make, cursor.fetchall()))
+                l_map = list(map(Annotations._make, self._different_sentence_rows(comb, a_type, table)))
                 self.all_token_dict[key]['fo'] = l_map
             fo_all += len(self.all_token_dict[key]['fo'])
         return fo_all
@@ -0,0 +1,113 @@
+import sqlite3
+from typing import Tuple, FrozenSet
+from collections import namedtuple
+
+import numpy as np
+
+# the spans of one annotator in one document; the composite (document, type, annotator, sentence, begin, end) index
+# of the entity tables covers the filter
+SPANS_QUERY = """
+    SELECT id, sentence, begin, end
+    FROM {table}
+    WHERE document = ? AND annotator = ? AND type IN ({types})
+    """
+
+Spans = namedtuple('Spans', ['id', 'sentence', 'begin', 'end'])
+
+
+def load_spans(db_connection: sqlite3.Connection, doc_id: str, annotator: str, type_ids: FrozenSet[str],
+               table: str) -> Spans:
+    """
+    :param db_connection:
+    :param doc_id:
+    :param annotator:
+    :param type_ids: the types of the spans
+    :param table: an entity table
+    :return: the spans of the annotator; `id` and `sentence` keep the values of the database
+    """
+    if len(type_ids) == 0:
+        return Spans(id=np.zeros(0, dtype=object), sentence=np.zeros(0, dtype=object),
+                     begin=np.zeros(0, dtype=np.int64), end=np.zeros(0, dtype=np.int64))
+    rows = db_connection.execute(SPANS_QUERY.format(table=table, types=",".join(["?"] * len(type_ids))),
+                                 (doc_id, annotator) + tuple(sorted(type_ids))).fetchall()
+    columns = list(zip(*rows)) if len(rows) > 0 else [()] * 4
+    return Spans(id=np.array(columns[0], dtype=object), sentence=np.array(columns[1], dtype=object),
+                 begin=np.array(columns[2], dtype=np.int64), end=np.array(columns[3], dtype=np.int64))
+
+
+def _ranges(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # `(i, k)` for every position k in `[lo[i], hi[i])`
+    counts = np.maximum(hi - lo, 0)
+    owner = np.repeat(np.arange(len(lo), dtype=np.int64), counts)
+    offsets = np.arange(int(counts.sum()), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(lo, counts) + offsets
+
+
+def _contained(outer_key: Tuple[np.ndarray, np.ndarray, np.ndarray],
+               inner_key: Tuple[np.ndarray, np.ndarray, np.ndarray], width: int) -> Tuple[np.ndarray, np.ndarray]:
+    # `(outer, inner)` of every inner span that lies within an outer span of the same sentence: the inner spans are
+    # sorted by (sentence, begin), so the candidates of an outer span are the ones that begin inside of it
+    outer_sentence, outer_begin, outer_end = outer_key
+    inner_sentence, inner_begin, inner_end = inner_key
+    inner_position = inner_sentence * width + inner_begin
+    order = np.argsort(inner_position, kind="stable")
+    sorted_position = inner_position[order]
+    lo = np.searchsorted(sorted_position, outer_sentence * width + outer_begin, side="left")
+    hi = np.searchsorted(sorted_position, outer_sentence * width + outer_end, side="right")
+    outer, position = _ranges(lo, hi)
+    inner = order[position]
+    inside = (inner_end[inner] >= outer_begin[outer]) & (inner_end[inner] <= outer_end[outer])
+    return outer[inside], inner[inside]
+
+
+def _sentence_codes(a: Spans, b: Spans) -> Tuple[np.ndarray, np.ndarray]:
+    _, sentences = np.unique(np.concatenate([a.sentence, b.sentence]).astype(str), return_inverse=True)
+    sentences = sentences.astype(np.int64)
+    return sentences[:len(a.id)], sentences[len(a.id):]
+
+
+def matching_pairs(a: Spans, b: Spans) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the pairs of spans of two annotators where one span contains the other within the same sentence (both
+    bounds inclusive, as `BETWEEN`): the spans are sorted by (sentence, begin) once and the matches of a span are
+    found by binary search among the spans that begin inside of it, i.e. in O((n + m) log(n + m)) plus the number
+    of overlapping pairs.
+
+    :param a: the spans of annotator a
+    :param b: the spans of annotator b
+    :return: `(a_index, b_index)` of every match, ordered by (a_index, b_index)
+    """
+    a_sentence, b_sentence = _sentence_codes(a, b)
+    # the bounds are relative to the sentence and may be negative (a span that starts before its sentence); they
+    # are shifted to begin at 0, so that spans of different sentences never share a position key
+    low = int(min(a.begin.min(initial=0), b.begin.min(initial=0), a.end.min(initial=0), b.end.min(initial=0)))
+    width = int(max(a.end.max(initial=0), b.end.max(initial=0),
+                    a.begin.max(initial=0), b.begin.max(initial=0))) - low + 2
+    a_key = (a_sentence, a.begin - low, a.end - low)
+    b_key = (b_sentence, b.begin - low, b.end - low)
+    a_outer, b_inner = _contained(a_key, b_key, width)
+    b_outer, a_inner = _contained(b_key, a_key, width)
+    matched = np.unique(np.concatenate([a_outer * len(b.id) + b_inner, a_inner * len(b.id) + b_outer]))
+    return matched // max(len(b.id), 1), matched % max(len(b.id), 1)
+
+
+def same_sentence_pairs(a: Spans, b: Spans) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pairs the spans of two annotators that share a sentence; the pairs that aren't matches (see `matching_pairs`)
+    are the remainder of the cross product of a sentence.
+
+    :param a: the spans of annotator a
+    :param b: the spans of annotator b
+    :return: `(a_index, b_index, matches)` of every pair of the same sentence, ordered by (a_index, b_index)
+    """
+    match_a, match_b = matching_pairs(a, b)
+    a_sentence, b_sentence = _sentence_codes(a, b)
+    b_order = np.argsort(b_sentence, kind="stable")
+    lo = np.searchsorted(b_sentence[b_order], a_sentence, side="left")
+    hi = np.searchsorted(b_sentence[b_order], a_sentence, side="right")
+    a_index, position = _ranges(lo, hi)
+    b_index = b_order[position]
+    pairs = a_index * len(b.id) + b_index
+    order = np.argsort(pairs, kind="stable")
+    a_index, b_index, pairs = a_index[order], b_index[order], pairs[order]
+    return a_index, b_index, np.isin(pairs, match_a * len(b.id) + match_b)
@@ -0,0 +1,198 @@
+import logging
+import sqlite3
+from typing import Union, Tuple, Dict, FrozenSet
+from collections import namedtuple
+
+import numpy as np
+
+from app_constants.base_config import DefaultTableNames
+
+# the annotations of all documents in one table with their bounds in the document (the bounds of an annotation are
+# relative to its sentence)
+LABELS_QUERY = """
+    SELECT a.document, a.annotator, a.type, s.begin + a.begin, s.begin + a.end
+    FROM {table} a
+    INNER JOIN {sentences} s ON s.id = a.sentence
+    """
+# the number of characters of every document
+DOCUMENT_LENGTHS_QUERY = """
+    SELECT document, MAX(end)
+    FROM {sentences}
+    GROUP BY document
+    """
+# label 0 is "not annotated", labels 1 to 255 are the annotation types of a type group
+MAX_LABELS = 255
+
+# sufficient statistics of a label matrix: the number of units (characters) and raters (annotators), the sum of
+# the squared label counts of every unit and the count of every label; all of them except `raters` are additive,
+# so that the statistics of documents (with the same annotators) add up to those of the corpus
+LabelStatistics = namedtuple('LabelStatistics', ['units', 'raters', 'squares', 'totals'])
+
+
+def label_statistics(labels: np.ndarray, n_labels: int, skip_unannotated: bool = False) -> LabelStatistics:
+    """
+    :param labels: `annotator x character` matrix of labels (see `LabelMatrices`)
+    :param n_labels: the number of labels (including 0)
+    :param skip_unannotated: ignore the characters no annotator annotated
+    :return:
+    """
+    if skip_unannotated:
+        labels = labels[:, labels.any(axis=0)]
+    counts = np.stack([(labels == label).sum(axis=0, dtype=np.int64) for label in range(n_labels)])
+    return LabelStatistics(units=labels.shape[1], raters=labels.shape[0], squares=int((counts * counts).sum()),
+                           totals=counts.sum(axis=1))
+
+
+def combine_statistics(statistics: list) -> LabelStatistics:
+    """
+    :param statistics: `LabelStatistics` of label matrices with the same annotators and labels
+    :return: the statistics of all of their units
+    """
+    return LabelStatistics(units=sum(s.units for s in statistics), raters=statistics[0].raters,
+                           squares=sum(s.squares for s in statistics),
+                           totals=np.sum([s.totals for s in statistics], axis=0))
+
+
+def fleiss_kappa(statistics: LabelStatistics) -> float:
+    """
+    Fleiss' kappa of the labels; every annotator labels every unit.
+
+    :param statistics:
+    :return: 0.0 if kappa is undefined (less than two annotators, no units or a single label overall)
+    """
+    units, raters = statistics.units, statistics.raters
+    if raters < 2 or units == 0:
+        return 0.0
+    observed = (statistics.squares - units * raters) / (units * raters * (raters - 1))
+    expected = float(((statistics.totals / (units * raters)) ** 2).sum())
+    return (observed - expected) / (1 - expected) if expected < 1 else 0.0
+
+
+def krippendorff_alpha(statistics: LabelStatistics) -> float:
+    """
+    Krippendorff's alpha of the labels with the nominal distance; every annotator labels every unit, so every
+    unit is pairable.
+
+    :param statistics:
+    :return: 0.0 if alpha is undefined (less than two annotators, no units or a single label overall)
+    """
+    units, raters = statistics.units, statistics.raters
+    if raters < 2 or units == 0:
+        return 0.0
+    values = units * raters
+    # the off-diagonal sum of the coincidence matrix and the expected one
+    disagreement = values - (statistics.squares - values) / (raters - 1)
+    expected = values * values - int((statistics.totals * statistics.totals).sum())
+    return 1 - (values - 1) * disagreement / expected if expected > 0 else 0.0
+
+
+class LabelMatrices:
+    def __init__(self, documents: list, annotators: list, db_connection: sqlite3.Connection):
+        """
+        Builds an `annotator x character` matrix of `uint8` labels for every document: a character that an
+        annotator annotated with the i-th type of a type group has the label i + 1, every other character 0. Where
+        the annotations of an annotator overlap the shorter one labels the characters (the one that begins later
+        if both are as long). The annotations of a table are read with one query.
+
+        :param documents: ids of the documents; annotations of other documents are ignored
+        :param annotators: ids of the annotators (the rows of every matrix); annotations of others are ignored
+        :param db_connection:
+        """
+        self.db = db_connection
+        self.documents = [str(d) for d in documents]
+        self.annotators = [str(a) for a in annotators]
+        self._document_index = {d: i for i, d in enumerate(self.documents)}
+        self._annotator_index = {a: i for i, a in enumerate(self.annotators)}
+        self._lengths = None
+        self._annotations = dict()
+        self._matrices = dict()
+
+    def lengths(self) -> np.ndarray:
+        # the number of characters of every document
+        if self._lengths is None:
+            self._lengths = np.zeros(len(self.documents), dtype=np.int64)
+            for document, length in self.db.execute(
+                    DOCUMENT_LENGTHS_QUERY.format(sentences=DefaultTableNames.sentences)):
+                if str(document) in self._document_index:
+                    self._lengths[self._document_index[str(document)]] = length or 0
+        return self._lengths
+
+    def annotations(self, table: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # `(document, annotator, type, begin, end)` arrays; types keep their ids (as strings)
+        if table not in self._annotations:
+            rows = [row for row in self.db.execute(
+                LABELS_QUERY.format(table=table, sentences=DefaultTableNames.sentences)).fetchall()
+                    if str(row[0]) in self._document_index and str(row[1]) in self._annotator_index]
+            columns = list(zip(*rows)) if len(rows) > 0 else [()] * 5
+            self._annotations[table] = (
+                np.array([self._document_index[str(v)] for v in columns[0]], dtype=np.int64),
+                np.array([self._annotator_index[str(v)] for v in columns[1]], dtype=np.int64),
+                np.array([str(v) for v in columns[2]], dtype=str),
+                np.array(columns[3], dtype=np.int64), np.array(columns[4], dtype=np.int64))
+        return self._annotations[table]
+
+    @staticmethod
+    def _type_ids(instance_type: Union[str, int, list, set]) -> Tuple[str, ...]:
+        return tuple(sorted({str(instance_type)} if isinstance(instance_type, (str, int))
+                            else {str(t) for t in instance_type}))
+
+    def matrices(self, instance_type: Union[str, int, list, set], table: str) -> Dict[str, np.ndarray]:
+        """
+        :param instance_type: the type (group); the i-th type of the sorted type ids has the label i + 1
+        :param table:
+        :return: `dict(document: annotator x character matrix)`
+        """
+        type_ids = self._type_ids(instance_type)
+        if len(type_ids) > MAX_LABELS:
+            logging.error("Only {0} annotation types fit into a label matrix, not {1}".format(MAX_LABELS,
+                                                                                           len(type_ids)))
+            raise ValueError(instance_type)
+        if (table, type_ids) not in self._matrices:
+            document, annotator, types, begin, end = self.annotations(table)
+            labels = np.searchsorted(np.array(type_ids, dtype=str), types) + 1
+            mask = np.isin(types, type_ids)
+            # a document is as long as its sentences and its annotations
+            lengths = self.lengths().copy()
+            np.maximum.at(lengths, document[mask], end[mask])
+            document, annotator, labels = document[mask], annotator[mask], labels[mask]
+            begin, end = np.minimum(begin[mask], end[mask]), end[mask]
+            # the characters of every annotation; the longest ones first, so that shorter ones overwrite them
+            order = np.lexsort((begin, -(end - begin)))
+            size = end[order] - begin[order]
+            owner = np.repeat(order, size)
+            offsets = np.arange(int(size.sum()), dtype=np.int64) - np.repeat(np.cumsum(size) - size, size)
+            character = begin[owner] + offsets
+            # the last annotation of every (document, annotator, character) labels it
+            starts = np.concatenate([[0], np.cumsum(lengths * len(self.annotators))])
+            cell = starts[document[owner]] + annotator[owner] * lengths[document[owner]] + character
+            cells = np.zeros(int(starts[-1]), dtype=np.uint8)
+            last = len(cell) - 1 - np.unique(cell[::-1], return_index=True)[1]
+            cells[cell[last]] = labels[owner[last]]
+            self._matrices[(table, type_ids)] = {
+                d: cells[starts[i]:starts[i + 1]].reshape(len(self.annotators), int(lengths[i]))
+                for i, d in enumerate(self.documents)}
+        return self._matrices[(table, type_ids)]
+
+    def statistics(self, instance_type: Union[str, int, list, set], table: str,
+                   skip_unannotated: bool = False) -> Dict[str, LabelStatistics]:
+        """
+        :return: `dict(document: LabelStatistics)` (see `label_statistics`)
+        """
+        n_labels = len(self._type_ids(instance_type)) + 1
+        return {d: label_statistics(labels, n_labels, skip_unannotated)
+                for d, labels in self.matrices(instance_type, table).items()}
+
+    def scores(self, instance_type: Union[str, int, list, set], table: str,
+               skip_unannotated: bool = False) -> Tuple[float, float, Dict[str, Tuple[float, float]]]:
+        """
+        :param instance_type: the type (group)
+        :param table:
+        :param skip_unannotated: ignore the characters no annotator annotated
+        :return: Fleiss' kappa and Krippendorff's alpha of the corpus and `dict(document: (kappa, alpha))`
+        """
+        statistics = self.statistics(instance_type, table, skip_unannotated)
+        if len(statistics) == 0:
+            return 0.0, 0.0, dict()
+        corpus = combine_statistics(list(statistics.values()))
+        return (fleiss_kappa(corpus), krippendorff_alpha(corpus),
+                {d: (fleiss_kappa(s), krippendorff_alpha(s)) for d, s in statistics.items()})
@@ -6,9 +6,14 @@ bc = importlib.import_module(".base_config", package="app_constants")
 this_path = pathlib.Path(__file__).parent
 config_ini = configparser.ConfigParser()
 config_ini.read(pathlib.Path(this_path / ".." / "config.ini").resolve())
-bc.setup_config(config_str=config_ini["DEFAULT"]["name"], slayer_str=config_ini["DEFAULT"]["sentence_layer"])
+compact_schema = config_ini["DEFAULT"].getboolean("compact_schema", fallback=False)
+compress_texts = config_ini["DEFAULT"].getboolean("compress_texts", fallback=True)
+temp_db_quota_mb = config_ini["DEFAULT"].getint("temp_db_quota_mb", fallback=2048)
+bc.setup_config(config_str=config_ini["DEFAULT"]["name"], slayer_str=config_ini["DEFAULT"]["sentence_layer"],
+                compact=compact_schema)
 
 db_construction = bc.db_construction
 database_info = bc.database_info
 layers = bc.layers
 DefaultTableNames = bc.DefaultTableNames
+compact_sentence_key = bc.compact_sentence_key
@@ -11,6 +11,9 @@ class DefaultTableNames(Constant):
     annotators = "annotators"
     documents = "documents"
     sentences = "sentences"
+    document_texts = "document_texts"
+    ingest_manifest = "ingest_manifest"
+    sentence_annotation_summary = "sentence_annotation_summary"
 
 
 class DatabaseCategories(Constant):
@@ -25,12 +28,14 @@ class DatabaseConstructionKeys(Constant):
     columns = "additional_columns"
     indices = "indexed_columns"
     foreign_keys = "reference_columns"
+    triggers = "triggers"
 
 
 class SQLiteDataTypes(Constant):
     string = "text"
     boolean = "integer"
     integer = "integer"
+    blob = "blob"
 
 
 entry_types = [DatabaseCategories.entities, DatabaseCategories.relations]
@@ -59,17 +64,33 @@ database_info = {
                 "begin": SQLiteDataTypes.integer,
                 "end": SQLiteDataTypes.integer,
                 "document": SQLiteDataTypes.string,
-                "text": SQLiteDataTypes.string,
-                "has_annotation": SQLiteDataTypes.boolean
+                "document_text": SQLiteDataTypes.string,  # <- the text is `document_text[begin:end]`
+                "has_annotation": SQLiteDataTypes.boolean  # <- kept by the summary triggers (brat sets it on insert)
             },
-            DatabaseConstructionKeys.indices: [],
+            DatabaseConstructionKeys.indices: ["document, begin"],  # <- the sentences of a document in text order
             DatabaseConstructionKeys.foreign_keys: {
                 "document": {
                     "table": DefaultTableNames.documents,
                     "column": "id"
+                },
+                "document_text": {
+                    "table": DefaultTableNames.document_texts,
+                    "column": "id"
                 }
             }
         },
+        # every distinct document text once: "hash" is the SHA-1 of the text, "text" holds the text or (with
+        # `compress_texts = true` in config.ini) its zlib compressed UTF-8 bytes (see `database.document_text_row`)
+        DefaultTableNames.document_texts: {
+            DatabaseConstructionKeys.columns: {
+                "id": SQLiteDataTypes.string,
+                "hash": SQLiteDataTypes.string,
+                "text": SQLiteDataTypes.blob,
+                "compressed": SQLiteDataTypes.boolean
+            },
+            DatabaseConstructionKeys.indices: ["hash"],
+            DatabaseConstructionKeys.foreign_keys: {}
+        },
         DefaultTableNames.annotation_types: {
             DatabaseConstructionKeys.columns: {
                 "id": SQLiteDataTypes.string,
@@ -91,6 +112,77 @@ database_info = {
             },
             DatabaseConstructionKeys.indices: ["layer"],
             DatabaseConstructionKeys.foreign_keys: {}
+        },
+        DefaultTableNames.ingest_manifest: {  # <- one row per ingested file; "id" is the path of the file
+            DatabaseConstructionKeys.columns: {
+                "id": SQLiteDataTypes.string,
+                "size": SQLiteDataTypes.integer,
+                "mtime": SQLiteDataTypes.integer,
+                "hash": SQLiteDataTypes.string,
+                "document": SQLiteDataTypes.string,
+                "annotator": SQLiteDataTypes.string
+            },
+            DatabaseConstructionKeys.indices: ["document"],
+            DatabaseConstructionKeys.foreign_keys: {
+                "document": {
+                    "table": DefaultTableNames.documents,
+                    "column": "id"
+                },
+                "annotator": {
+                    "table": DefaultTableNames.annotators,
+                    "column": "id"
+                }
+            }
+        },
+        # one row per (document, sentence, annotator, type) with the number of annotations of all entity tables
+        # (see `database.store_annotation_summary`); its triggers keep `sentences.has_annotation` in sync (a brat
+        # ingestion drops them: the flag of a brat sentence follows the annotator the sentence is taken from)
+        DefaultTableNames.sentence_annotation_summary: {
+            DatabaseConstructionKeys.columns: {
+                "id": SQLiteDataTypes.string,
+                "document": SQLiteDataTypes.string,
+                "sentence": SQLiteDataTypes.string,
+                "annotator": SQLiteDataTypes.string,
+                "type": SQLiteDataTypes.string,
+                "count": SQLiteDataTypes.integer
+            },
+            DatabaseConstructionKeys.indices: ["document, type, sentence", "sentence"],
+            DatabaseConstructionKeys.foreign_keys: {
+                "document": {
+                    "table": DefaultTableNames.documents,
+                    "column": "id"
+                },
+                "sentence": {
+                    "table": DefaultTableNames.sentences,
+                    "column": "id"
+                },
+                "annotator": {
+                    "table": DefaultTableNames.annotators,
+                    "column": "id"
+                },
+                "type": {
+                    "table": DefaultTableNames.annotation_types,
+                    "column": "id"
+                }
+            },
+            DatabaseConstructionKeys.triggers: {
+                "trg_summary_insert": """
+                    AFTER INSERT ON sentence_annotation_summary
+                    BEGIN
+                        UPDATE sentences SET has_annotation = 1 WHERE id = NEW.sentence AND has_annotation = 0;
+                    END
+                    """,
+                "trg_summary_delete": """
+                    AFTER DELETE ON sentence_annotation_summary
+                    BEGIN
+                        UPDATE sentences
+                        SET has_annotation = EXISTS (
+                            SELECT 1 FROM sentence_annotation_summary WHERE sentence = OLD.sentence
+                        )
+                        WHERE id = OLD.sentence;
+                    END
+                    """
+            }
         }
     }
 }
@@ -114,11 +206,14 @@ additional_entity_info = {
         "type": SQLiteDataTypes.string,
         "begin": SQLiteDataTypes.integer,
         "end": SQLiteDataTypes.integer,
-        "text": SQLiteDataTypes.string,
         "sentence": SQLiteDataTypes.string,
         "document": SQLiteDataTypes.string
     },
-    DatabaseConstructionKeys.indices: ["sentence", "type"],
+    # an index entry may name several comma separated columns (a composite index): the first one serves the
+    # agreement queries (one document, some types, two annotators; grouped/joined by sentence and offsets),
+    # the second one the annotations of a sentence in the viewer
+    DatabaseConstructionKeys.indices: ["document, type, annotator, sentence, begin, end",
+                                       "sentence, annotator, begin", "type"],
     DatabaseConstructionKeys.foreign_keys: {
         "sentence": {
             "table": DefaultTableNames.sentences,
@@ -131,12 +226,34 @@ additional_entity_info = {
     }
 }
 
+# the compact schema (`compact_schema = true` in config.ini) uses integer rowids as primary and foreign keys;
+# what the composite text id of a sentence held is kept in columns of their own
+compact_sentence_info = {
+    DatabaseConstructionKeys.columns: {
+        "sentence_index": SQLiteDataTypes.integer,
+        "sentence_annotator": SQLiteDataTypes.integer  # <- only set for the disparate sentences of an annotator
+    },
+    DatabaseConstructionKeys.indices: ["document, sentence_index, sentence_annotator"],
+    DatabaseConstructionKeys.foreign_keys: {
+        "sentence_annotator": {
+            "table": DefaultTableNames.annotators,
+            "column": "id"
+        }
+    }
+}
+# tables that keep a text id in the compact schema (the manifest is keyed by file path)
+compact_text_id_tables = [DefaultTableNames.ingest_manifest]
+nullable_columns = ["sentence_annotator"]
+# SQL expression that rebuilds the text id of a sentence ("doc-sentence" or "doc-sentence-annotator")
+# from a row of the compact sentences table
+compact_sentence_key = "(document || '-' || sentence_index || COALESCE('-' || sentence_annotator, ''))"
+
 
 layers = {}
 db_construction = {}
 
 
-def setup_config(config_str: str, slayer_str: str):
+def setup_config(config_str: str, slayer_str: str, compact: bool = False):
     _config = config_str
     if _config.split(".")[-1] == "py":
         _config = _config[:-3]
@@ -151,17 +268,32 @@ def setup_config(config_str: str, slayer_str: str):
             )
         return foreign_key[:-2] + "\n);"
 
-    def get_db_structure(columns: Union[dict, None] = None, foreign_keys: Union[dict, None] = None):
-        stm = "(\n    id text PRIMARY KEY,\n"
+    def get_db_structure(columns: Union[dict, None] = None, foreign_keys: Union[dict, None] = None,
+                         id_type: str = SQLiteDataTypes.string):
+        stm = "(\n    id {} PRIMARY KEY,\n".format(id_type)
         for _name, _type in columns.items():
             if _name != "id":
-                stm += "    {} {} NOT NULL,\n".format(_name.lower(), _type.lower())
+                stm += "    {} {}{},\n".format(_name.lower(), _type.lower(),
+                                                 "" if _name in nullable_columns else " NOT NULL")
         if foreign_keys is not None:
             stm += get_foreign_keys(foreign_keys=foreign_keys)
         else:
             return stm[:-2] + "\n);"
         return stm
 
+    def compact_structure(entry_name: str, columns: dict, indexed_columns: list, foreign_keys: dict):
+        columns, indexed_columns, foreign_keys = dict(columns), list(indexed_columns), dict(foreign_keys)
+        if entry_name == DefaultTableNames.sentences:
+            columns.update(compact_sentence_info.get(DatabaseConstructionKeys.columns))
+            indexed_columns.extend(compact_sentence_info.get(DatabaseConstructionKeys.indices))
+            foreign_keys.update(compact_sentence_info.get(DatabaseConstructionKeys.foreign_keys))
+        if entry_name != DefaultTableNames.documents and "document" in columns and "document" not in foreign_keys:
+            foreign_keys["document"] = {"table": DefaultTableNames.documents, "column": "id"}
+        for _col, _dict in foreign_keys.items():
+            if _dict.get("column") == "id" and _dict.get("table") not in compact_text_id_tables:
+                columns[_col] = SQLiteDataTypes.integer
+        return columns, indexed_columns, foreign_keys
+
     def construct_db_dict(e_types: list, db_info: dict, basic_info: dict, entity_info: dict):
         e_types.append(DatabaseCategories.base)
         _db = {}
@@ -192,10 +324,17 @@ def setup_config(config_str: str, slayer_str: str):
                     _columns.update(entity_info.get(DatabaseConstructionKeys.columns))
                     _indexed_columns.extend(entity_info.get(DatabaseConstructionKeys.indices))
                     _foreign_keys.update(entity_info.get(DatabaseConstructionKeys.foreign_keys))
+                _id_type = SQLiteDataTypes.string
+                if compact:
+                    _columns, _indexed_columns, _foreign_keys = compact_structure(
+                        entry_name, _columns, _indexed_columns, _foreign_keys)
+                    if entry_name not in compact_text_id_tables:
+                        _id_type = SQLiteDataTypes.integer
                 _foreign_keys = None if len(_foreign_keys) == 0 else _foreign_keys
                 _db[entry_name] = {
-                    "stm": get_db_structure(columns=_columns, foreign_keys=_foreign_keys),
-                    "idx": _indexed_columns
+                    "stm": get_db_structure(columns=_columns, foreign_keys=_foreign_keys, id_type=_id_type),
+                    "idx": _indexed_columns,
+                    "trg": dict(entry_dict.get(DatabaseConstructionKeys.triggers, {}))
                 }
         return _db
 
@@ -0,0 +1,187 @@
+"""
+Writes synthetic annotation projects to measure how the ingestion scales:
+brat project folders (one subfolder per annotator) and WebAnno project exports (zip).
+
+    python -m benchmark.generate brat <folder> --documents 100 --annotators 3
+    python -m benchmark.generate webanno <zip file> --documents 100 --annotators 3
+"""
+import io
+import os
+import random
+import pathlib
+import zipfile
+import argparse
+from collections import namedtuple
+from typing import List, Union
+
+from cassis import Cas, load_typesystem
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TYPE_SYSTEM = os.path.join(SCRIPT_DIR, "..", "test", "uima-test-resources", "TypeSystem.xml")
+SENTENCE_LAYER = "de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Sentence"
+ENTITY_LAYER = "webanno.custom.MedicationEntity"
+ENTITY_TYPE_FEATURE = "drugType"
+
+VOCABULARY = ["patient", "was", "admitted", "with", "acute", "pain", "and", "received", "mg", "daily", "therapy",
+              "the", "of", "dose", "tablet", "after", "before", "blood", "pressure", "discharged", "on", "history",
+              "chronic", "oral", "infusion", "twice", "week", "stable", "condition", "follow-up", "clinic", "report"]
+
+CorpusSpec = namedtuple('CorpusSpec', ['documents', 'annotators', 'sentences', 'annotations_per_sentence',
+                                       'annotation_types', 'overlap', 'seed'])
+SyntheticDocument = namedtuple('SyntheticDocument', ['name', 'text', 'sentences', 'annotations'])
+
+
+def corpus_spec(documents: int = 10, annotators: int = 2, sentences: int = 20, annotations_per_sentence: int = 2,
+                annotation_types: int = 5, overlap: float = 0.5, seed: int = 0) -> CorpusSpec:
+    """
+    :param documents: number of documents
+    :param annotators: number of annotators; every annotator annotates every document
+    :param sentences: number of sentences per document
+    :param annotations_per_sentence: number of annotations every annotator makes per sentence
+    :param annotation_types: number of different annotation types
+    :param overlap: probability (0 - 1) that an annotation is made identically (span and type) by all annotators;
+     the other annotations are drawn independently for every annotator
+    :param seed: seed of the random generator; the same spec always generates the same corpus
+    :return:
+    """
+    return CorpusSpec(documents=documents, annotators=annotators, sentences=sentences,
+                      annotations_per_sentence=annotations_per_sentence, annotation_types=annotation_types,
+                      overlap=overlap, seed=seed)
+
+
+def annotator_names(spec: CorpusSpec) -> List[str]:
+    return ["anno{0}".format(i) for i in range(spec.annotators)]
+
+
+def type_names(spec: CorpusSpec) -> List[str]:
+    return ["Type{0}".format(i) for i in range(spec.annotation_types)]
+
+
+def synthetic_documents(spec: CorpusSpec):
+    """
+    Yields one `SyntheticDocument` after the other: the text has one sentence per line, `sentences` holds the
+    `(begin, end)` offsets of the sentences and `annotations` the `(begin, end, type)` annotations of every annotator.
+    """
+    rng = random.Random(spec.seed)
+    names = annotator_names(spec)
+    types = type_names(spec)
+    width = len(str(max(spec.documents - 1, 0)))
+    for doc_idx in range(spec.documents):
+        lines, sentences, offset = [], [], 0
+        annotations = {name: [] for name in names}
+        for _ in range(spec.sentences):
+            words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+            tokens, token_offset = [], offset
+            for word in words:
+                tokens.append((token_offset, token_offset + len(word)))
+                token_offset += len(word) + 1
+            line = " ".join(words)
+            sentences.append((offset, offset + len(line)))
+            for _ in range(spec.annotations_per_sentence):
+                if rng.random() < spec.overlap:
+                    shared = _random_annotation(rng, tokens, types)
+                    for name in names:
+                        annotations[name].append(shared)
+                else:
+                    for name in names:
+                        annotations[name].append(_random_annotation(rng, tokens, types))
+            lines.append(line)
+            offset += len(line) + 1
+        yield SyntheticDocument(name="doc{0:0{1}d}".format(doc_idx, width), text="\n".join(lines) + "\n",
+                                sentences=sentences, annotations=annotations)
+
+
+def _random_annotation(rng: random.Random, tokens: list, types: list) -> tuple:
+    first = rng.randrange(len(tokens))
+    last = min(len(tokens) - 1, first + rng.randint(0, 2))
+    return tokens[first][0], tokens[last][1], rng.choice(types)
+
+
+def generate_brat_project(root: Union[str, pathlib.Path], spec: CorpusSpec) -> pathlib.Path:
+    """
+    Writes a brat project: an `annotation.conf` with the entity types and one folder per annotator that holds a
+    `.txt` and `.ann` file for every document.
+
+    :param root: folder of the project (created if it does not exist)
+    :param spec: see `corpus_spec`
+    :return: the project folder
+    """
+    root = pathlib.Path(root)
+    for name in annotator_names(spec):
+        (root / name).mkdir(parents=True, exist_ok=True)
+    (root / "annotation.conf").write_text(
+        "[entities]\n\n{0}\n\n[attributes]\n\n[relations]\n\n[events]\n".format("\n".join(type_names(spec))),
+        encoding='utf-8')
+    for document in synthetic_documents(spec):
+        for name, annotations in document.annotations.items():
+            (root / name / "{0}.txt".format(document.name)).write_text(document.text, encoding='utf-8')
+            (root / name / "{0}.ann".format(document.name)).write_text(
+                "".join("T{0}\t{1} {2} {3}\t{4}\n".format(t_id, _type, begin, end, document.text[begin:end])
+                        for t_id, (begin, end, _type) in enumerate(annotations)),
+                encoding='utf-8')
+    return root
+
+
+def generate_webanno_project(zip_file: Union[str, pathlib.Path], spec: CorpusSpec,
+                             type_system: str = TYPE_SYSTEM) -> pathlib.Path:
+    """
+    Writes a WebAnno project export: the source texts and, for every document, one inner zip per annotator
+    holding the annotator's XMI and the type system. The annotations are `webanno.custom.MedicationEntity`
+    with the type name as `drugType`, i.e. they fit the `webanno_config_medication` configuration.
+
+    :param zip_file: path of the export
+    :param spec: see `corpus_spec`
+    :param type_system: path of the type system the CASes are built with
+    :return: the path of the export
+    """
+    zip_file = pathlib.Path(zip_file)
+    zip_file.parent.mkdir(parents=True, exist_ok=True)
+    ts_bytes = pathlib.Path(type_system).read_bytes()
+    typesystem = load_typesystem(io.BytesIO(ts_bytes))
+    sentence_type = typesystem.get_type(SENTENCE_LAYER)
+    entity_type = typesystem.get_type(ENTITY_LAYER)
+    export_id = 0
+    with zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_DEFLATED) as zfile:
+        for document in synthetic_documents(spec):
+            zfile.writestr("source/{0}.txt".format(document.name), document.text)
+            for name, annotations in document.annotations.items():
+                cas = Cas(typesystem=typesystem)
+                cas.sofa_string = document.text
+                for begin, end in document.sentences:
+                    cas.add(sentence_type(begin=begin, end=end))
+                for begin, end, _type in annotations:
+                    cas.add(entity_type(begin=begin, end=end, **{ENTITY_TYPE_FEATURE: _type}))
+                inner = io.BytesIO()
+                with zipfile.ZipFile(inner, 'w', compression=zipfile.ZIP_DEFLATED) as inner_zfile:
+                    inner_zfile.writestr("{0}.xmi".format(name), cas.to_xmi())
+                    inner_zfile.writestr("TypeSystem.xml", ts_bytes)
+                zfile.writestr("annotation/{0}.txt/webanno{1}export.zip".format(document.name, export_id),
+                               inner.getvalue())
+                export_id += 1
+    return zip_file
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic brat or WebAnno annotation project.")
+    parser.add_argument("format", choices=["brat", "webanno"])
+    parser.add_argument("path", help="project folder (brat) or zip file (webanno)")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--annotators", type=int, default=2)
+    parser.add_argument("--sentences", type=int, default=20, help="sentences per document")
+    parser.add_argument("--annotations-per-sentence", type=int, default=2)
+    parser.add_argument("--annotation-types", type=int, default=5)
+    parser.add_argument("--overlap", type=float, default=0.5,
+                        help="probability that an annotation is shared by all annotators")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    spec = corpus_spec(documents=args.documents, annotators=args.annotators, sentences=args.sentences,
+                       annotations_per_sentence=args.annotations_per_sentence,
+                       annotation_types=args.annotation_types, overlap=args.overlap, seed=args.seed)
+    if args.format == "brat":
+        print(generate_brat_project(args.path, spec))
+    else:
+        print(generate_webanno_project(args.path, spec))
+
+
+if __name__ == "__main__":
+    main()
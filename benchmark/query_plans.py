@@ -0,0 +1,127 @@
+"""
+Checks with `EXPLAIN QUERY PLAN` that the hot queries of the agreement computation and the viewer are answered
+with the indices of the schema, i.e. that none of them falls back to a full table scan:
+
+    python -m benchmark.query_plans <database file>
+
+The queries are planned with ids taken from the database (its first document, two of its annotators and an
+annotation type of every entity table). The script prints the plan of every query and exits with -1 if any
+of them scans a table.
+"""
+import os
+import sys
+import sqlite3
+import logging
+import argparse
+from typing import List, Tuple, Union
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from app_constants import database_info, DefaultTableNames, compact_sentence_key
+from app_constants.base_config import DatabaseCategories
+from agreement.engine import ANNOTATIONS_QUERY
+from agreement.matcher import SPANS_QUERY
+from agreement.instance_token import TokenAgreement
+from database.database import query_plan, full_scans
+from database.queries import QueryRepository
+
+
+def _first(connection: sqlite3.Connection, query: str):
+    row = connection.execute(query).fetchone()
+    return row[0] if row is not None else None
+
+
+def _viewer_queries(repository: QueryRepository, table: str, doc_id: str, annotator: str, type_id: str,
+                    sentence: str) -> List[Tuple[str, str, tuple]]:
+    # the filtered statements of `main.py` (the unfiltered listings of whole tables are left out)
+    compact = "sentence_index" in [c[1] for c in repository.execute("sentence_columns")]
+    key_column = compact_sentence_key if compact else "id"
+    queries = [
+        ("sentences_for_document", repository.sql("sentences_for_document", sentence_key=key_column), (doc_id,)),
+        ("document_text", repository.sql("document_text"),
+         (_first(repository.connection, "SELECT hash FROM document_texts;"),)),
+        ("sentences_with_annotations", repository.sql("sentences_with_annotations", sentence_key=key_column),
+         (doc_id,)),
+        ("annotations_for_sentence", repository.sql("annotations_for_sentence", table=table),
+         (sentence, annotator)),
+        ("annotation_types_for_document", repository.sql("annotation_types_for_document"), (doc_id,)),
+        ("sentences_with_annotation_type",
+         repository.sql("sentences_with_annotation_type", sentence_key=key_column), (doc_id, type_id)),
+        ("annotation_ids_for_type", repository.sql("annotation_ids_for_type", table=table), (doc_id, type_id))
+    ]
+    if compact:
+        queries.append(("sentence_row_id", repository.sql("sentence_row_id"), (doc_id, "0", None)))
+    return queries
+
+
+def hot_queries(connection: sqlite3.Connection) -> List[Tuple[str, str, tuple]]:
+    """
+    :param connection: connection to a database built by `store_brat`/`store_xmi`
+    :return: `(name, query, parameters)` of every query that is checked
+    """
+    doc_id = _first(connection, "SELECT id FROM {0} ORDER BY id;".format(DefaultTableNames.documents))
+    annotators = [str(row[0]) for row in connection.execute(
+        "SELECT id FROM {0} ORDER BY id LIMIT 2;".format(DefaultTableNames.annotators))]
+    annotators = (annotators * 2)[:2]
+    repository = QueryRepository(connection)
+    queries = []
+    for table in database_info.get(DatabaseCategories.entities, {}).keys():
+        type_id = str(_first(connection, "SELECT type FROM {0};".format(table)))
+        sentence = _first(connection, "SELECT sentence FROM {0};".format(table))
+        token_agreement = TokenAgreement(annotators, doc_id, connection)
+        token_agreement.same_sentence_token_ids = {_first(connection, "SELECT id FROM {0};".format(table))}
+        token_agreement.store_matched_ids()
+        queries.extend([
+            ("{0}: instance agreement".format(table), ANNOTATIONS_QUERY.format(table=table), (doc_id,)),
+            ("{0}: token agreement, spans".format(table), SPANS_QUERY.format(table=table, types="?"),
+             (doc_id, annotators[0], type_id)),
+            ("{0}: token agreement, same sentence".format(table),
+             token_agreement._same_sentence_query(annotators, [type_id], table, True), ()),
+            ("{0}: token agreement, same sentence, no overlap".format(table),
+             token_agreement._same_sentence_query(annotators, [type_id], table, False), ()),
+            ("{0}: token agreement, other sentences".format(table),
+             token_agreement._different_sentence_query(annotators, [type_id], table), ())
+        ])
+        queries.extend(("{0}: {1}".format(table, name), query, params) for name, query, params in
+                       _viewer_queries(repository, table, doc_id, annotators[0], type_id, sentence))
+    return queries
+
+
+def check_query_plans(connection: sqlite3.Connection, verbose: bool = True) -> List[Tuple[str, List[str]]]:
+    """
+    :param connection: connection to a database built by `store_brat`/`store_xmi`
+    :param verbose: whether the plan of every query is printed
+    :return: `(name, scans)` of every query whose plan holds a full scan
+    """
+    failed = []
+    for name, query, params in hot_queries(connection):
+        scans = full_scans(connection, query, params)
+        if verbose:
+            print("{0}{1}".format("FULL SCAN " if scans else "", name))
+            for step in query_plan(connection, query, params):
+                print("    {0}".format(step))
+        if scans:
+            failed.append((name, scans))
+    return failed
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check that the hot queries don't scan whole tables.")
+    parser.add_argument("db", help="database file built by store_brat/store_xmi")
+    parser.add_argument("--quiet", action="store_true", help="only report the queries with a full scan")
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.db):
+        logging.error("No database file '{0}'".format(args.db))
+        sys.exit(-1)
+    connection = sqlite3.connect(args.db)
+    failed = check_query_plans(connection, verbose=not args.quiet)
+    connection.close()
+    for name, scans in failed:
+        logging.error("Full scan in '{0}': {1}".format(name, "; ".join(scans)))
+    if failed:
+        sys.exit(-1)
+
+
+if __name__ == "__main__":
+    main()
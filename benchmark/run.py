@@ -0,0 +1,248 @@
+"""
+Times the ingestion of a brat project or a WebAnno project export stage by stage and writes the results as JSON,
+so that the scaling of the ingestion can be compared between releases. The database structure is the one of
+the configuration named in `config.ini`.
+
+    python -m benchmark.run brat <folder> --output results.json
+    python -m benchmark.run webanno <zip file> --workers 4 --output results.json
+
+The stages "file read", "parse" and "sentence split" are measured in a pass of their own over all
+(document, annotator) pairs; "ingest" is the complete `ingest_brat`/`ingest_xmi` run and "db write" the time spent
+in the inserts of that run. Peak memory is measured with `tracemalloc` (which slows down the stages it traces and
+only sees the main process, i.e. not the parsing workers of `--workers N`).
+
+A WebAnno project needs a WebAnno configuration in `config.ini`, e.g. for the sample project
+`test/uima-test-resources/test_project.zip`:
+
+    name = webanno_config_medication
+    sentence_layer = de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Sentence
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import pathlib
+import platform
+import argparse
+import datetime
+import tempfile
+import contextlib
+import tracemalloc
+from collections import defaultdict
+from functools import partial
+from typing import List, Union
+
+from cassis import load_cas_from_xmi, load_typesystem
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+import uima
+from bratsubset.annotation import Annotations
+from app_constants import config_ini
+from database.database import ingest_brat, ingest_xmi, input_generator, xmi_context, xmi_rows_for_annotator, \
+    _collect_annotators_and_documents, _get_sentences, _assign_textbounds_to_sentences, user_layers
+
+
+class StageTimer:
+    def __init__(self, trace_memory: bool = True) -> None:
+        """
+        Sums up the wall time of every stage over all the times it is entered and keeps its peak memory.
+
+        :param trace_memory: whether the peak memory of the stages is recorded with `tracemalloc`
+        """
+        self._trace_memory = trace_memory
+        self._stages = defaultdict(lambda: {"seconds": 0.0, "calls": 0, "peak_memory": None})
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            result = self._stages[name]
+            result["seconds"] += time.perf_counter() - start
+            result["calls"] += 1
+            if self._trace_memory:
+                result["peak_memory"] = max(tracemalloc.get_traced_memory()[1], result["peak_memory"] or 0)
+
+    def add(self, name: str, seconds: float) -> None:
+        result = self._stages[name]
+        result["seconds"] += seconds
+        result["calls"] += 1
+
+    @property
+    def stages(self) -> dict:
+        return {name: dict(result) for name, result in self._stages.items()}
+
+
+@contextlib.contextmanager
+def _tracing(trace_memory: bool):
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            tracemalloc.stop()
+    else:
+        yield
+
+
+@contextlib.contextmanager
+def _database_file(db_file: Union[str, None]):
+    if db_file is not None:
+        yield os.path.abspath(db_file)
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield os.path.join(tmp_dir, "benchmark.db")
+
+
+def _result(format_name: str, project: str, workers: int, corpus: dict, timer: StageTimer, report: dict) -> dict:
+    timer.add("db write", sum(table["seconds"] for table in report.values()))
+    return {
+        "format": format_name,
+        "project": project,
+        "workers": workers,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "corpus": corpus,
+        "stages": timer.stages,
+        "tables": report
+    }
+
+
+def benchmark_brat(project_root: Union[str, pathlib.Path], db_file: Union[str, None] = None, workers: int = 1,
+                   trace_memory: bool = True) -> dict:
+    """
+    :param project_root: folder of the brat project
+    :param db_file: database file that is (re)built; a temporary file if `None`
+    :param workers: number of parsing processes of the "ingest" stage
+    :param trace_memory: whether the peak memory of every stage is recorded
+    :return: the benchmark result (see `_result`)
+    """
+    project_root = pathlib.Path(project_root).resolve()
+    annotators, documents = _collect_annotators_and_documents(partial(input_generator, project_root))
+    documents = ["".join(_name.split(".")[:-1]) for _name in documents]
+    timer = StageTimer(trace_memory)
+    corpus = {"documents": len(documents), "annotators": len(annotators), "pairs": 0, "bytes": 0, "annotations": 0}
+    with _tracing(trace_memory):
+        for doc_name in documents:
+            for annotator in annotators:
+                base = project_root / annotator / doc_name
+                with timer.stage("file read"):
+                    txt = base.with_suffix(".txt").read_bytes().decode('utf-8')
+                    ann_size = len(base.with_suffix(".ann").read_bytes())
+                with timer.stage("parse"):
+                    textbounds = list(Annotations(base.as_posix(), True).get_textbounds())
+                with timer.stage("sentence split"):
+                    _assign_textbounds_to_sentences(list(_get_sentences(txt=txt)), textbounds)
+                corpus["pairs"] += 1
+                corpus["bytes"] += len(txt.encode('utf-8')) + ann_size
+                corpus["annotations"] += len(textbounds)
+        with _database_file(db_file) as _db_file, timer.stage("ingest"):
+            report = ingest_brat(project_root, _db_file, workers=workers)
+    return _result("brat", str(project_root), workers, corpus, timer, report)
+
+
+def _xmi_project(project_file: str) -> tuple:
+    # the reader, type system and `xmi_context` of a WebAnno project export
+    project_reader = uima.WebAnnoProjectReader(project_file)
+    ts_string = project_reader.type_system().read().decode('utf-8')
+    context = xmi_context(uima.get_layer_information_from_type_system(ts_string, user_layers))
+    return project_reader, load_typesystem(ts_string), context
+
+
+def benchmark_xmi(project_file: str, db_file: Union[str, None] = None, workers: int = 1,
+                  trace_memory: bool = True) -> dict:
+    """
+    :param project_file: path of the zipped WebAnno project export
+    :param db_file: database file that is (re)built; a temporary file if `None`
+    :param workers: number of deserialization processes of the "ingest" stage
+    :param trace_memory: whether the peak memory of every stage is recorded
+    :return: the benchmark result (see `_result`)
+    """
+    project_file = os.path.abspath(project_file)
+    project_reader, typesystem, context = _xmi_project(project_file)
+    check_xmi_config(typesystem, context)
+    timer = StageTimer(trace_memory)
+    corpus = {"documents": len(project_reader.documents), "annotators": len(project_reader.annotators),
+              "pairs": 0, "bytes": 0, "annotations": 0}
+    with _tracing(trace_memory):
+        pairs = iter(project_reader)
+        while True:
+            with timer.stage("file read"):
+                doc_name, anno_name, xmi = next(pairs, (None, None, None))
+                xmi_bytes = xmi.read() if xmi is not None else None
+            if xmi_bytes is None:
+                break
+            with timer.stage("parse"):
+                cas = load_cas_from_xmi(xmi_bytes.decode('utf-8'), typesystem=typesystem)
+            with timer.stage("sentence split"):
+                table_rows = xmi_rows_for_annotator(cas, project_reader.annotators[anno_name],
+                                                    project_reader.documents[doc_name], context)
+            corpus["pairs"] += 1
+            corpus["bytes"] += len(xmi_bytes)
+            corpus["annotations"] += sum(len(rows) for table_name, _, rows in table_rows[:-1])
+        with _database_file(db_file) as _db_file, timer.stage("ingest"):
+            report = ingest_xmi(project_file, _db_file, workers=workers, progress=False)
+    return _result("webanno", project_file, workers, corpus, timer, report)
+
+
+def check_xmi_config(typesystem, context) -> None:
+    """
+    Makes sure that the configuration of `config.ini` fits the type system of a WebAnno project (the default one
+    is a brat configuration, whose sentence layer is no UIMA type).
+
+    :param typesystem: the type system of the project
+    :param context: the `xmi_context` of the project
+    :return:
+    """
+    problems = []
+    if not typesystem.contains_type(context.sentence_layer):
+        problems.append("the sentence layer '{0}' is no type of the project".format(context.sentence_layer))
+    if len(context.entity_layers) == 0:
+        problems.append("no entity table of the configuration '{0}' matches a layer of the project".format(
+            config_ini["DEFAULT"]["name"]))
+    if len(problems) > 0:
+        raise ValueError("The configuration in config.ini doesn't fit the WebAnno project: {0}; set 'name' and "
+                         "'sentence_layer' to a WebAnno configuration (e.g. 'webanno_config_medication' and "
+                         "'de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Sentence')".format("; ".join(problems)))
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion of a brat or WebAnno project.",
+                                     epilog="The database structure is the one of the configuration named in "
+                                            "config.ini; a WebAnno project needs a WebAnno configuration there "
+                                            "(see the module docstring).")
+    parser.add_argument("format", choices=["brat", "webanno"])
+    parser.add_argument("path", help="project folder (brat) or zip file (webanno)")
+    parser.add_argument("--db", default=None, help="database file to build (default: a temporary file)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="don't trace the memory (faster)")
+    parser.add_argument("--output", default=None, help="JSON file the result is appended to (default: stdout)")
+    args = parser.parse_args(argv)
+    benchmark = benchmark_brat if args.format == "brat" else benchmark_xmi
+    if args.format == "webanno":
+        try:
+            check_xmi_config(*_xmi_project(os.path.abspath(args.path))[1:])
+        except ValueError as e:
+            parser.error(str(e))
+    result = benchmark(args.path, db_file=args.db, workers=args.workers, trace_memory=not args.no_memory)
+    if args.output is None:
+        print(json.dumps(result, indent=2))
+        return
+    results = []
+    if os.path.exists(args.output):
+        with open(args.output, 'r', encoding='utf-8') as json_file:
+            results = json.load(json_file)
+    results.append(result)
+    with open(args.output, 'w', encoding='utf-8') as json_file:
+        json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
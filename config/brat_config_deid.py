@@ -1,12 +1,14 @@
 # Streamlit Annotation Visualizer Configuration File
 # for Brat Project Exports
 #
-# default tables in database: annotators, sentences, documents, annotation_types, layers
+# default tables in database: annotators, sentences, document_texts, documents, annotation_types, layers,
+#                              ingest_manifest, sentence_annotation_summary
 #
-# default columns for entities: id, annotator, begin, end, text, sentence, document, type
+# default columns for entities: id, annotator, begin, end, sentence, document, type
 # default columns for relations: id, annotator
 #
-# default indexed columns for entities: type, sentence
+# default indexed columns for entities (composite indices): (document, type, annotator, sentence, begin, end),
+#                                                          (sentence, annotator, begin), (type)
 #
 # default foreign keys for entities (cross table references):
 #   annotator -> annotators (id),
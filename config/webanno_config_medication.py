@@ -1,12 +1,14 @@
 # Streamlit Annotation Visualizer Configuration File
 # for WebAnno Project Exports
 #
-# default tables in database: annotators, sentences, documents, annotation_types, layers
+# default tables in database: annotators, sentences, document_texts, documents, annotation_types, layers,
+#                              ingest_manifest, sentence_annotation_summary
 #
-# default columns for entities: id, annotator, begin, end, text, sentence, document, type
+# default columns for entities: id, annotator, begin, end, sentence, document, type
 # default columns for relations: id, annotator
 #
-# default indexed columns for entities: type, sentence
+# default indexed columns for entities (composite indices): (document, type, annotator, sentence, begin, end),
+#                                                          (sentence, annotator, begin), (type)
 #
 # default foreign keys for entities (cross table references):
 #   annotator -> annotators (id),
@@ -45,6 +47,7 @@ additional_database_info = {
     },
     "relations": {  # <- contains relation annotations between entities
         "medication_relations": {  # <- key has to conform to a "layers" key
+            "type": "",  # <- the relation layer has no type feature
             "additional_columns": {
                 "entity": {
                     "data_type": "text"
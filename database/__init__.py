@@ -1 +1,5 @@
 from .database import *
+from .queries import QueryRepository
+from .catalog import AnnotationCatalog
+from .pool import ReadOnlyConnectionPool
+from .tempdb import TempDatabaseManager
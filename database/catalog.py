@@ -0,0 +1,111 @@
+from collections import defaultdict
+from typing import Union, List
+
+from .queries import QueryRepository
+
+
+class AnnotationCatalog:
+    def __init__(self, annotators: list, documents: list, layers: list, annotation_types: list) -> None:
+        """
+        Holds the small lookup tables of a database (annotators, documents, layers and annotation types) in both
+        directions, so that every id <-> name and type <-> layer lookup is a dict access. Ids are kept as strings
+        (the compact schema stores them as integers). If a name occurs more than once, it maps to its first id.
+
+        :param annotators: `(id, annotator)` rows
+        :param documents: `(id, document)` rows
+        :param layers: `(id, layer)` rows
+        :param annotation_types: `(id, type, layer id)` rows
+        """
+        self._annotators, self._annotator_ids = self._bidirectional(annotators)
+        self._documents, self._document_ids = self._bidirectional(documents)
+        self._layers, self._layer_ids = self._bidirectional(layers)
+        self._annotation_types, self._annotation_type_ids = self._bidirectional((r[0], r[1]) for r in annotation_types)
+        self._type_layers = {str(_id): str(_layer) for _id, _, _layer in annotation_types}
+        self._layer_type_ids = defaultdict(list)
+        self._layer_types = defaultdict(list)
+        for _id, _type, _layer in annotation_types:
+            self._layer_type_ids[str(_layer)].append(str(_id))
+            self._layer_types[str(_layer)].append(_type)
+        self._layer_type_id_sets = {_layer: frozenset(_ids) for _layer, _ids in self._layer_type_ids.items()}
+
+    @classmethod
+    def load(cls, queries: QueryRepository) -> 'AnnotationCatalog':
+        """
+        :param queries: the repository of the database the catalog is read from
+        :return: the catalog of the database
+        """
+        return cls(annotators=queries.execute("annotator_rows"), documents=queries.execute("document_rows"),
+                   layers=queries.execute("layer_rows"), annotation_types=queries.execute("annotation_type_rows"))
+
+    @staticmethod
+    def _bidirectional(rows) -> tuple:
+        names, ids = dict(), dict()
+        for _id, _name in rows:
+            names[str(_id)] = _name
+            ids.setdefault(_name, str(_id))
+        return names, ids
+
+    @property
+    def annotator_names(self) -> List[str]:
+        return sorted(self._annotator_ids.keys())
+
+    @property
+    def document_titles(self) -> List[str]:
+        return sorted(self._document_ids.keys())
+
+    @property
+    def annotation_type_ids(self) -> List[str]:
+        return list(self._annotation_types.keys())
+
+    @property
+    def annotation_type_names(self) -> List[str]:
+        return sorted(self._annotation_types.values())
+
+    def annotator_for_id(self, annotator_id: str) -> Union[str, None]:
+        return self._annotators.get(str(annotator_id))
+
+    def id_for_annotator(self, annotator: str) -> Union[str, None]:
+        return self._annotator_ids.get(annotator)
+
+    def document_for_id(self, document_id: str) -> Union[str, None]:
+        return self._documents.get(str(document_id))
+
+    def id_for_document(self, document: str) -> Union[str, None]:
+        return self._document_ids.get(document)
+
+    def layer_for_id(self, layer_id: str) -> Union[str, None]:
+        return self._layers.get(str(layer_id))
+
+    def id_for_layer(self, layer: str) -> Union[str, None]:
+        return self._layer_ids.get(layer.lower())
+
+    def annotation_type_for_id(self, type_id: str) -> Union[str, None]:
+        return self._annotation_types.get(str(type_id))
+
+    def id_for_annotation_type(self, annotation_type: str) -> Union[str, None]:
+        return self._annotation_type_ids.get(annotation_type.lower())
+
+    def layer_for_annotation_type_id(self, type_id: str) -> Union[str, None]:
+        return self._type_layers.get(str(type_id))
+
+    def annotation_type_ids_for_layer(self, layer_id: Union[str, None]) -> List[str]:
+        """
+        :param layer_id: id of the layer
+        :return: the ids of the annotation types of the layer
+        """
+        return list(self._layer_type_ids.get(str(layer_id), [])) if layer_id is not None else []
+
+    def annotation_types_for_layer(self, layer_id: Union[str, None]) -> List[str]:
+        """
+        :param layer_id: id of the layer
+        :return: the names of the annotation types of the layer
+        """
+        return list(self._layer_types.get(str(layer_id), [])) if layer_id is not None else []
+
+    def is_annotation_type_of_layer(self, type_id, layer_id: Union[str, None]) -> bool:
+        """
+        :param type_id: id of an annotation type (anything else, e.g. a list of ids, is never part of a layer)
+        :param layer_id: id of the layer
+        :return: whether the annotation type belongs to the layer
+        """
+        return isinstance(type_id, str) and type_id in self._layer_type_id_sets.get(str(layer_id), frozenset())
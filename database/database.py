@@ -4,27 +4,64 @@ import logging
 import sqlite3
 import pathlib
 import time
+import hashlib
+import zipfile
+import zlib
+import contextlib
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from collections import namedtuple, defaultdict
 from functools import partial
 from sqlite3 import Error
-from typing import Union, Tuple, List
+from typing import Union, Tuple, List, Dict, Set
 from collections.abc import Iterable
 
 import tqdm
+import numpy as np
 from cassis import Cas, load_typesystem, load_cas_from_xmi
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 import uima
-from app_constants import database_info, db_construction, layers, DefaultTableNames
-from app_constants.base_config import DatabaseCategories
+from app_constants import database_info, db_construction, layers, DefaultTableNames, compact_schema, \
+    compact_sentence_key, compress_texts
+from app_constants.base_config import DatabaseCategories, DatabaseConstructionKeys
 from bratsubset.annotation import Annotations
 from bratsubset.projectconfig import ProjectConfiguration
 from config.webanno_config_medication import layers as user_layers
 
 logging.basicConfig(level=logging.WARNING)
 
+BULK_INSERT_BUFFER_SIZE = 10000
+# (document, annotator) pairs an ingestion writes per transaction; what was committed survives a crash and is
+# skipped by the next incremental ingestion
+COMMIT_EVERY = 100
+# zlib level of the document texts if they are stored compressed (`compress_texts = true` in config.ini)
+TEXT_COMPRESSION_LEVEL = 6
+# pragmas while a database file is (re)built: a crash leaves an unusable file, which is then simply ingested again
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": "-262144",  # negative values are KiB, i.e. 256 MiB
+    "temp_store": "MEMORY"
+}
+# pragmas while rows are added to an existing database file: a crash (or a killed process) loses only the
+# transaction that was not committed yet (see `DataSaver.batch`)
+BATCH_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": "-262144",
+    "temp_store": "MEMORY"
+}
+# the SQLite defaults, which the file is switched back to once the load is done
+READ_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "cache_size": "-2000",
+    "temp_store": "DEFAULT"
+}
+
 
 class DBUtils:
     def __init__(self, in_memory: bool = True, db_file: str = 'sqlite.db') -> None:
@@ -58,6 +95,20 @@ class DBUtils:
             logging.error(e)
             return None
 
+    def set_pragmas(self, pragmas: dict) -> None:
+        """
+        Applies the given pragmas to the active connection (outside of a transaction, since `journal_mode`
+        can't be changed within one).
+
+        :param pragmas: `dict(pragma: value)`, e.g. `BULK_LOAD_PRAGMAS` or `READ_PRAGMAS`
+        :return:
+        """
+        if self.connection.in_transaction:
+            self.connection.commit()
+        for pragma, value in pragmas.items():
+            logging.info("Setting pragma '{0}' to '{1}'".format(pragma, value))
+            self.connection.execute("PRAGMA {0} = {1}".format(pragma, value))
+
     def close_connection(self) -> None:
         if self._connection:
             self._connection.commit()
@@ -66,26 +117,53 @@ class DBUtils:
 
 
 class DataSaver:
-    def __init__(self, db: DBUtils, db_structure: dict, reset_db: bool = False) -> None:
+    def __init__(self, db: DBUtils, db_structure: dict, reset_db: bool = False, buffer_size: int = 0,
+                 bulk_load: bool = False, triggers: bool = True) -> None:
         """
 
         :param db:
         :param db_structure: A dictionary of table creation instructions:
          `dict(table_name: dict("stm": str, "idx": list(str)))` where the "stm" string is what follows after
          `CREATE TABLE table_name` and the "idx" list is a list of indices to be declared (must conform with the
-         column names in "stm"). Key names "stm" & "idx" are mandatory and can't be chosen freely
+         column names in "stm"); an entry with comma separated column names declares a composite index.
+         Key names "stm" & "idx" are mandatory and can't be chosen freely; an optional "trg" entry
+         `dict(trigger_name: str)` declares triggers, the strings being what follows after `CREATE TRIGGER name`
          e.g.: db_structure = {"table1": {"stm": "(id txt PRIMARY KEY, type txt NOT NULL);", "idx": ["type"]}}
         :param reset_db:
+        :param buffer_size: if greater than 0, rows are not inserted one by one but collected per table and
+         flushed with `executemany` as soon as a table buffer holds `buffer_size` rows (or on `commit`);
+         all buffered inserts run inside one explicit transaction
+        :param bulk_load: if True and the database is built anew (`reset_db` or in memory), the connection is
+         switched to `BULK_LOAD_PRAGMAS` and the indices are only built in `finish_bulk_load` (after all rows are in);
+         the tables of an existing database file keep their indices and are written with `BATCH_PRAGMAS`
+        :param triggers: whether the triggers of the structure dict are created; if False, existing ones are dropped
+
+        Long ingestions write within `batch` and store every document in a `unit` of its own.
         """
         logging.info("Init database {0}".format(
             "in memory" if db.in_memory else "for the file {0}".format(db.db_file)))
         self._db = db
         self._db_struc = self._validate_structure_dict(db_structure)
+        self._buffer_size = buffer_size
+        self._buffers = dict()
+        self._insert_stats = defaultdict(lambda: [0, 0.0])
+        self._bulk_load = bulk_load and (reset_db or db.in_memory)
+        self._pragmas = BULK_LOAD_PRAGMAS if self._bulk_load else BATCH_PRAGMAS if bulk_load else None
+        self._triggers = triggers
+        self._deferred_indices = []
+        self._commit_every = 0
+        self._pending_units = 0
+        self._savepoints = 0
+        self._commit_stats = [0, 0.0, 0.0]  # <- commits, seconds, slowest commit in seconds
         if not db.connection:
             logging.error("db not instantiated")  # ToDo: better log
             sys.exit(-1)
+        if self._pragmas is not None:
+            db.set_pragmas(self._pragmas)
         if reset_db or db.in_memory:
             self._init_database()
+        if not triggers:
+            self._drop_triggers()
 
     @property
     def db_connection(self):
@@ -95,6 +173,14 @@ class DataSaver:
     def db_cursor(self):
         return self.db_connection.cursor()
 
+    @property
+    def buffered(self) -> bool:
+        return self._buffer_size > 0
+
+    @property
+    def triggers(self) -> bool:
+        return self._triggers
+
     @staticmethod
     def _validate_structure_dict(db_structure) -> dict:
         # ToDo implement specific error not TypeError
@@ -116,8 +202,15 @@ class DataSaver:
             if not all(isinstance(e, str) for e in value.get("idx")):
                 logging.error("")
                 raise TypeError
+            if not all(isinstance(k, str) and isinstance(v, str) for k, v in value.get("trg", {}).items()):
+                logging.error("")
+                raise TypeError
         return db_structure
 
+    @staticmethod
+    def _index_name(table_name: str, idx: str) -> str:
+        return "idx_{0}_{1}".format(table_name.split("_")[-1], "_".join(c.strip() for c in idx.split(",")))
+
     def _init_database(self) -> None:
         logging.info("Reset database {}".format(
             "in memory" if self._db.in_memory else "for the file '{0}'".format(self._db.db_file)))
@@ -125,9 +218,42 @@ class DataSaver:
             self._drop_table_exec(table_name)
             self._create_table_exec(table_name, table_dict.get("stm"))
             for idx in table_dict.get("idx"):
-                idx_name = "idx_{0}_{1}".format(table_name.split("_")[-1], idx)
+                idx_name = self._index_name(table_name, idx)
                 self._drop_index_exec(idx_name)
-                self._create_index_exec(idx_name, table_name, idx)
+                if self._bulk_load:
+                    self._deferred_indices.append((idx_name, table_name, idx))
+                else:
+                    self._create_index_exec(idx_name, table_name, idx)
+        if self._triggers:
+            self._create_triggers()
+
+    def create_missing_tables(self) -> List[str]:
+        """
+        Creates the tables and indices of the structure dict that are not yet part of the database
+        (e.g. for database files that were built before a table was introduced). Existing tables are left untouched.
+
+        :return: the names of the tables that were created
+        """
+        existing = {row[0] for row in self.db_cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        created = [table_name for table_name in self._db_struc.keys() if table_name.lower() not in existing]
+        for table_name, table_dict in self._db_struc.items():
+            self._create_table_exec(table_name, table_dict.get("stm"))
+            for idx in table_dict.get("idx"):
+                idx_name = self._index_name(table_name, idx)
+                self._create_index_exec(idx_name, table_name, idx, if_not_exists=True)
+        if self._triggers:
+            self._create_triggers()
+        return created
+
+    def _create_triggers(self) -> None:
+        for table_dict in self._db_struc.values():  # <- triggers may refer to any table
+            for trg_name, trg in table_dict.get("trg", {}).items():
+                self._create_trigger_exec(trg_name, trg)
+
+    def _drop_triggers(self) -> None:
+        for table_dict in self._db_struc.values():
+            for trg_name in table_dict.get("trg", {}).keys():
+                self._drop_trigger_exec(trg_name)
 
     def _drop_table_exec(self, table_name: str) -> None:
         logging.info("Dropping old table '{0}'".format(table_name))
@@ -147,20 +273,185 @@ class DataSaver:
             "DROP INDEX IF EXISTS {0}".format(idx_name.lower())
         )
 
-    def _create_index_exec(self, idx_name: str, table_name: str, col_name: str) -> None:
+    def _create_index_exec(self, idx_name: str, table_name: str, col_name: str, if_not_exists: bool = False) -> None:
         logging.info("Creating index '{0}'".format(idx_name))
         self.db_cursor.execute(
-            "CREATE INDEX {0} ON {1}({2})".format(idx_name.lower(), table_name.lower(), col_name)
+            "CREATE INDEX {3}{0} ON {1}({2})".format(
+                idx_name.lower(), table_name.lower(), col_name, "IF NOT EXISTS " if if_not_exists else "")
+        )
+
+    def _create_trigger_exec(self, trg_name: str, stm: str) -> None:
+        logging.info("Creating trigger '{0}'".format(trg_name))
+        self.db_cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS {0} {1}".format(trg_name.lower(), stm)
+        )
+
+    def _drop_trigger_exec(self, trg_name: str) -> None:
+        logging.info("Dropping trigger '{0}'".format(trg_name))
+        self.db_cursor.execute(
+            "DROP TRIGGER IF EXISTS {0}".format(trg_name.lower())
         )
 
     def commit(self) -> None:
         """
         Calls commit on the sqlite3 connection. This will also be done when the connection is closed,
         but if you want to save your database changes midway through call this.
+        In buffered mode all pending rows are flushed first.
 
         :return:
         """
+        self.flush()
+        if self.db_connection.in_transaction:
+            start = time.perf_counter()
+            self.db_connection.commit()
+            seconds = time.perf_counter() - start
+            self._commit_stats[0] += 1
+            self._commit_stats[1] += seconds
+            self._commit_stats[2] = max(self._commit_stats[2], seconds)
+        self._pending_units = 0
+
+    def commit_report(self) -> dict:
+        """
+        :return: `dict("commits": int, "seconds": float, "ms/commit": float, "max ms": float)` of the commits so far
+        """
+        commits, seconds, slowest = self._commit_stats
+        return {"commits": commits, "seconds": seconds, "ms/commit": 1000 * seconds / commits if commits > 0 else 0.0,
+                "max ms": 1000 * slowest}
+
+    @contextlib.contextmanager
+    def batch(self, commit_every: int = 0):
+        """
+        Scope of a long ingestion: the units (see `unit`) written within are committed in transactions of
+        `commit_every` units, so that a failure only loses the units since the last commit and the journal only
+        holds the changes of one transaction. Everything written in the scope is committed when it is left, also if
+        an exception ends it (the unit the exception came from was already rolled back).
+
+        :param commit_every: number of units per transaction; with 0 the scope is committed only at its end
+        :return:
+        """
+        previous_commit_every, self._commit_every = self._commit_every, commit_every
+        try:
+            yield self
+        finally:
+            self._commit_every = previous_commit_every
+            self.commit()
+
+    @contextlib.contextmanager
+    def unit(self, name: str):
+        """
+        Writes everything of one unit (e.g. a document) within a savepoint: if the block raises, the rows the unit
+        wrote (including the buffered ones) are rolled back and the exception is re-raised. Within a `batch`
+        a transaction is committed after every `commit_every` units.
+
+        :param name: name of the unit (for the log)
+        :return:
+        """
+        self.flush()
+        self._begin_transaction()
+        self._savepoints += 1
+        savepoint = "unit_{0}".format(self._savepoints)
+        insert_stats = {table_name: list(stats) for table_name, stats in self._insert_stats.items()}
+        self.db_cursor.execute("SAVEPOINT {0}".format(savepoint))
+        try:
+            yield
+            self.flush()
+        except BaseException:
+            logging.warning("Rolling back '{0}'".format(name))
+            self._buffers.clear()
+            self._insert_stats.clear()
+            self._insert_stats.update(insert_stats)
+            if self.db_connection.in_transaction:  # <- some errors (e.g. a full disk) end the transaction themselves
+                self.db_cursor.execute("ROLLBACK TO {0}".format(savepoint))
+                self.db_cursor.execute("RELEASE {0}".format(savepoint))
+            raise
+        self.db_cursor.execute("RELEASE {0}".format(savepoint))
+        self._pending_units += 1
+        if 0 < self._commit_every <= self._pending_units:
+            self.commit()
+
+    def flush(self, table_name: Union[str, None] = None) -> None:
+        """
+        Writes the buffered rows of `table_name` (or of all tables if `None`) with one `executemany` per table.
+
+        :param table_name: name of the table whose buffer should be flushed
+        :return:
+        """
+        for _table in ([table_name] if table_name is not None else list(self._buffers.keys())):
+            columns, ignore_duplicates, rows = self._buffers.pop(_table, (None, False, []))
+            if len(rows) > 0:
+                self._execute_many(_table, columns, rows, ignore_duplicates)
+
+    def finish_bulk_insert(self) -> dict:
+        """
+        Flushes and commits all pending rows and reports the insert throughput for every table that was written
+        since the last call.
+
+        :return: `dict(table_name: dict("rows": int, "seconds": float, "rows/sec": float))`
+        """
+        self.commit()
+        report = {}
+        for table_name, (rows, seconds) in sorted(self._insert_stats.items()):
+            report[table_name] = {"rows": rows, "seconds": seconds, "rows/sec": rows / seconds if seconds > 0 else 0.0}
+            logging.info("Inserted {0} rows into '{1}' ({2:.0f} rows/sec)".format(
+                rows, table_name, report[table_name]["rows/sec"]))
+        self._insert_stats.clear()
+        commit_report = self.commit_report()
+        logging.info("{0} commits ({1:.1f} ms/commit, slowest {2:.1f} ms)".format(
+            commit_report["commits"], commit_report["ms/commit"], commit_report["max ms"]))
+        return report
+
+    def finish_bulk_load(self) -> dict:
+        """
+        Ends a `bulk_load`: flushes and commits all pending rows, builds the deferred indices, switches the
+        connection back to `READ_PRAGMAS` (which also checkpoints the write-ahead log of `BATCH_PRAGMAS`) and runs `ANALYZE` so that the query planner knows the final table sizes.
+
+        :return: the insert report of `finish_bulk_insert`
+        """
+        report = self.finish_bulk_insert()
+        start = time.perf_counter()
+        for idx_name, table_name, idx in self._deferred_indices:
+            self._create_index_exec(idx_name, table_name, idx, if_not_exists=True)
+        self._deferred_indices.clear()
+        self.db_connection.commit()
+        logging.info("Created indices in {0:.2f} sec".format(time.perf_counter() - start))
+        if self._pragmas is not None:
+            self._db.set_pragmas(READ_PRAGMAS)
+            self._pragmas = None
+        self._bulk_load = False
+        self.db_cursor.execute("ANALYZE")
         self.db_connection.commit()
+        return report
+
+    def _begin_transaction(self) -> None:
+        if not self.db_connection.in_transaction:
+            self.db_connection.execute("BEGIN")
+
+    def _execute_many(self, table_name: str, columns: Union[list, set, tuple], rows: list,
+                      ignore_duplicates: bool) -> None:
+        self._begin_transaction()
+        start = time.perf_counter()
+        self.db_cursor.executemany(
+            "INSERT{3} INTO {0}({1}) VALUES ({2})".format(
+                table_name, ",".join(columns), ",".join(["?"] * len(columns)),
+                " OR IGNORE" if ignore_duplicates else ""),
+            rows
+        )
+        stats = self._insert_stats[table_name]
+        stats[0] += len(rows)
+        stats[1] += time.perf_counter() - start
+
+    def _buffer_rows(self, table_name: str, columns: tuple, rows: Iterable, ignore_duplicates: bool) -> None:
+        buffered_columns, buffered_ignore, _ = self._buffers.get(table_name, (columns, ignore_duplicates, None))
+        if buffered_columns != columns or buffered_ignore != ignore_duplicates:
+            # rows of one table have to be written in the order they were given; a different insert statement
+            # for the same table therefore needs the preceding rows to be written first
+            self.flush(table_name)
+        buffer = self._buffers.setdefault(table_name, (columns, ignore_duplicates, []))[2]
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= self._buffer_size:
+                self.flush(table_name)
+                buffer = self._buffers.setdefault(table_name, (columns, ignore_duplicates, []))[2]
 
     def store_into_table(self, table_name: str, columns: Union[list, set] = None, ignore_duplicates: bool = False,
                          **kwargs) -> None:
@@ -180,6 +471,9 @@ class DataSaver:
         if len(kwargs) == 1 and isinstance(list(kwargs.values())[0], Iterable):
             iterable = list(kwargs.values())[0]
             logging.info("Populating table '{0}' with values from iterable".format(table_name))
+            if self.buffered:
+                self._buffer_rows(table_name, tuple(columns), iterable, ignore_duplicates)
+                return
             self.db_cursor.executemany(
                 "INSERT{3} INTO {0}({1}) VALUES ({2})".format(
                     table_name, ",".join(columns), ",".join(["?"] * len(columns)), insert_stm),
@@ -187,6 +481,9 @@ class DataSaver:
             )
         else:
             cols, row = kwargs.keys(), [str(v) if isinstance(v, int) else v for v in kwargs.values()]
+            if self.buffered:
+                self._buffer_rows(table_name, tuple(cols), [row], ignore_duplicates)
+                return
             # ToDo: better log
             logging.info("Populating columns '{0}' of table '{1}'".format(", ".join(cols), table_name))
             self.db_cursor.execute(
@@ -195,7 +492,29 @@ class DataSaver:
                 row
             )
 
+    def delete_from_table(self, table_name: str, like_columns: Union[dict, None] = None, **kwargs) -> None:
+        """
+        Deletes the rows of `table_name` whose columns equal the values given as keyword argument pairs:
+        `delete_from_table(table_name, col1=val1, col2=val2, ...)`. `like_columns` adds `col LIKE pattern`
+        conditions. Buffered rows of the table are written first.
+
+        :param table_name: name of the reference table
+        :param like_columns: `dict(column: pattern)`
+        :param kwargs:
+        :return:
+        """
+        self.flush(table_name)
+        like_columns = like_columns if like_columns is not None else {}
+        conditions = ["{} = ?".format(col) for col in kwargs.keys()] + \
+                     ["{} LIKE ?".format(col) for col in like_columns.keys()]
+        values = [str(v) if isinstance(v, int) else v for v in list(kwargs.values()) + list(like_columns.values())]
+        self.db_cursor.execute(
+            "DELETE FROM {0} WHERE {1}".format(table_name, " AND ".join(conditions)),
+            values
+        )
+
     def update_row_of_table(self, table_name: str, where_cols: List[Tuple[str, str]], **kwargs):
+        self.flush(table_name)
         cols, row = list(kwargs.keys()), [str(v) if isinstance(v, int) else v for v in kwargs.values()]
         self.db_cursor.execute(
             """
@@ -204,12 +523,37 @@ class DataSaver:
             WHERE {2}
             """.format(
                 table_name, ",\n".join(["{} = ?".format(cols[i]) for i in range(len(cols))]),
-                "".join(["{} = '{}'".format(t[0], t[1]) for t in where_cols])
+                " AND ".join(["{} = ?".format(t[0]) for t in where_cols])
             ),
-            row
+            row + [t[1] for t in where_cols]
         )
 
 
+def query_plan(connection: sqlite3.Connection, query: str, params: tuple = ()) -> List[str]:
+    """
+    :param connection: the database connection the query is planned for
+    :param query: an SQL statement
+    :param params: values bound to the "?" parameters of the statement
+    :return: the "detail" lines of `EXPLAIN QUERY PLAN` for the statement
+    """
+    return [row[3] for row in connection.execute("EXPLAIN QUERY PLAN {0}".format(query), params)]
+
+
+def full_scans(connection: sqlite3.Connection, query: str, params: tuple = ()) -> List[str]:
+    """
+    Lists the steps of the query plan that read a whole table (or a whole index) instead of searching it.
+    Scans of subqueries and constant rows are not counted.
+
+    :param connection: the database connection the query is planned for
+    :param query: an SQL statement
+    :param params: values bound to the "?" parameters of the statement
+    :return: the "SCAN" lines of the query plan
+    """
+    return [step for step in query_plan(connection, query, params)
+            if step.startswith("SCAN ")
+            and not step.startswith(("SCAN CONSTANT ROW", "SCAN (subquery"))]
+
+
 def get_anno_type_id(anno_types: list, anno_type: str, layer_id: str, ds: DataSaver):
     store_into_db = False
     anno_type = anno_type.lower()  # ToDo: to lower or not?
@@ -234,72 +578,363 @@ def get_layer_id(l_types: list, layer: str, ds: DataSaver):
     return layer_id
 
 
+class CompactIds:
+    def __init__(self, ds: DataSaver) -> None:
+        """
+        Replaces the composite text ids of flattened rows (e.g. "doc-annotator-T12" or "doc-sentence-annotator")
+        with the integer ids of the compact schema. Create it after rows were deleted (incremental update) and before
+        new rows are written: the next free id of every table is read only once.
+        Sentences keep their id for the whole run, since they are shared by the annotators of a document; entity ids
+        are only needed to resolve the relations of the same (document, annotator) pair.
+
+        :param ds:
+        """
+        self._entity_tables = [t.lower() for t in database_info.get(DatabaseCategories.entities, {}).keys()]
+        self._entity_references = defaultdict(dict)
+        for rel_table, rel_dict in database_info.get(DatabaseCategories.relations, {}).items():
+            for column, reference in rel_dict.get(DatabaseConstructionKeys.foreign_keys, {}).items():
+                if reference.get("table", "").lower() in self._entity_tables:
+                    self._entity_references[rel_table.lower()][column.lower()] = reference.get("table").lower()
+        self._next_ids = {}
+        for table_name in self._entity_tables + list(self._entity_references.keys()) + [DefaultTableNames.sentences]:
+            ds.flush(table_name)
+            self._next_ids[str(table_name)] = ds.db_cursor.execute(
+                "SELECT COALESCE(MAX(id), -1) + 1 FROM {0}".format(table_name)).fetchone()[0]
+        self._sentences = {key: _id for _id, key in ds.db_cursor.execute(
+            "SELECT id, {0} FROM {1}".format(compact_sentence_key, DefaultTableNames.sentences))}
+
+    def _next_id(self, table_name: str) -> int:
+        _id = self._next_ids[table_name]
+        self._next_ids[table_name] += 1
+        return _id
+
+    def sentence_id(self, key: str) -> int:
+        if key not in self._sentences:
+            self._sentences[key] = self._next_id(str(DefaultTableNames.sentences))
+        return self._sentences[key]
+
+    def convert(self, table_rows: List[Tuple[str, tuple, list]]) -> List[Tuple[str, tuple, list]]:
+        """
+        :param table_rows: the `(table_name, columns, rows)` of one (document, annotator) pair
+        :return: the same rows with integer ids; sentence rows get the columns `sentence_index` and
+         `sentence_annotator`
+        """
+        entities = {}
+
+        def entity_id(table_name: str, key: str) -> int:
+            if key not in entities:
+                entities[key] = self._next_id(table_name)
+            return entities[key]
+
+        converted = []
+        for table_name, columns, rows in table_rows:
+            if table_name == DefaultTableNames.sentences:
+                rows = [(self.sentence_id(row[0]),) + tuple(row[1:]) + _sentence_key_parts(row[0]) for row in rows]
+                columns = tuple(columns) + COMPACT_SENTENCE_COLUMNS
+            elif table_name in self._entity_tables:
+                sentence_idx = columns.index("sentence")
+                rows = [tuple(entity_id(table_name, v) if i == 0 else self.sentence_id(v) if i == sentence_idx else v
+                              for i, v in enumerate(row)) for row in rows]
+            elif table_name in self._entity_references:
+                references = {columns.index(column): ref_table
+                              for column, ref_table in self._entity_references[table_name].items() if column in columns}
+                rows = [tuple(self._next_id(table_name) if i == 0 else
+                              entity_id(references[i], v) if i in references else v
+                              for i, v in enumerate(row)) for row in rows]
+            converted.append((table_name, columns, rows))
+        return converted
+
+
+def _sentence_key_parts(key: str) -> Tuple[str, Union[str, None]]:
+    # "doc-sentence" or "doc-sentence-annotator" -> (sentence index, annotator of a disparate sentence)
+    parts = key.split("-")
+    return parts[1], parts[2] if len(parts) > 2 else None
+
+
+DOCUMENT_TEXT_COLUMNS = ("hash", "text", "compressed")
+
+
+def document_text_row(text: str, compress: bool = compress_texts) -> Tuple[str, Union[str, bytes], str]:
+    """
+    :param text: the text of a document
+    :param compress: whether the text is stored as zlib compressed UTF-8 bytes
+    :return: the `document_texts` row of the text (without its id); the rows of a (document, annotator) pair
+     reference the text with its hash, the SHA-1 of the text, until `DocumentTextIds.convert` replaces it
+    """
+    encoded = text.encode('utf-8')
+    text_hash = hashlib.sha1(encoded).hexdigest()
+    if compress:
+        return text_hash, zlib.compress(encoded, TEXT_COMPRESSION_LEVEL), "1"
+    return text_hash, text, "0"
+
+
+def decode_document_text(text: Union[str, bytes], compressed: Union[int, str]) -> str:
+    """
+    :param text: the "text" column of a `document_texts` row
+    :param compressed: the "compressed" column of the row
+    :return: the text of the document; the text of a sentence (or annotation) is the slice of its offsets
+    """
+    return zlib.decompress(text).decode('utf-8') if int(compressed) else text
+
+
+class DocumentTextIds:
+    def __init__(self, ds: DataSaver) -> None:
+        """
+        Replaces the hashes the flattened rows reference their document text with (see `document_text_row`) by the
+        id of the text, so that every distinct text is stored only once however many annotators (or documents)
+        share it. Stored texts are looked up by their hash for every (document, annotator) pair, i.e. the texts of
+        a pair that was rolled back are not referenced; new texts get the next free id.
+
+        :param ds:
+        """
+        self._ds = ds
+        ds.flush(DefaultTableNames.document_texts)
+        self._next_id = ds.db_cursor.execute("SELECT COALESCE(MAX(CAST(id AS INTEGER)), -1) + 1 FROM {0}".format(
+            DefaultTableNames.document_texts)).fetchone()[0]
+
+    def convert(self, table_rows: List[Tuple[str, tuple, list]]) -> List[Tuple[str, tuple, list]]:
+        """
+        :param table_rows: the `(table_name, columns, rows)` of one (document, annotator) pair
+        :return: the same rows with the ids of the document texts; the rows of `document_texts` get their id
+         (rows of texts that are already stored are kept and ignored when they are written)
+        """
+        hashes = {row[0] for table_name, _, rows in table_rows if table_name == DefaultTableNames.document_texts
+                  for row in rows}
+        self._ds.flush(DefaultTableNames.document_texts)
+        ids = {text_hash: _id for text_hash, _id in self._ds.db_cursor.execute(
+            "SELECT hash, id FROM {0} WHERE hash IN ({1})".format(
+                DefaultTableNames.document_texts, ",".join(["?"] * len(hashes))), tuple(hashes))}
+        for text_hash in sorted(hashes.difference(ids.keys())):
+            ids[text_hash] = self._next_id if compact_schema else str(self._next_id)
+            self._next_id += 1
+        converted = []
+        for table_name, columns, rows in table_rows:
+            if table_name == DefaultTableNames.document_texts:
+                rows = [(ids[row[0]],) + tuple(row) for row in rows]
+                columns = ("id",) + tuple(columns)
+            elif table_name == DefaultTableNames.sentences:
+                text_idx = columns.index("document_text")
+                rows = [row[:text_idx] + (ids[row[text_idx]],) + row[text_idx + 1:] for row in rows]
+            converted.append((table_name, columns, rows))
+        return converted
+
+
+XmiEntityLayer = namedtuple('XmiEntityLayer', ['table', 'fqn', 'type_feature', 'feature_columns'])
+XmiRelationLayer = namedtuple('XmiRelationLayer', ['table', 'source_fqn', 'link_feature', 'source_column',
+                                                   'target_column'])
+XmiContext = namedtuple('XmiContext', ['sentence_layer', 'entity_layers', 'relation_layers'])
+
+XMI_ENTITY_COLUMNS = ("id", "annotator", "begin", "end", "sentence", "document", "type")
+
+_xmi_worker_state = dict()
+
+
+def xmi_context(layer_info: dict) -> XmiContext:
+    """
+    Collects (as plain tuples) which WebAnno layer and features go into which table and column.
+
+    :param layer_info: as returned by `uima.get_layer_information_from_type_system`
+    :return:
+    """
+    entity_layers = []
+    for table_name, entry in database_info.get(DatabaseCategories.entities, {}).items():
+        fqn = user_layers.get(table_name)
+        if fqn not in layer_info.get("annotations"):
+            continue
+        entity_layers.append(XmiEntityLayer(
+            table=table_name.lower(), fqn=fqn, type_feature=entry.get(DatabaseConstructionKeys.type),
+            feature_columns=tuple((column, column_dict.get("internal_name"))
+                                  for column, column_dict in entry.get(DatabaseConstructionKeys.columns).items()
+                                  if isinstance(column_dict, dict) and column_dict.get("internal_name"))))
+    relation_layers = []
+    for table_name, entry in database_info.get(DatabaseCategories.relations, {}).items():
+        relation = entry.get("relation", {})
+        source, target = relation.get("source", {}), relation.get("target", {})
+        source_layer = layer_info.get("annotations").get(user_layers.get(source.get("ref_entity")))
+        if source_layer is None:
+            continue
+        for feat_name, feat in source_layer.features.items():
+            if feat.get('elementType', None) in layer_info.get("relations"):
+                relation_layers.append(XmiRelationLayer(
+                    table=table_name.lower(), source_fqn=source_layer.fqn, link_feature=feat_name,
+                    source_column=source.get("column_name"), target_column=target.get("column_name")))
+    return XmiContext(sentence_layer=layers.get(DefaultTableNames.sentences), entity_layers=entity_layers,
+                      relation_layers=relation_layers)
+
+
+def xmi_rows_for_annotator(cas: Cas, annotator_id: str, document_id: str, context: XmiContext) \
+        -> List[Tuple[str, tuple, list]]:
+    """
+    Flattens the CAS of one (document, annotator) pair into plain row tuples. The "type" column of entity rows
+    holds the type name; it is replaced by the type id when the rows are written.
+
+    :return: a list of `(table_name, columns, rows)`; the sentence rows (their `has_annotation` flag is set by the
+     triggers of the annotation summary) are followed by the row of the document text
+    """
+    table_rows = []
+    text_row = document_text_row(cas.sofa_string)
+    sentences = sorted(cas.select(context.sentence_layer), key=lambda _s: (int(_s.begin), -int(_s.end)))
+    sentence_ids = ["{}-{}".format(document_id, str(sentence.xmiID)) for sentence in sentences]
+    sentence_begins = np.fromiter((int(sentence.begin) for sentence in sentences), dtype=np.int64,
+                                  count=len(sentences))
+    sentence_ends = np.fromiter((int(sentence.end) for sentence in sentences), dtype=np.int64, count=len(sentences))
+    for layer in context.entity_layers:
+        entities, sentence_idx = _entities_in_sentences(list(cas.select(layer.fqn)), sentence_begins, sentence_ends)
+        rows = []
+        for entity, idx in zip(entities, sentence_idx):
+            sentence_begin = int(sentence_begins[idx])
+            rows.append(
+                ("{}-{}-{}".format(document_id, annotator_id, str(entity.xmiID)), annotator_id,
+                 str(int(entity.begin) - sentence_begin), str(int(entity.end) - sentence_begin),
+                 sentence_ids[idx], document_id,
+                 str(getattr(entity, layer.type_feature, None)).lower())
+                + tuple(_feature_value(getattr(entity, feature, None)) for _, feature in layer.feature_columns)
+            )
+        table_rows.append((layer.table, XMI_ENTITY_COLUMNS + tuple(c for c, _ in layer.feature_columns), rows))
+    for layer in context.relation_layers:
+        rows = []
+        for source in cas.select(layer.source_fqn):
+            links = getattr(source, layer.link_feature, None)
+            for link in (links.elements if links is not None and links.elements is not None else []):
+                rows.append(("{}-{}-{}".format(document_id, annotator_id, str(link.xmiID)), annotator_id,
+                             "{}-{}-{}".format(document_id, annotator_id, str(source.xmiID)),
+                             "{}-{}-{}".format(document_id, annotator_id, str(link.target.xmiID))))
+        table_rows.append((layer.table, ("id", "annotator", layer.source_column, layer.target_column), rows))
+    table_rows.append((str(DefaultTableNames.sentences), SENTENCE_COLUMNS, [
+        (sentence_id, str(sentence.begin), str(sentence.end), document_id, text_row[0], "0")
+        for sentence_id, sentence in zip(sentence_ids, sentences)]))
+    table_rows.append((str(DefaultTableNames.document_texts), DOCUMENT_TEXT_COLUMNS, [text_row]))
+    return table_rows
+
+
+def _entities_in_sentences(entities: list, sentence_begins: np.ndarray, sentence_ends: np.ndarray) \
+        -> Tuple[list, np.ndarray]:
+    """
+    Assigns every entity to the sentence that covers it with one `searchsorted` against the sorted sentence
+    starts (instead of a `select_covered` per sentence). Like `select_covered`, entities that are not fully
+    covered by a sentence are dropped.
+
+    :param entities: the annotations of one layer
+    :param sentence_begins: the sorted begin offsets of the sentences
+    :param sentence_ends: the end offsets of the sentences (in the order of `sentence_begins`)
+    :return: the covered entities (ordered by sentence and begin) and the index of their sentence
+    """
+    if len(entities) == 0 or len(sentence_begins) == 0:
+        return [], np.zeros(0, dtype=np.int64)
+    begins = np.fromiter((int(entity.begin) for entity in entities), dtype=np.int64, count=len(entities))
+    ends = np.fromiter((int(entity.end) for entity in entities), dtype=np.int64, count=len(entities))
+    sentence_idx = np.searchsorted(sentence_begins, begins, side="right") - 1
+    covered = (sentence_idx >= 0) & (ends <= sentence_ends[np.maximum(sentence_idx, 0)])
+    order = np.flatnonzero(covered)
+    order = order[np.lexsort((begins[order], sentence_idx[order]))]
+    return [entities[i] for i in order], sentence_idx[order]
+
+
+def _feature_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return "1" if value.lower() == "true" else "0"
+    return str(value) if isinstance(value, int) else value
+
+
 def store_xmi_in_db(cas: Cas, annotator: str, annotator_id: str, document: str, document_id: str,
                     anno_types: list, l_types: list, s_list: set, ds: DataSaver, layer_info: dict):
-    # ToDo: right now ds.store_into_table IGNOREs duplicate sentence ids, but it would be better if I catch the sen-
-    # ToDo: tences in each following cas (after the first one) and don't try to put them into the db in the first place
-    # ToDo: (as well as annotators and documents)
-    # ToDo: --> only true for annotators and documents; do I need to change this?
+    return store_xmi_rows(xmi_rows_for_annotator(cas, annotator_id, document_id, xmi_context(layer_info)),
+                          annotator, annotator_id, document, document_id, anno_types, l_types, s_list, ds)
+
+
+def store_xmi_rows(table_rows: List[Tuple[str, tuple, list]], annotator: str, annotator_id: str, document: str,
+                   document_id: str, anno_types: list, l_types: list, s_list: set, ds: DataSaver,
+                   compact_ids: Union[CompactIds, None] = None, text_ids: Union[DocumentTextIds, None] = None):
+    """
+    Writes the rows of `xmi_rows_for_annotator` and their `sentence_annotation_summary` rows: type names are
+    replaced by their ids (new types and layers are stored on the fly) and sentences that are already stored
+    (by another annotator) are skipped; their `has_annotation` flag is set by the triggers of the summary.
+    The document text is only stored if one of the stored sentences references it.
+
+    :param s_list: ids of the sentences that are already stored
+    :param compact_ids: converts the ids for the compact schema (one is created if needed and not given)
+    :param text_ids: resolves the document texts (one is created if not given)
+    """
     ds.store_into_table(DefaultTableNames.annotators, ignore_duplicates=True, id=annotator_id, annotator=annotator)
     ds.store_into_table(DefaultTableNames.documents, ignore_duplicates=True, id=document_id, document=document)
-    for sentence in cas.select(layers.get(DefaultTableNames.sentences)):
-        has_annotation = False
-        sentence_id = "{}-{}".format(document_id, str(sentence.xmiID))
-        for layer, layer_obj in layer_info.get("annotations").items():
-            for entity in cas.select_covered(layer, sentence):
-                uima
-        # layer = const.LayerTypes.MEDICATION_ENTITY
-        # for entity in cas.select_covered(const.LayerTypes.MEDICATION_ENTITY, sentence):
-        #     ent = uima.LAYER_DICT.get(const.LayerTypes.MEDICATION_ENTITY)(entity, cas)
-        #     anno_type = ent.get_fs_property(const.LayerProperties.MEDICATION_ENTITY_TYPE)
-        #     entity_id = "{}-{}".format(annotator_id, str(ent.xmi_id))
-        #     ds.store_into_table(const.LAYER_TNAME_DICT.get(const.LayerTypes.MEDICATION_ENTITY),
-        #                         id=entity_id, annotator=annotator_id,
-        #                         begin=(int(ent.begin) - int(sentence.begin)), end=(int(ent.end) - int(sentence.begin)),
-        #                         text=ent.covered_text, sentence=sentence_id, document=document_id,
-        #                         type=get_anno_type_id(anno_types, anno_type, get_layer_id(l_types, layer, ds), ds),
-        #                         list=1 if ent.get_fs_property(const.LayerProperties.MEDICATION_ENTITY_IS_LIST) else 0,
-        #                         recommendation=1 if ent.get_fs_property(
-        #                             const.LayerProperties.MEDICATION_ENTITY_IS_RECOMMENDATION) else 0)
-        #     has_annotation = True
-        # layer = const.LayerTypes.MEDICATION_ATTRIBUTE
-        # for attribute in cas.select_covered(const.LayerTypes.MEDICATION_ATTRIBUTE, sentence):
-        #     attr = uima.LAYER_DICT.get(const.LayerTypes.MEDICATION_ATTRIBUTE)(attribute, cas)
-        #     anno_type = attr.get_fs_property(const.LayerProperties.MEDICATION_ATTRIBUTE_TYPE)
-        #     attribute_id = "{}-{}".format(annotator_id, str(attr.xmi_id))
-        #     ds.store_into_table(const.LAYER_TNAME_DICT.get(const.LayerTypes.MEDICATION_ATTRIBUTE),
-        #                         id=attribute_id, annotator=annotator_id,
-        #                         begin=(int(attr.begin) - int(sentence.begin)),
-        #                         end=(int(attr.end) - int(sentence.begin)),
-        #                         text=attr.covered_text, sentence=sentence_id, document=document_id,
-        #                         type=get_anno_type_id(anno_types, anno_type, get_layer_id(l_types, layer, ds), ds))
-        #     has_annotation = True
-        #     for rel_ent in attr.get_fs_property(const.LayerProperties.MEDICATION_ATTRIBUTE_RELATION):
-        #         rel_id = rel_ent[0]
-        #         rel_target = rel_ent[1]
-        #         relation_id = "{}-{}".format(annotator_id, str(rel_id))
-        #         ds.store_into_table(const.LAYER_TNAME_DICT.get(const.LayerTypes.RELATION),
-        #                             id=relation_id, annotator=annotator_id,
-        #                             entity="{}-{}".format(annotator_id, str(rel_target.xmi_id)),
-        #                             attribute=attribute_id)
-        for layer_name, layer_fqn in user_layers.items():
-            for anno_fs in cas.select_covered(layer_fqn, sentence):
-                annotation = uima.WebAnnoLayer(layer_fqn, )
-        if sentence_id not in s_list:
-            s_list.add(sentence_id)
-            ds.store_into_table(const.LAYER_TNAME_DICT.get(const.LayerTypes.SENTENCE),
-                                id=sentence_id, document=document_id, begin=sentence.begin, end=sentence.end,
-                                text=sentence.get_covered_text(), has_annotation=1 if has_annotation else 0)
-        elif sentence_id in s_list and has_annotation:
-            ds.update_row_of_table(const.LAYER_TNAME_DICT.get(const.LayerTypes.SENTENCE),
-                                   [("id", sentence_id)],
-                                   has_annotation=1
-                                   )
+    marks = entity_table_marks(ds)
+    table_rows = (text_ids if text_ids is not None else DocumentTextIds(ds)).convert(table_rows)
+    if compact_schema:
+        table_rows = (compact_ids if compact_ids is not None else CompactIds(ds)).convert(table_rows)
+    layer_fqn = {layer.lower(): fqn for layer, fqn in user_layers.items()}
+    referenced_texts = set()
+    for table_name, columns, rows in table_rows:
+        if table_name == DefaultTableNames.sentences:
+            rows = [row for row in rows if row[0] not in s_list]
+            s_list.update(row[0] for row in rows)
+            referenced_texts.update(row[columns.index("document_text")] for row in rows)
+            ds.store_into_table(table_name, columns=columns, rows=rows)
+            continue
+        if table_name == DefaultTableNames.document_texts:
+            rows = [row for row in rows if row[0] in referenced_texts]
+        if "type" in columns:
+            type_idx = columns.index("type")
+            layer_id = get_layer_id(l_types, layer_fqn.get(table_name, table_name), ds)
+            rows = [row[:type_idx] + (get_anno_type_id(anno_types, row[type_idx], layer_id, ds),) + row[type_idx + 1:]
+                    for row in rows]
+        ds.store_into_table(table_name, columns=columns, ignore_duplicates=True, rows=rows)
+    store_annotation_summary(ds, marks)
     return True
 
 
+def _init_xmi_worker(project_file: str, ts_string: str, context: XmiContext) -> None:
+    # every worker deserializes the type system only once; the project export stays open for all its tasks
+    _xmi_worker_state["typesystem"] = load_typesystem(ts_string)
+    _xmi_worker_state["zfile"] = zipfile.ZipFile(project_file, 'r')
+    _xmi_worker_state["context"] = context
+
+
+def _xmi_worker(task: Tuple[Tuple[str, str], str, str]) -> Union[List[Tuple[str, tuple, list]], Exception]:
+    # like `_brat_worker`, the error of a broken XMI file is handed to the writer, which only skips that pair
+    member, annotator_id, document_id = task
+    try:
+        with uima.WebAnnoProjectReader.open_member(_xmi_worker_state["zfile"], member) as xmi:
+            cas = load_cas_from_xmi(xmi, typesystem=_xmi_worker_state["typesystem"])
+        return xmi_rows_for_annotator(cas, annotator_id, document_id, _xmi_worker_state["context"])
+    except Exception as e:
+        return e
+
+
+BratTask = namedtuple('BratTask', ['doc_id', 'doc_name', 'annotator_id', 'annotator', 'sentence_annotator'])
+BratContext = namedtuple('BratContext', ['directory', 'type2table', 'type_reference', 'allow_disp_sent',
+                                         'drop_annotations'])
+
+BRAT_ENTITY_COLUMNS = ("id", "annotator", "begin", "end", "document", "sentence", "type")
+SENTENCE_COLUMNS = ("id", "begin", "end", "document", "document_text", "has_annotation")
+COMPACT_SENTENCE_COLUMNS = ("sentence_index", "sentence_annotator")
+
+_brat_worker_context = None
+
+
 def store_brat_in_db(ds: DataSaver, annotators: dict, documents: dict, config: ProjectConfiguration,
-                     type_reference: dict, allow_disp_sent: bool = False, drop_annotations: list = []):
+                     type_reference: dict, allow_disp_sent: bool = False, drop_annotations: list = [],
+                     workers: int = 1, pairs: Union[Set[Tuple[str, str]], None] = None,
+                     manifest: Union[dict, None] = None) -> Set[Tuple[str, str]]:
+    """
+    Parses the brat files of every (document, annotator) pair into table rows and stores them, every pair in a
+    `DataSaver.unit` of its own: a pair whose files can't be parsed or stored is rolled back and skipped.
+    With `workers > 1` the pairs are parsed in a process pool while this process stays the only writer to the
+    database; the rows are written in the same order as in a serial run.
+
+    :param ds:
+    :param annotators: `dict(annotator_id: annotator_name)`
+    :param documents: `dict(document_id: document_name)`
+    :param config:
+    :param type_reference:
+    :param allow_disp_sent: whether every annotator gets its own sentences
+    :param drop_annotations: annotation types that are not stored
+    :param workers: number of parsing processes
+    :param pairs: if given, only these `(document_id, annotator_id)` pairs (as strings) are parsed and stored
+    :param manifest: `dict(path: ManifestEntry)`; the entries of a pair are stored together with its rows
+    :return: the pairs that were skipped
+    """
     brat2table = {}
     type2table = {}
     for cat, _dict in database_info.items():
@@ -310,53 +945,388 @@ def store_brat_in_db(ds: DataSaver, annotators: dict, documents: dict, config: P
                  'events': [a for a in config.get_event_types() if a not in drop_annotations],
                  'relations': [a for a in config.get_relation_types() if a not in drop_annotations]}.items():
         type2table.update({z.lower(): brat2table[x] for z in y})
-    annotators_stored = False
-    for doc_id, doc_name in documents.items():
-        ds.store_into_table(DefaultTableNames.documents, ignore_duplicates=True, id=doc_id, document=doc_name)
-        txt = []
-        ann_objects = dict()
-        for a_id, annotator in annotators.items():
-            if not annotators_stored:
-                ds.store_into_table(DefaultTableNames.annotators, ignore_duplicates=True, id=a_id, annotator=annotator)
-            txt.append(
-                (a_id, pathlib.Path(config.directory, annotator, f"{doc_name}.txt").read_text(encoding='utf-8'))
+    context = BratContext(directory=str(config.directory), type2table=type2table, type_reference=dict(type_reference),
+                          allow_disp_sent=allow_disp_sent, drop_annotations=drop_annotations)
+
+    for a_id, annotator in annotators.items():
+        ds.store_into_table(DefaultTableNames.annotators, ignore_duplicates=True, id=a_id, annotator=annotator)
+    # the shared sentences are taken from the first annotator by name, whatever ids the annotators got
+    tasks = [BratTask(doc_id=doc_id, doc_name=doc_name, annotator_id=a_id, annotator=annotator,
+                      sentence_annotator=min(annotators.values()))
+             for doc_id, doc_name in documents.items() for a_id, annotator in annotators.items()
+             if pairs is None or (str(doc_id), str(a_id)) in pairs]
+    compact_ids = CompactIds(ds) if compact_schema else None
+    text_ids = DocumentTextIds(ds)
+    manifest_entries = manifest_by_pair(manifest if manifest is not None else {})
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_brat_worker, initargs=(context,)) as executor:
+            return _write_brat_rows(ds, tasks, executor.map(_brat_worker, tasks, chunksize=max(1, len(annotators))),
+                                    compact_ids, manifest_entries, text_ids)
+    else:
+        return _write_brat_rows(ds, tasks, (_brat_rows_or_error(task, context) for task in tasks), compact_ids,
+                                manifest_entries, text_ids)
+
+
+def _write_brat_rows(ds: DataSaver, tasks: List[BratTask], task_rows: Iterable,
+                     compact_ids: Union[CompactIds, None] = None,
+                     manifest_entries: Union[dict, None] = None,
+                     text_ids: Union[DocumentTextIds, None] = None) -> Set[Tuple[str, str]]:
+    skipped = set()
+    text_ids = text_ids if text_ids is not None else DocumentTextIds(ds)
+    for task, table_rows in zip(tasks, task_rows):
+        pair = (str(task.doc_id), str(task.annotator_id))
+        try:
+            if isinstance(table_rows, Exception):
+                raise table_rows
+            with ds.unit("{0}/{1}".format(task.annotator, task.doc_name)):
+                ds.store_into_table(DefaultTableNames.documents, ignore_duplicates=True,
+                                    id=task.doc_id, document=task.doc_name)
+                marks = entity_table_marks(ds)
+                table_rows = text_ids.convert(table_rows)
+                if compact_ids is not None:
+                    table_rows = compact_ids.convert(table_rows)
+                for table_name, columns, rows in table_rows:
+                    ds.store_into_table(table_name, columns=columns, ignore_duplicates=True, rows=rows)
+                store_annotation_summary(ds, marks)
+                ds.store_into_table(DefaultTableNames.ingest_manifest, columns=ManifestEntry._fields,
+                                    rows=(manifest_entries or {}).get(pair, []))
+        except Exception as e:
+            logging.error("Skipping '{0}' of annotator '{1}': {2}".format(task.doc_name, task.annotator, e))
+            skipped.add(pair)
+    return skipped
+
+
+def _init_brat_worker(context: BratContext) -> None:
+    global _brat_worker_context
+    _brat_worker_context = context
+
+
+def _brat_worker(task: BratTask) -> Union[List[Tuple[str, tuple, list]], Exception]:
+    return _brat_rows_or_error(task, _brat_worker_context)
+
+
+def _brat_rows_or_error(task: BratTask, context: BratContext) -> Union[List[Tuple[str, tuple, list]], Exception]:
+    # the error of a broken pair is handed to the writer (see `_write_brat_rows`), which only skips that pair
+    try:
+        return brat_rows_for_annotator(task, context)
+    except Exception as e:
+        return e
+
+
+def brat_rows_for_annotator(task: BratTask, context: BratContext) -> List[Tuple[str, tuple, list]]:
+    """
+    Reads the annotation file of one (document, annotator) pair and the text file its sentences are taken from and
+    flattens them into plain row tuples. The values are formatted the same way `DataSaver.store_into_table` formats
+    single rows.
+
+    :param task: the (document, annotator) pair
+    :param context: project wide information that is the same for all pairs
+    :return: a list of `(table_name, columns, rows)` in the order the rows have to be inserted; the sentence rows
+     are flagged if the pair has an annotation in (or across) the sentence, i.e. the `has_annotation` flag of a
+     shared sentence is the one of the annotator whose rows store it first
+    """
+    doc_id, a_id = str(task.doc_id), str(task.annotator_id)
+    # the text (and with it the offsets) of the sentences is the annotator's own one only with disparate sentences
+    txt_annotator = task.annotator if context.allow_disp_sent else task.sentence_annotator
+    sentence_txt = pathlib.Path(context.directory, txt_annotator, f"{task.doc_name}.txt").read_text(encoding='utf-8')
+    text_row = document_text_row(sentence_txt)
+    ann_object = Annotations(pathlib.Path(context.directory, task.annotator, task.doc_name).as_posix(), True)
+
+    sentences = list(_get_sentences(txt=sentence_txt))
+    textbounds = [t for t in ann_object.get_textbounds() if t.type.lower() not in context.drop_annotations]
+    assigned_textbounds, annotated_sentences = _assign_textbounds_to_sentences(sentences, textbounds)
+    entity_rows = defaultdict(list)
+    sentence_rows = []
+    for s_idx, sentence in enumerate(sentences):
+        sentence_id = f"{doc_id}-{sentence.id}{'-' + a_id if context.allow_disp_sent else ''}"
+        for t in assigned_textbounds[s_idx]:
+            begin = t.spans[0][0]
+            end = t.spans[-1][1]
+            entity_rows[context.type2table[t.type.lower()]].append(
+                (f"{doc_id}-{a_id}-{t.id}", a_id, str(begin - sentence.begin), str(end - sentence.begin),
+                 doc_id, sentence_id, str(context.type_reference[t.type.lower()]["type-id"]))
+            )
+        sentence_rows.append(
+            (sentence_id, str(sentence.begin), str(sentence.end), doc_id, text_row[0],
+             "1" if annotated_sentences[s_idx] else "0")
+        )
+    return [(str(DefaultTableNames.document_texts), DOCUMENT_TEXT_COLUMNS, [text_row])] + \
+           [(table_name, BRAT_ENTITY_COLUMNS, rows) for table_name, rows in entity_rows.items()] + \
+           [(str(DefaultTableNames.sentences), SENTENCE_COLUMNS, sentence_rows)]
+
+
+def _assign_textbounds_to_sentences(sentences: list, textbounds: list) -> Tuple[List[list], List[bool]]:
+    """
+    Assigns every textbound to the first sentence its span overlaps with (sentence borders are inclusive) and flags
+    every sentence that is overlapped by at least one textbound. Sentence boundaries and textbound starts are merged
+    in one sweep; the sentences a textbound crosses are looked up with `bisect`.
+
+    :param sentences: the sentences of a document as returned by `_get_sentences` (sorted and non overlapping)
+    :param textbounds: brat textbound annotations
+    :return: a list of the textbounds (in their original order) assigned to each sentence and a list of flags whether
+     a sentence has annotations
+    """
+    assigned = [[] for _ in sentences]
+    has_annotation = [False] * len(sentences)
+    sentence_begins = [sentence.begin for sentence in sentences]
+    # spans are accessed directly: the brat `get_start`/`get_end` accessors queue a message on every call
+    spans = sorted(((t.spans[0][0], t.spans[-1][1], t_idx) for t_idx, t in enumerate(textbounds)))
+    s_idx = 0
+    for begin, end, t_idx in spans:
+        while s_idx < len(sentences) and sentences[s_idx].end < begin:
+            s_idx += 1
+        if s_idx == len(sentences):
+            break
+        if sentences[s_idx].begin > end:
+            continue
+        assigned[s_idx].append(t_idx)
+        for crossed_idx in range(s_idx, bisect_right(sentence_begins, end, lo=s_idx)):
+            has_annotation[crossed_idx] = True
+    return [[textbounds[t_idx] for t_idx in sorted(t_indices)] for t_indices in assigned], has_annotation
+
+
+ManifestEntry = namedtuple('ManifestEntry', ['id', 'size', 'mtime', 'hash', 'document', 'annotator'])
+
+
+def read_manifest(ds: DataSaver) -> Dict[str, ManifestEntry]:
+    """
+    :return: `dict(path: ManifestEntry)` of all files recorded by the last ingestion
+    """
+    # document and annotator are compared as strings (they are integers in the compact schema)
+    return {row[0]: ManifestEntry._make(row[:-2] + (str(row[-2]), str(row[-1]))) for row in ds.db_cursor.execute(
+        "SELECT {0} FROM {1}".format(",".join(ManifestEntry._fields), DefaultTableNames.ingest_manifest))}
+
+
+def file_manifest_entry(root: Union[str, pathlib.Path], rel_path: str, document_id: str, annotator_id: str,
+                        previous: Dict[str, ManifestEntry]) -> ManifestEntry:
+    """
+    Describes the file `root/rel_path`. The content is only hashed if size or modification time differ from the
+    `previous` entry of the same path.
+    """
+    path = pathlib.Path(root, rel_path)
+    stat = path.stat()
+    known = previous.get(rel_path)
+    if known is not None and known.size == stat.st_size and known.mtime == stat.st_mtime_ns:
+        content_hash = known.hash
+    else:
+        content_hash = hashlib.sha1(path.read_bytes()).hexdigest()
+    return ManifestEntry(id=rel_path, size=stat.st_size, mtime=stat.st_mtime_ns, hash=content_hash,
+                         document=str(document_id), annotator=str(annotator_id))
+
+
+def changed_pairs(previous: Dict[str, ManifestEntry], current: Dict[str, ManifestEntry]) \
+        -> Tuple[Set[Tuple[str, str]], Set[Tuple[str, str]]]:
+    """
+    Compares the manifest of the last ingestion with the files that are there now.
+
+    :return: the `(document_id, annotator_id)` pairs with new or changed files and the pairs whose files are gone
+    """
+    current_pairs = manifest_pairs(current)
+    changed = {(e.document, e.annotator) for path, e in current.items()
+               if path not in previous or previous[path].hash != e.hash}
+    deleted = manifest_pairs(previous).difference(current_pairs)
+    return changed, deleted
+
+
+def manifest_pairs(manifest: Dict[str, ManifestEntry]) -> Set[Tuple[str, str]]:
+    return {(e.document, e.annotator) for e in manifest.values()}
+
+
+def manifest_by_pair(manifest: Dict[str, ManifestEntry]) -> Dict[Tuple[str, str], List[ManifestEntry]]:
+    entries = defaultdict(list)
+    for e in manifest.values():
+        entries[(e.document, e.annotator)].append(e)
+    return entries
+
+
+def delete_pair_rows(ds: DataSaver, document_id: str, annotator_id: str, sentence_scope: Union[str, None]) -> None:
+    """
+    Removes everything that was stored for one (document, annotator) pair: its relations, entities, summary rows
+    and manifest entries and (depending on `sentence_scope`) sentences of the document.
+
+    :param sentence_scope: "document" removes all sentences of the document, "annotator" only the disparate
+     sentences of the annotator and `None` keeps the sentences
+    """
+    entity_tables = [t.lower() for t in database_info.get(DatabaseCategories.entities, {}).keys()]
+    for rel_table, rel_dict in database_info.get(DatabaseCategories.relations, {}).items():
+        for column, reference in rel_dict.get(DatabaseConstructionKeys.foreign_keys, {}).items():
+            if reference.get("table", "").lower() not in entity_tables:
+                continue
+            ds.flush(rel_table.lower())
+            ds.db_cursor.execute(
+                "DELETE FROM {0} WHERE annotator = ? AND {1} IN (SELECT id FROM {2} WHERE document = ?)".format(
+                    rel_table.lower(), column.lower(), reference.get("table").lower()),
+                (annotator_id, document_id)
             )
-            ann_objects[a_id] = Annotations(pathlib.Path(config.directory, annotator, doc_name).as_posix(), True)
-        annotators_stored = True
-        sentences = None
-        for t_aid, _txt in txt:
-            if not allow_disp_sent and sentences is None:
-                sentences = [s for s in _get_sentences(txt=_txt)]
-            elif allow_disp_sent:
-                sentences = _get_sentences(txt=_txt)
-            for sentence in sentences:
-                has_annotations = False
-                for t in ann_objects.get(t_aid).get_textbounds():
-                    if t.type.lower() in drop_annotations:
-                        continue
-                    begin = t.get_start()
-                    end = t.get_end()
-                    if begin > sentence.end or end < sentence.begin:
-                        continue
-                    has_annotations = True
-                    ds.store_into_table(type2table[t.type.lower()], ignore_duplicates=True,
-                                        id=f"{doc_id}-{t_aid}-{t.id}", annotator=str(t_aid),
-                                        begin=str(begin - sentence.begin), end=str(end - sentence.begin),
-                                        text=_txt[begin:end], document=str(doc_id),
-                                        sentence=f"{doc_id}-{sentence.id}{'-' + str(t_aid) if allow_disp_sent else ''}",
-                                        type=type_reference[t.type.lower()]["type-id"])
-                ds.store_into_table(DefaultTableNames.sentences, ignore_duplicates=True,
-                                    id=f"{doc_id}-{sentence.id}{'-' + str(t_aid) if allow_disp_sent else ''}",
-                                    begin=sentence.begin, end=sentence.end, document=str(doc_id),
-                                    text=_txt[sentence.begin:sentence.end], has_annotation=1 if has_annotations else 0)
+    for entity_table in entity_tables:
+        ds.delete_from_table(entity_table, document=document_id, annotator=annotator_id)
+    ds.delete_from_table(DefaultTableNames.sentence_annotation_summary, document=document_id, annotator=annotator_id)
+    ds.delete_from_table(DefaultTableNames.ingest_manifest, document=document_id, annotator=annotator_id)
+    if sentence_scope == "document":
+        ds.delete_from_table(DefaultTableNames.sentences, document=document_id)
+    elif sentence_scope == "annotator" and compact_schema:
+        ds.delete_from_table(DefaultTableNames.sentences, document=document_id, sentence_annotator=annotator_id)
+    elif sentence_scope == "annotator":
+        ds.delete_from_table(DefaultTableNames.sentences, like_columns={"id": "{0}-%-{1}".format(document_id,
+                                                                                                annotator_id)},
+                             document=document_id)
+
+
+def entity_table_marks(ds: DataSaver) -> Dict[str, int]:
+    """
+    :return: `dict(table_name: rowid)` with the largest rowid of every entity table; rows that are written
+     afterwards get larger rowids
+    """
+    ds.flush()
+    return {entity_table.lower(): ds.db_cursor.execute(
+        "SELECT COALESCE(MAX(rowid), -1) FROM {0}".format(entity_table.lower())).fetchone()[0]
+        for entity_table in database_info.get(DatabaseCategories.entities, {}).keys()}
+
+
+def store_annotation_summary(ds: DataSaver, marks: Union[Dict[str, int], None] = None) -> None:
+    """
+    Writes the rows of the `sentence_annotation_summary` table: the number of annotations of every
+    (document, sentence, annotator, type) in the entity tables, aggregated with one `INSERT ... SELECT` per table.
+
+    :param marks: the `entity_table_marks` taken before the rows of a (document, annotator) pair were written;
+     only the rows written since then are aggregated. If `None`, the table is rebuilt as a whole (and, if the
+     database has the triggers of the summary, with it the `has_annotation` flags of all sentences)
+    """
+    summary = DefaultTableNames.sentence_annotation_summary
+    # the compact schema assigns the integer id itself
+    id_column = "NULL" if compact_schema else "sentence || '-' || annotator || '-' || type"
+    ds.flush()
+    if marks is None:
+        ds.db_cursor.execute("DELETE FROM {0}".format(summary))
+        if ds.triggers:
+            ds.db_cursor.execute("UPDATE {0} SET has_annotation = 0".format(DefaultTableNames.sentences))
+    for entity_table in database_info.get(DatabaseCategories.entities, {}).keys():
+        ds.db_cursor.execute("""
+            INSERT INTO {0} (id, document, sentence, annotator, type, count)
+            SELECT {1}, document, sentence, annotator, type, COUNT(*)
+            FROM {2}
+            {3}
+            GROUP BY document, sentence, annotator, type
+            """.format(summary, id_column, entity_table.lower(), "" if marks is None else "WHERE rowid > ?"),
+            () if marks is None else (marks[entity_table.lower()],))
+
+
+def prune_document_texts(ds: DataSaver) -> None:
+    """
+    Removes the document texts that no sentence references anymore (e.g. after an incremental update).
+    """
+    ds.flush()
+    ds.db_cursor.execute("DELETE FROM {0} WHERE id NOT IN (SELECT document_text FROM {1})".format(
+        DefaultTableNames.document_texts, DefaultTableNames.sentences))
+
+
+def prune_annotators(ds: DataSaver, annotator_ids: Iterable) -> None:
+    """
+    Removes the annotators that are no longer part of the project (e.g. after an incremental update).
+
+    :param annotator_ids: the ids of the annotators of the project
+    """
+    annotator_ids = {str(_id) for _id in annotator_ids}
+    ds.flush(DefaultTableNames.annotators)
+    for _id, in ds.db_cursor.execute("SELECT id FROM {0}".format(DefaultTableNames.annotators)).fetchall():
+        if str(_id) not in annotator_ids:
+            ds.delete_from_table(DefaultTableNames.annotators, id=_id)
+
+
+def check_text_layout(ds: DataSaver) -> None:
+    """
+    Makes sure that the sentences reference the `document_texts` table; a database whose sentences (and annotations)
+    still hold copies of their text can't be updated incrementally.
+    """
+    columns = [row[1] for row in ds.db_cursor.execute("PRAGMA table_info({0})".format(DefaultTableNames.sentences))]
+    if "document_text" not in columns:
+        logging.error("The sentences of the database hold their own text instead of referencing '{0}'; please "
+                      "ingest the project anew (without '--incremental')".format(DefaultTableNames.document_texts))
+        raise ValueError("Outdated database layout")
+
+
+def store_manifest(ds: DataSaver, previous: Dict[str, ManifestEntry], current: Dict[str, ManifestEntry],
+                   skip_pairs: Union[Set[Tuple[str, str]], None] = None) -> None:
+    """
+    Writes the entries of `current` that are new or differ from `previous` and removes the entries of files
+    that are gone.
+
+    :param skip_pairs: `(document_id, annotator_id)` pairs whose entries are left alone; the pairs that were
+     (re-)ingested write their entries in the same unit as their rows (see `manifest_by_pair`)
+    """
+    if skip_pairs:
+        previous = {path: e for path, e in previous.items() if (e.document, e.annotator) not in skip_pairs}
+        current = {path: e for path, e in current.items() if (e.document, e.annotator) not in skip_pairs}
+    entries = [e for path, e in current.items() if previous.get(path) != e]
+    ds.flush(DefaultTableNames.ingest_manifest)
+    ds.db_cursor.executemany(
+        "DELETE FROM {0} WHERE id = ?".format(DefaultTableNames.ingest_manifest),
+        [(e.id,) for e in entries] + [(path,) for path in previous.keys() if path not in current])
+    ds.store_into_table(DefaultTableNames.ingest_manifest, columns=ManifestEntry._fields, rows=entries)
+
+
+def _stable_ids(ds: DataSaver, table_name: str, column: str, names: list) -> dict:
+    """
+    Maps `names` to ids, reusing the ids `table_name` already holds for them so that an incremental update
+    references the same ids as the rows it keeps. Unknown names get the next free ids in the order given.
+
+    :return: `dict(id: name)` sorted by id
+    """
+    known = {name: int(_id) for _id, name in ds.db_cursor.execute("SELECT id, {0} FROM {1}".format(column, table_name))}
+    next_id = max(known.values(), default=-1) + 1
+    ids = {}
+    for name in names:
+        if name not in known:
+            known[name] = next_id
+            next_id += 1
+        ids[known[name]] = name
+    return dict(sorted(ids.items()))
+
+
+def _warn_skipped(skipped: Set[Tuple[str, str]]) -> None:
+    if len(skipped) > 0:
+        logging.warning("Skipped {0} (document, annotator) pairs, an incremental ingestion retries them: {1}".format(
+            len(skipped), ", ".join("{0}/{1}".format(d, a) for d, a in sorted(skipped))))
+
+
+def print_insert_report(report: dict) -> None:
+    print("\n".join(["        {0:<24}{1:>10} rows  {2:>12.0f} rows/sec".format(
+        table_name, stats["rows"], stats["rows/sec"]) for table_name, stats in report.items()]))
+
+
+def _xmi_table_rows(project_reader: uima.WebAnnoProjectReader, todo: List[Tuple[str, str]], annotators: dict,
+                    documents: dict, ts_string: str, context: XmiContext, workers: int = 1) -> Iterable:
+    """
+    Yields the flattened rows of every (document, annotator) pair in `todo`, in that order (or the error that
+    occurred while reading the pair). With `workers > 1` the CASes are deserialized and flattened in a process
+    pool and only the rows are sent back.
+    """
+    if workers > 1:
+        tasks = [(project_reader.member(doc, anno), annotators[anno], documents[doc]) for doc, anno in todo]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_xmi_worker,
+                                 initargs=(project_reader.zipped_file, ts_string, context)) as executor:
+            yield from executor.map(_xmi_worker, tasks)
+    else:
+        typesystem = load_typesystem(ts_string)
+        for doc, anno, xmi in project_reader.iter_xmi(set(todo)):
+            try:
+                rows = xmi_rows_for_annotator(load_cas_from_xmi(xmi, typesystem=typesystem),
+                                              annotators[anno], documents[doc], context)
+            except Exception as e:
+                rows = e
+            yield rows
 
 
 def store_xmi():
+    workers = _pop_cli_option("--workers", default=1, cast=int)
+    commit_every = _pop_cli_option("--commit-every", default=COMMIT_EVERY, cast=int)
+    incremental = _pop_cli_flag("--incremental")
     project_file = os.path.abspath(
         "../test/uima-test-resources/test_project.zip" if len(sys.argv) <= 1 else sys.argv[1])
     in_memory = False if len(sys.argv) <= 2 else sys.argv[2].lower() in ["true", "t", "yes", "y"]
     db_file = os.path.abspath("../test/uima-test-resources/test_project.db" if len(sys.argv) <= 3 else sys.argv[3])
     reset_db = not (False if len(sys.argv) <= 4 else sys.argv[4].lower() in ["false", "f", "no", "n"])
+    reset_db = reset_db and not incremental
     ts_string_key = "TypeSystem.xml"
 
     print("""
@@ -365,32 +1335,114 @@ def store_xmi():
         db file:        {}
         db in memory:   {}
         reset db:       {}
-        """.format(project_file, db_file, in_memory, reset_db))
+        incremental:    {}
+        workers:        {}
+        commit every:   {}
+        """.format(project_file, db_file, in_memory, reset_db, incremental, workers, commit_every))
+
+    print_insert_report(ingest_xmi(project_file, db_file, in_memory=in_memory, reset_db=reset_db,
+                                   incremental=incremental, workers=workers, type_system=ts_string_key,
+                                   commit_every=commit_every))
 
-    xmi_dict = uima.get_project_files(project_file, ts_string_key)
-    ts_string = xmi_dict.get(ts_string_key).read().decode('utf-8')
-    typesystem = load_typesystem(ts_string)
+
+def ingest_xmi(project_file: str, db_file: str, in_memory: bool = False, reset_db: bool = True,
+               incremental: bool = False, workers: int = 1, type_system: str = "TypeSystem.xml",
+               progress: bool = True, commit_every: int = COMMIT_EVERY) -> dict:
+    """
+    Stores a WebAnno project export in the database (what `store_xmi` does with its command line arguments).
+
+    :param project_file: path of the zipped project export
+    :param db_file:
+    :param in_memory:
+    :param reset_db: whether the tables are dropped and created anew (ignored if `incremental`)
+    :param incremental: only (re-)ingest the XMI files that changed since the last ingestion
+    :param workers: number of deserialization processes
+    :param type_system: name of the type system file in the export
+    :param progress: whether a progress bar is shown
+    :param commit_every: number of (document, annotator) pairs per transaction (see `DataSaver.batch`)
+    :return: the insert report of `DataSaver.finish_bulk_load`
+    """
+    reset_db = reset_db and not incremental
+    project_reader = uima.WebAnnoProjectReader(project_file, type_system)
+    ts_string = project_reader.type_system().read().decode('utf-8')
     l_info = uima.get_layer_information_from_type_system(ts_string, user_layers)
 
     db_util = DBUtils(in_memory=in_memory, db_file=db_file)
     db_util.create_connection()
-    data_saver = DataSaver(db_util, db_construction, reset_db=reset_db)
-    pbar = tqdm.tqdm(total=(len(xmi_dict.get("documents")) * len(xmi_dict.get("annotators"))))
-
-    annotation_types = list()
-    layer_types = list()
-    sentence_list = set()
-    for doc, d_id in xmi_dict.get("documents").items():
-        for anno, a_id in xmi_dict.get("annotators").items():
-            updated = False
-            xmi = xmi_dict.get(doc).get(anno, None)
-            if xmi:
-                anno_cas = load_cas_from_xmi(xmi, typesystem=typesystem)
-                updated = store_xmi_in_db(anno_cas, anno, a_id, doc, d_id,
-                                          annotation_types, layer_types, sentence_list, data_saver, l_info)
-            if updated:
-                pbar.update(1)
+    data_saver = DataSaver(db_util, db_construction, reset_db=reset_db, buffer_size=BULK_INSERT_BUFFER_SIZE,
+                           bulk_load=True)
+    created_tables = data_saver.create_missing_tables() if incremental else []
+    if incremental:
+        check_text_layout(data_saver)
+    annotators = {name: str(_id) for _id, name in _stable_ids(
+        data_saver, DefaultTableNames.annotators, "annotator", list(project_reader.annotators.keys())).items()}
+    documents = {name: str(_id) for _id, name in _stable_ids(
+        data_saver, DefaultTableNames.documents, "document", list(project_reader.documents.keys())).items()}
+    previous_manifest = read_manifest(data_saver) if incremental else {}
+    manifest = {}
+    for (doc, anno), (path, size, mtime, content_hash) in project_reader.manifest.items():
+        manifest[path] = ManifestEntry(id=path, size=size, mtime=mtime, hash=content_hash,
+                                       document=documents[doc], annotator=annotators[anno])
+    pairs = None
+    if incremental:
+        pairs, deleted = changed_pairs(previous_manifest, manifest)
+        current_documents = {d for d, _ in manifest_pairs(manifest)}
+        for doc_id, a_id in sorted(pairs | deleted):
+            delete_pair_rows(data_saver, doc_id, a_id, None)
+        for doc_id in {d for d, _ in deleted}.difference(current_documents):
+            data_saver.delete_from_table(DefaultTableNames.sentences, document=doc_id)
+            data_saver.delete_from_table(DefaultTableNames.documents, id=doc_id)
+        prune_annotators(data_saver, annotators.values())
+
+    # the ids of types, layers and sentences are derived from what is already stored
+    annotation_types = [row[0] for row in data_saver.db_cursor.execute(
+        "SELECT type FROM {0} ORDER BY CAST(id AS INTEGER)".format(DefaultTableNames.annotation_types))]
+    layer_types = [row[0] for row in data_saver.db_cursor.execute(
+        "SELECT layer FROM {0} ORDER BY CAST(id AS INTEGER)".format(DefaultTableNames.layers))]
+    sentence_list = {row[0] for row in data_saver.db_cursor.execute(
+        "SELECT id FROM {0}".format(DefaultTableNames.sentences))}
+    todo = [(doc, anno) for doc, anno in project_reader.pairs()
+            if pairs is None or (documents[doc], annotators[anno]) in pairs]
+    context = xmi_context(l_info)
+    compact_ids = CompactIds(data_saver) if compact_schema else None
+    text_ids = DocumentTextIds(data_saver)
+    manifest_entries = manifest_by_pair(manifest)
+    skipped = set()
+    pbar = tqdm.tqdm(total=len(todo), disable=not progress)
+    table_rows = _xmi_table_rows(project_reader, todo, annotators, documents, ts_string, context, workers)
+    with data_saver.batch(commit_every=commit_every):
+        for (doc, anno), rows in zip(todo, table_rows):
+            pair = (documents[doc], annotators[anno])
+            # what `store_xmi_rows` learns on the fly has to be forgotten again if the pair is rolled back
+            known_types, known_layers = len(annotation_types), len(layer_types)
+            try:
+                if isinstance(rows, Exception):
+                    raise rows
+                with data_saver.unit("{0}/{1}".format(anno, doc)):
+                    store_xmi_rows(rows, anno, annotators[anno], doc, documents[doc],
+                                   annotation_types, layer_types, sentence_list, data_saver, compact_ids,
+                                   text_ids)
+                    data_saver.store_into_table(DefaultTableNames.ingest_manifest, columns=ManifestEntry._fields,
+                                                rows=manifest_entries.get(pair, []))
+            except Exception as e:
+                logging.error("Skipping '{0}' of annotator '{1}': {2}".format(doc, anno, e))
+                del annotation_types[known_types:]
+                del layer_types[known_layers:]
+                sentence_list.clear()
+                sentence_list.update(row[0] for row in data_saver.db_cursor.execute(
+                    "SELECT id FROM {0}".format(DefaultTableNames.sentences)))
+                skipped.add(pair)
+            pbar.update(1)
+        if DefaultTableNames.sentence_annotation_summary in created_tables:
+            store_annotation_summary(data_saver)
+        if incremental:
+            prune_document_texts(data_saver)
+        store_manifest(data_saver, previous_manifest, manifest,
+                       skip_pairs=manifest_pairs(manifest) if pairs is None else pairs)
+    _warn_skipped(skipped)
+    report = data_saver.finish_bulk_load()
     db_util.close_connection()
+    return report
 
 
 ### from kldtz/bratiaa ###
@@ -464,7 +1516,100 @@ def _get_sentences(txt: str, split_on: str = '\n'):
         yield Sentence(id=sid, begin=sentence_offset, end=running_offset)
 
 
+def _pop_cli_option(option: str, default=None, cast=str):
+    """
+    Removes `option` and its value from `sys.argv` (so that the positional arguments keep their place)
+    and returns the value.
+
+    :param option: e.g. "--workers"
+    :param default: returned if the option is not given
+    :param cast: callable that converts the value string
+    :return:
+    """
+    if option not in sys.argv:
+        return default
+    idx = sys.argv.index(option)
+    if idx + 1 >= len(sys.argv):
+        logging.error("Option '{0}' needs a value".format(option))
+        sys.exit(-1)
+    value = cast(sys.argv[idx + 1])
+    del sys.argv[idx:idx + 2]
+    return value
+
+
+def _pop_cli_flag(option: str) -> bool:
+    """
+    Removes the flag `option` from `sys.argv` and returns whether it was given.
+    """
+    if option not in sys.argv:
+        return False
+    sys.argv.remove(option)
+    return True
+
+
+def _update_brat_incrementally(ds: DataSaver, project_root: pathlib.Path, annotators: dict, documents: dict,
+                               allow_disp_sent: bool) -> Tuple[Set[Tuple[str, str]], Dict[str, ManifestEntry],
+                                                               Dict[str, ManifestEntry]]:
+    """
+    Compares the `.ann`/`.txt` files of the project with the ingest manifest and deletes the rows of every
+    (document, annotator) pair whose files changed or are gone.
+
+    :return: the pairs that have to be (re-)ingested, the previous and the current manifest
+    """
+    previous = read_manifest(ds)
+    current = brat_manifest(project_root, annotators, documents, previous)
+    changed, deleted = changed_pairs(previous, current)
+    names = {str(_id): name for _id, name in ds.db_cursor.execute(
+        "SELECT id, annotator FROM {0}".format(DefaultTableNames.annotators))}
+    names.update({str(_id): name for _id, name in annotators.items()})
+    source_id = min((str(_id) for _id in annotators), key=names.get, default="")
+    if not allow_disp_sent:
+        # without disparate sentences all annotators share the sentences (and offsets) of the first annotator (by
+        # name, see `store_brat_in_db`), so a change of its files (or a different first annotator) means the whole
+        # document has to be redone
+        previous_source_id = min({e.annotator for e in previous.values()}, key=lambda a: names.get(a, a),
+                                 default=source_id)
+        redo = {d for d, _ in manifest_pairs(current)} if previous_source_id != source_id \
+            else {d for d, a in changed if a == source_id}
+        changed |= {p for p in manifest_pairs(current) if p[0] in redo}
+    current_documents = {d for d, _ in manifest_pairs(current)}
+    for doc_id, a_id in sorted(changed | deleted):
+        if allow_disp_sent:
+            sentence_scope = "annotator"
+        else:
+            sentence_scope = "document" if (a_id == source_id or doc_id not in current_documents) else None
+        delete_pair_rows(ds, doc_id, a_id, sentence_scope)
+    for doc_id in {d for d, _ in deleted}.difference(current_documents):
+        ds.delete_from_table(DefaultTableNames.sentences, document=doc_id)
+        ds.delete_from_table(DefaultTableNames.documents, id=doc_id)
+    prune_annotators(ds, annotators.keys())
+    print("""
+        Incremental update:
+        changed pairs:          {}
+        deleted pairs:          {}
+        """.format(len(changed), len(deleted)))
+    return changed, previous, current
+
+
+def brat_manifest(project_root: pathlib.Path, annotators: dict, documents: dict,
+                  previous: Dict[str, ManifestEntry]) -> Dict[str, ManifestEntry]:
+    """
+    :return: `dict(path: ManifestEntry)` for the `.ann` and `.txt` file of every (document, annotator) pair
+    """
+    manifest = {}
+    for doc_id, doc_name in documents.items():
+        for a_id, annotator in annotators.items():
+            for suffix in [".ann", ".txt"]:
+                entry = file_manifest_entry(project_root, "{0}/{1}{2}".format(annotator, doc_name, suffix),
+                                            doc_id, a_id, previous)
+                manifest[entry.id] = entry
+    return manifest
+
+
 def store_brat():
+    workers = _pop_cli_option("--workers", default=1, cast=int)
+    commit_every = _pop_cli_option("--commit-every", default=COMMIT_EVERY, cast=int)
+    incremental = _pop_cli_flag("--incremental")
     project_root = pathlib.Path(
         "../test/brat-test-resources/test-resources" if len(sys.argv) <= 1 else sys.argv[1]).resolve()
     in_memory = False if len(sys.argv) <= 2 else sys.argv[2].lower() in ["true", "t", "yes", "y"]
@@ -472,10 +1617,7 @@ def store_brat():
     reset_db = not (False if len(sys.argv) <= 4 else sys.argv[4].lower() in ["false", "f", "no", "n"])
     allow_disp_sent = False if len(sys.argv) <= 5 else sys.argv[5].lower() in ["true", "t", "yes", "y"]
     drop_annotations = [x.lower() for x in sys.argv[6].split(",")] if len(sys.argv) >= 7 else []
-
-    config = ProjectConfiguration(str(project_root))
-    input_gen = partial(input_generator, project_root)
-    annotators, documents = _collect_annotators_and_documents(input_gen)
+    reset_db = reset_db and not incremental
 
     print("""
         Starting with these options:
@@ -485,13 +1627,61 @@ def store_brat():
         reset db:               {}
         allow disp. sentences:  {}
         drop annotations:       {}
-        """.format(str(project_root), db_file, in_memory, reset_db, allow_disp_sent, drop_annotations))
+        workers:                {}
+        incremental:            {}
+        commit every:           {}
+        """.format(str(project_root), db_file, in_memory, reset_db, allow_disp_sent, drop_annotations, workers,
+                   incremental, commit_every))
 
     time.sleep(2)
 
+    print_insert_report(ingest_brat(project_root, db_file, in_memory=in_memory, reset_db=reset_db,
+                                    allow_disp_sent=allow_disp_sent, drop_annotations=drop_annotations,
+                                    workers=workers, incremental=incremental, commit_every=commit_every))
+
+
+def ingest_brat(project_root: Union[str, pathlib.Path], db_file: str, in_memory: bool = False, reset_db: bool = True,
+                allow_disp_sent: bool = False, drop_annotations: Union[List[str], None] = None, workers: int = 1,
+                incremental: bool = False, commit_every: int = COMMIT_EVERY) -> dict:
+    """
+    Stores a brat project in the database (what `store_brat` does with its command line arguments).
+
+    :param project_root: folder of the brat project with one subfolder per annotator
+    :param db_file:
+    :param in_memory:
+    :param reset_db: whether the tables are dropped and created anew (ignored if `incremental`)
+    :param allow_disp_sent: whether every annotator gets its own sentences
+    :param drop_annotations: (lower case) annotation types that are not stored
+    :param workers: number of parsing processes
+    :param incremental: only (re-)ingest the files that changed since the last ingestion
+    :param commit_every: number of (document, annotator) pairs per transaction (see `DataSaver.batch`)
+    :return: the insert report of `DataSaver.finish_bulk_load`
+    """
+    project_root = pathlib.Path(project_root).resolve()
+    drop_annotations = drop_annotations if drop_annotations is not None else []
+    reset_db = reset_db and not incremental
+    config = ProjectConfiguration(str(project_root))
+    annotators, documents = _collect_annotators_and_documents(partial(input_generator, project_root))
+
     db_util = DBUtils(in_memory=in_memory, db_file=db_file)
     db_util.create_connection()
-    data_saver = DataSaver(db_util, db_construction, reset_db=reset_db)
+    # brat sentences are stored with their `has_annotation` flag (see `brat_rows_for_annotator`) instead of the one
+    # the triggers of the annotation summary would keep
+    data_saver = DataSaver(db_util, db_construction, reset_db=reset_db, buffer_size=BULK_INSERT_BUFFER_SIZE,
+                           bulk_load=True, triggers=False)
+    created_tables = data_saver.create_missing_tables() if incremental else []
+    if incremental:
+        check_text_layout(data_saver)
+    annotators = _stable_ids(data_saver, DefaultTableNames.annotators, "annotator",
+                             sorted(a.lower() for a in annotators))
+    documents = _stable_ids(data_saver, DefaultTableNames.documents, "document",
+                            ["".join(_name.split(".")[:-1]) for _name in documents])
+    if incremental:
+        pairs, previous_manifest, manifest = _update_brat_incrementally(data_saver, project_root, annotators,
+                                                                        documents, allow_disp_sent)
+    else:
+        pairs, previous_manifest = None, {}
+        manifest = brat_manifest(project_root, annotators, documents, previous_manifest)
 
     # populate db
     type_reference = defaultdict(dict)
@@ -508,10 +1698,21 @@ def store_brat():
             data_saver.store_into_table(DefaultTableNames.annotation_types, ignore_duplicates=True,
                                         id=type_id, type=typee, layer=layer_id)
             type_id += 1
-    store_brat_in_db(ds=data_saver, annotators={_id: _name.lower() for _id, _name in enumerate(annotators)},
-                     documents={_id: "".join(_name.split(".")[:-1]) for _id, _name in enumerate(documents)},
-                     config=config, type_reference=type_reference, allow_disp_sent=allow_disp_sent,
-                     drop_annotations=drop_annotations)
+    with data_saver.batch(commit_every=commit_every):
+        skipped = store_brat_in_db(ds=data_saver, annotators=annotators, documents=documents,
+                                   config=config, type_reference=type_reference, allow_disp_sent=allow_disp_sent,
+                                   drop_annotations=drop_annotations, workers=workers, pairs=pairs,
+                                   manifest=manifest)
+        if DefaultTableNames.sentence_annotation_summary in created_tables:
+            store_annotation_summary(data_saver)
+        if incremental:
+            prune_document_texts(data_saver)
+        store_manifest(data_saver, previous_manifest, manifest,
+                       skip_pairs=manifest_pairs(manifest) if pairs is None else pairs)
+    _warn_skipped(skipped)
+    report = data_saver.finish_bulk_load()
+    db_util.close_connection()
+    return report
 
 
 if __name__ == '__main__':
@@ -0,0 +1,197 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import contextlib
+import pathlib
+import sqlite3
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Union, BinaryIO
+
+from .queries import STATEMENT_CACHE_SIZE
+
+# pragmas of every read-only connection; the memory map is shared between the connections (it maps the pages of
+# the file), the page cache is not (it is per connection)
+READ_ONLY_PRAGMAS = {
+    "query_only": "ON",
+    "mmap_size": "268435456",  # 256 MiB
+    "cache_size": "-16384",  # negative values are KiB, i.e. 16 MiB
+    "temp_store": "MEMORY"
+}
+IDLE_TIMEOUT = 300
+# chunk size of the streaming copy of `load_image`
+IMAGE_CHUNK_SIZE = 1 << 20
+
+
+def load_image(image: BinaryIO, target: sqlite3.Connection) -> None:
+    """
+    Copies the database file object `image` (e.g. an upload) into the database of `target` with the backup API.
+    The file object is streamed in chunks of `IMAGE_CHUNK_SIZE` into a temporary file, which is backed up, so that
+    the database is in memory only twice while the backup runs: the upload and `target`. (Deserializing the bytes
+    would add a third copy, since SQLite deserializes a copy into a private database; `target` can't be
+    deserialized into directly, because the deserialized database would belong to that one connection and not
+    to the shared "memdb" database.)
+
+    :param image: binary file object holding a SQLite database file
+    :param target: connection whose "main" database is replaced by the image
+    :return:
+    """
+    tmp_fd, tmp_file = tempfile.mkstemp(suffix=".db")
+    try:
+        with os.fdopen(tmp_fd, 'wb') as tmp:
+            shutil.copyfileobj(image, tmp, IMAGE_CHUNK_SIZE)
+        source = sqlite3.connect(tmp_file)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+    finally:
+        os.remove(tmp_file)
+
+
+class ReadOnlyConnectionPool:
+    def __init__(self, db_file: Union[str, pathlib.Path, None] = None, immutable: bool = False,
+                 idle_timeout: float = IDLE_TIMEOUT, pragmas: Union[dict, None] = None,
+                 uri: Union[str, None] = None) -> None:
+        """
+        Hands every thread a read-only connection of its own to `db_file`, so that concurrent sessions of the app
+        don't serialize on one shared connection. The pool can be used in place of a connection: `execute` and
+        `cursor` run on the connection of the calling thread. Connections that weren't used for `idle_timeout`
+        seconds are closed (checked whenever a connection is handed out), unless they are checked out (see
+        `checkout`).
+
+        :param db_file: the database file
+        :param immutable: open the file with `immutable=1`, i.e. without any locking and change detection; only
+         set this if the file is never written while the pool exists
+        :param idle_timeout: seconds after which an unused connection is closed
+        :param pragmas: pragmas of every connection; `READ_ONLY_PRAGMAS` if `None`
+        :param uri: SQLite URI that is opened (read-only) instead of `db_file`
+        """
+        if uri is None:
+            self._uri = "{0}?mode=ro{1}".format(pathlib.Path(db_file).resolve().as_uri(),
+                                                "&immutable=1" if immutable else "")
+        else:
+            self._uri = "{0}{1}mode=ro".format(uri, "&" if "?" in uri else "?")
+        self._anchor = None
+        self._idle_timeout = idle_timeout
+        self._pragmas = READ_ONLY_PRAGMAS if pragmas is None else pragmas
+        self._connections = dict()
+        self._checkouts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_image(cls, image: Union[BinaryIO, None] = None, idle_timeout: float = IDLE_TIMEOUT,
+                   pragmas: Union[dict, None] = None) -> 'ReadOnlyConnectionPool':
+        """
+        Loads the database file object `image` (see `load_image`) into a new in-memory database that the
+        connections of the pool share (SQLite's "memdb" VFS). Every pool gets a database of its own, which lives
+        until the pool is closed.
+
+        :param image: binary file object holding a SQLite database file; an empty database if `None`
+        :param idle_timeout: seconds after which an unused connection is closed
+        :param pragmas: pragmas of every connection; `READ_ONLY_PRAGMAS` if `None`
+        :return: the pool
+        """
+        uri = "file:/{0}?vfs=memdb".format(uuid.uuid4().hex)
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)  # <- keeps the database alive
+        if image is not None:
+            try:
+                load_image(image, anchor)
+            except sqlite3.DatabaseError as e:
+                anchor.close()
+                logging.error("Couldn't load the database file: {0}".format(e))
+                raise
+        pool = cls(uri=uri, idle_timeout=idle_timeout, pragmas=pragmas)
+        pool._anchor = anchor
+        return pool
+
+    def _open(self) -> sqlite3.Connection:
+        logging.info("Opening read-only connection '{0}' for thread {1}".format(self._uri, threading.get_ident()))
+        connection = sqlite3.connect(self._uri, uri=True, check_same_thread=False,
+                                     cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma, value in self._pragmas.items():
+            connection.execute("PRAGMA {0} = {1}".format(pragma, value))
+        return connection
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        :return: the connection of the calling thread (opened if the thread has none yet)
+        """
+        thread_id = threading.get_ident()
+        now = time.monotonic()
+        with self._lock:
+            self._close_idle(now, keep=thread_id)
+            connection, _ = self._connections.get(thread_id, (None, None))
+            if connection is None:
+                connection = self._open()
+            self._connections[thread_id] = (connection, now)
+        return connection
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """
+        Hands out the connection of the calling thread (see `connection`) for the duration of the `with` block;
+        a checked out connection is never closed as idle, however long it is used.
+
+        :return: the connection
+        """
+        connection = self.connection()
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._checkouts[thread_id] += 1
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                self._checkouts[thread_id] -= 1
+                if self._checkouts[thread_id] == 0:
+                    del self._checkouts[thread_id]
+                if thread_id in self._connections:
+                    self._connections[thread_id] = (connection, time.monotonic())
+
+    def execute(self, sql: str, parameters: Union[tuple, dict] = ()) -> sqlite3.Cursor:
+        with self.checkout() as connection:
+            return connection.execute(sql, parameters)
+
+    def cursor(self) -> sqlite3.Cursor:
+        return self.connection().cursor()
+
+    def close_idle(self) -> None:
+        """
+        Closes the connections that weren't used for `idle_timeout` seconds.
+
+        :return:
+        """
+        with self._lock:
+            self._close_idle(time.monotonic())
+
+    def _close_idle(self, now: float, keep: Union[int, None] = None) -> None:
+        for thread_id, (connection, last_used) in list(self._connections.items()):
+            if thread_id != keep and thread_id not in self._checkouts and now - last_used > self._idle_timeout:
+                logging.info("Closing idle connection of thread {0}".format(thread_id))
+                connection.close()
+                del self._connections[thread_id]
+
+    def close(self) -> None:
+        """
+        Closes all connections of the pool (and frees the database of `from_image`).
+
+        :return:
+        """
+        with self._lock:
+            for connection, _ in self._connections.values():
+                connection.close()
+            self._connections.clear()
+            if self._anchor is not None:
+                self._anchor.close()
+                self._anchor = None
+
+    @property
+    def size(self) -> int:
+        """
+        :return: the number of open connections
+        """
+        return len(self._connections)
@@ -0,0 +1,219 @@
+import time
+import logging
+import sqlite3
+import contextlib
+from collections import defaultdict, namedtuple
+from typing import Union
+
+# upper bound of compiled statements the sqlite3 module keeps per connection (least recently used ones are dropped);
+# see `ReadOnlyConnectionPool`
+STATEMENT_CACHE_SIZE = 128
+
+# named statements of the app; values are bound with "?" parameters, only table names and column expressions
+# are format fields ("{table}", "{sentence_key}"), so that every statement has a stable text that sqlite3 compiles once
+STATEMENTS = {
+    "annotator_rows": """
+        SELECT id, annotator
+        FROM annotators;
+        """,
+    "document_rows": """
+        SELECT id, document
+        FROM documents;
+        """,
+    "layer_rows": """
+        SELECT id, layer
+        FROM layers;
+        """,
+    "annotation_type_rows": """
+        SELECT id, type, layer
+        FROM annotation_types;
+        """,
+    "sentence_columns": """
+        PRAGMA table_info(sentences);
+        """,
+    "sentence_row_id": """
+        SELECT id
+        FROM sentences
+        WHERE document = ? AND sentence_index = ? AND sentence_annotator IS ?;
+        """,
+    "sentences_for_document": """
+        SELECT {sentence_key}, begin, end, (SELECT hash FROM document_texts WHERE id = document_text)
+        FROM sentences
+        WHERE document = ?
+        ORDER BY begin;
+        """,
+    "document_text": """
+        SELECT text, compressed
+        FROM document_texts
+        WHERE hash = ?;
+        """,
+    "sentences_with_annotations": """
+        SELECT {sentence_key}
+        FROM sentences
+        WHERE document = ? AND has_annotation = 1;
+        """,
+    "sentences_with_annotation_type": """
+        SELECT {sentence_key}
+        FROM sentences
+        WHERE id IN (
+            SELECT sentence
+            FROM sentence_annotation_summary
+            WHERE document = ? AND type = ?
+        );
+        """,
+    "annotations_for_sentence": """
+        SELECT id, begin, end, type
+        FROM {table}
+        WHERE sentence = ? AND annotator = ?
+        ORDER BY begin;
+        """,
+    "annotation_types_for_document": """
+        SELECT DISTINCT type
+        FROM sentence_annotation_summary
+        WHERE document = ?;
+        """,
+    "annotation_ids_for_type": """
+        SELECT id
+        FROM {table}
+        WHERE document = ? AND type = ?
+        ORDER BY sentence, begin;
+        """
+}
+
+# statements of databases built before the sentence texts moved into `document_texts`: "sentences_for_document"
+# selects the text of the sentence instead of the hash of its document text
+LEGACY_TEXT_STATEMENTS = {
+    "sentences_for_document": """
+        SELECT {sentence_key}, begin, end, text
+        FROM sentences
+        WHERE document = ?
+        ORDER BY begin;
+        """
+}
+# statements of databases built before `sentence_annotation_summary`: they read one entity table ("{table}") each,
+# the caller combines the results of all entity tables
+LEGACY_SUMMARY_STATEMENTS = {
+    "sentences_with_annotation_type": """
+        SELECT {sentence_key}
+        FROM sentences
+        WHERE id IN (
+            SELECT sentence
+            FROM {table}
+            WHERE document = ? AND type = ?
+        );
+        """,
+    "annotation_types_for_document": """
+        SELECT DISTINCT type
+        FROM {table}
+        WHERE document = ?;
+        """
+}
+
+# the parts of the layout that changed over time (see `database_layout`)
+DatabaseLayout = namedtuple('DatabaseLayout', ['document_texts', 'annotation_summary'])
+
+
+def database_layout(connection: Union[sqlite3.Connection, 'ReadOnlyConnectionPool']) -> DatabaseLayout:
+    """
+    :param connection: connection to a database built by `store_brat`/`store_xmi` (of any version)
+    :return: which parts of the current layout the database has
+    :raises ValueError: if the database has no annotations at all (it wasn't built by `store_brat`/`store_xmi`)
+    """
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+    sentence_columns = {row[1] for row in connection.execute("PRAGMA table_info(sentences);")}
+    required = {"annotators", "documents", "layers", "annotation_types", "sentences"}
+    if not required.issubset(tables) or not sentence_columns.intersection({"text", "document_text"}):
+        logging.error("The database lacks the tables {0} or the sentence texts; it has to be built (again) with "
+                      "'database/database.py'".format(", ".join(sorted(required.difference(tables))) or "-"))
+        raise ValueError(sorted(tables))
+    return DatabaseLayout(document_texts="document_text" in sentence_columns and "document_texts" in tables,
+                          annotation_summary="sentence_annotation_summary" in tables)
+
+
+def statements_for_layout(layout: DatabaseLayout) -> dict:
+    """
+    :param layout: see `database_layout`
+    :return: `STATEMENTS` with the statements of an older layout where the database has one
+    """
+    statements = dict(STATEMENTS)
+    if not layout.document_texts:
+        statements.update(LEGACY_TEXT_STATEMENTS)
+    if not layout.annotation_summary:
+        statements.update(LEGACY_SUMMARY_STATEMENTS)
+    return statements
+
+
+class QueryRepository:
+    def __init__(self, connection: Union[sqlite3.Connection, 'ReadOnlyConnectionPool'],
+                 statements: Union[dict, None] = None) -> None:
+        """
+        Runs named statements (see `STATEMENTS`) with bound parameters over one connection and keeps the number of
+        calls and the time spent for every statement name.
+
+        :param connection: the connection all statements run on, or a `ReadOnlyConnectionPool` (every thread then
+         runs the statements on a connection of its own)
+        :param statements: `dict(name: statement)`; `STATEMENTS` if `None`
+        """
+        self._connection = connection
+        self._statements = dict(STATEMENTS if statements is None else statements)
+        self._sql = dict()
+        self._timings = defaultdict(lambda: [0, 0.0])
+
+    @property
+    def connection(self) -> Union[sqlite3.Connection, 'ReadOnlyConnectionPool']:
+        return self._connection
+
+    def sql(self, name: str, **fields) -> str:
+        """
+        :param name: name of the statement
+        :param fields: values of the format fields of the statement (table names, column expressions)
+        :return: the statement text
+        """
+        key = (name, tuple(sorted(fields.items())))
+        if key not in self._sql:
+            if name not in self._statements:
+                logging.error("No statement named '{0}'".format(name))
+                raise KeyError(name)
+            self._sql[key] = self._statements[name].format(**fields)
+        return self._sql[key]
+
+    def execute(self, name: str, params: tuple = (), **fields) -> list:
+        """
+        :param name: name of the statement
+        :param params: values bound to the "?" parameters of the statement
+        :param fields: values of the format fields of the statement
+        :return: all result rows
+        """
+        sql = self.sql(name, **fields)
+        start = time.perf_counter()
+        # a connection of a pool stays checked out until all rows are fetched (see `ReadOnlyConnectionPool.checkout`)
+        with self._connection.checkout() if hasattr(self._connection, "checkout") \
+                else contextlib.nullcontext(self._connection) as connection:
+            rows = connection.execute(sql, params).fetchall()
+        timing = self._timings[name]
+        timing[0] += 1
+        timing[1] += time.perf_counter() - start
+        return rows
+
+    def column(self, name: str, params: tuple = (), **fields) -> list:
+        """
+        :return: the first column of all result rows (see `execute`)
+        """
+        return [row[0] for row in self.execute(name, params, **fields)]
+
+    def scalar(self, name: str, params: tuple = (), **fields):
+        """
+        :return: the first column of the first result row or `None` if there is no result (see `execute`)
+        """
+        rows = self.execute(name, params, **fields)
+        return rows[0][0] if len(rows) >= 1 else None
+
+    def timings(self) -> dict:
+        """
+        :return: `dict(name: dict("calls": int, "seconds": float, "ms/call": float))` for every statement that ran
+        """
+        return {name: {"calls": calls, "seconds": seconds, "ms/call": 1000 * seconds / calls if calls > 0 else 0.0}
+                for name, (calls, seconds) in sorted(self._timings.items())}
+
+    def reset_timings(self) -> None:
+        self._timings.clear()
@@ -0,0 +1,138 @@
+import os
+import time
+import hashlib
+import logging
+import pathlib
+import tempfile
+import threading
+from typing import Union, BinaryIO
+
+# size of the chunks uploads are hashed and written in
+UPLOAD_CHUNK_SIZE = 1 << 20
+# seconds after which a session that didn't touch its database anymore no longer holds it (there is no signal for
+# the end of a session, so an abandoned session is only recognized by its inactivity)
+HOLD_TIMEOUT = 3600
+
+
+class TempDatabaseManager:
+    def __init__(self, directory: Union[str, pathlib.Path], quota: int, hold_timeout: float = HOLD_TIMEOUT) -> None:
+        """
+        Keeps the uploaded database files of all sessions in `directory`. Every file is named after the SHA-256 of
+        its content, i.e. the same upload is stored only once and reused by every session that uploads it; since
+        its content never changes, it can be opened `immutable`. The modification time of a file is its last access.
+        Whenever a database is added, the least recently used databases that no session holds are deleted until
+        the files fit into `quota` bytes again.
+
+        :param directory: folder of the databases (created if it does not exist)
+        :param quota: size in bytes the databases in `directory` may take up
+        :param hold_timeout: seconds after which a session that didn't `touch` its database releases it
+        """
+        self._dir = pathlib.Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._quota = quota
+        self._hold_timeout = hold_timeout
+        self._holds = dict()  # <- session id: (database file, time of the last touch)
+        self._lock = threading.Lock()
+
+    @property
+    def quota(self) -> int:
+        return self._quota
+
+    def usage(self) -> int:
+        """
+        :return: the size in bytes of all databases in the folder
+        """
+        return sum(db_file.stat().st_size for db_file in self._dir.glob("*.db"))
+
+    def fits(self, size: int) -> bool:
+        """
+        :param size: size in bytes of a database
+        :return: whether a database of this size can be stored at all (i.e. is not larger than the quota)
+        """
+        return size <= self._quota
+
+    def acquire(self, session_id: str, image: BinaryIO) -> pathlib.Path:
+        """
+        Stores the database file object `image` (unless the same content is already stored) and lets the session
+        hold it; a database the session held before is released.
+
+        :param session_id: id of the session
+        :param image: seekable binary file object holding a SQLite database file (e.g. an upload)
+        :return: the path of the stored database
+        """
+        digest = hashlib.sha256()
+        image.seek(0)
+        for chunk in iter(lambda: image.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        db_file = self._dir / "{0}.db".format(digest.hexdigest())
+        with self._lock:
+            if not db_file.exists():
+                image.seek(0)
+                self._write(image, db_file)
+            else:
+                logging.info("Reusing the stored database '{0}'".format(db_file.name))
+            os.utime(db_file)
+            self._holds[session_id] = (db_file, time.monotonic())
+            self._evict()
+        return db_file
+
+    def touch(self, session_id: str) -> Union[pathlib.Path, None]:
+        """
+        Marks the database of the session as used (it stays held and becomes the most recently used one).
+
+        :param session_id: id of the session
+        :return: the path of the database or `None` if the session doesn't hold one (anymore)
+        """
+        with self._lock:
+            db_file, _ = self._holds.get(session_id, (None, None))
+            if db_file is None or not db_file.exists():
+                self._holds.pop(session_id, None)
+                return None
+            os.utime(db_file)
+            self._holds[session_id] = (db_file, time.monotonic())
+        return db_file
+
+    def release(self, session_id: str) -> None:
+        """
+        :param session_id: id of the session whose database may be evicted from now on
+        :return:
+        """
+        with self._lock:
+            self._holds.pop(session_id, None)
+
+    def _write(self, image: BinaryIO, db_file: pathlib.Path) -> None:
+        logging.info("Storing the database '{0}'".format(db_file.name))
+        tmp_fd, tmp_file = tempfile.mkstemp(dir=self._dir, prefix=".upload-")
+        try:
+            with os.fdopen(tmp_fd, 'wb') as tmp:
+                for chunk in iter(lambda: image.read(UPLOAD_CHUNK_SIZE), b""):
+                    tmp.write(chunk)
+            os.replace(tmp_file, db_file)  # <- other sessions never see a partly written database
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    def _held_files(self) -> set:
+        now = time.monotonic()
+        for session_id, (_, last_touch) in list(self._holds.items()):
+            if now - last_touch > self._hold_timeout:
+                del self._holds[session_id]
+        return set(db_file for db_file, _ in self._holds.values())
+
+    def _evict(self) -> None:
+        db_files = [(db_file, db_file.stat()) for db_file in self._dir.glob("*.db")]
+        usage = sum(stat.st_size for _, stat in db_files)
+        if usage <= self._quota:
+            return
+        held = self._held_files()
+        for db_file, stat in sorted(db_files, key=lambda f: f[1].st_mtime):
+            if usage <= self._quota:
+                break
+            if db_file in held:
+                continue
+            logging.info("Evicting the database '{0}' ({1} bytes)".format(db_file.name, stat.st_size))
+            db_file.unlink()
+            usage -= stat.st_size
+        if usage > self._quota:
+            logging.warning("The databases in '{0}' take up {1} bytes, more than the quota of {2} bytes, "
+                            "but all of them are in use".format(self._dir, usage, self._quota))
@@ -1,24 +1,28 @@
 # -*- coding: utf-8 -*-
 
+import uuid
 import pathlib
-import functools
 import collections
 import itertools
 import sqlite3
-import time
 
 import streamlit as st
 import pandas as pd
-import numpy as np
 from spacy import displacy
 from seaborn import color_palette
 from typing import List, OrderedDict, Union, Dict, Set, Tuple
 
 import SessionState
-from agreement import InstanceAgreement, TokenAgreement
+from agreement import InstanceAgreement, TokenAgreement, CorpusAgreement, LabelMatrices
 
 # ToDo: replace table names with constants?
-from app_constants.base_config import DatabaseCategories, DefaultTableNames, layers
+from app_constants import temp_db_quota_mb
+from app_constants.base_config import DatabaseCategories, DefaultTableNames, layers, compact_sentence_key
+from database.queries import QueryRepository, database_layout, statements_for_layout
+from database.database import decode_document_text
+from database.catalog import AnnotationCatalog
+from database.pool import ReadOnlyConnectionPool
+from database.tempdb import TempDatabaseManager
 
 
 def display_sentence_comparison(sel_annotators: list, sent_id: str, doc_id: str,
@@ -46,40 +50,77 @@ def display_sentence_comparison(sel_annotators: list, sent_id: str, doc_id: str,
 
 
 def is_entity_categorie(tid):
-    return tid in entity_type_ids()
+    return session.catalog.is_annotation_type_of_layer(tid, id_for_layer("entities"))
 
 
-@st.cache(hash_funcs={sqlite3.Connection: id})
+@st.cache(allow_output_mutation=True, hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
+def corpus_agreement_obj(docs: tuple) -> CorpusAgreement:
+    """
+    :param docs: ids of the documents
+    :return:
+    """
+    return CorpusAgreement(documents=list(docs), db_connection=session.db_connection)
+
+
+@st.cache(hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
 def corpus_agreement(annotators, docs, focus_entity, focus_attribute):
+    """
+    :return: `dict((annotator, annotator): [ia_entity, ta_entity, ia_event, ta_event])` for every annotator pair; every
+     score is a `(micro F-score, macro F-score)` tuple over all documents
+    """
+    ca = corpus_agreement_obj(tuple(docs))
+    _scores = []
+    for _instance, _combined_entities, _combined_attributes in [(focus_entity, True, False),
+                                                               (focus_attribute, False, True)]:
+        for _token in (False, True):
+            if _instance is None:
+                _scores.append({})
+                continue
+            instance_id, table = agreement_scope(_instance, _combined_entities, _combined_attributes)
+            _scores.append(ca.fscores([id_for_annotator(a) for a in annotators], instance_id, table, token=_token))
     _score_dict = {}
     for _comb in itertools.combinations(annotators, 2):
-        _score_dict[_comb] = {}
-        for _doc in docs:
-            ia_entity = instance_agreement(_doc, focus_entity, list(_comb))
-            ta_entity = token_agreement(_doc, focus_entity, list(_comb))
-            ia_event = instance_agreement(_doc, focus_attribute, list(_comb),
-                                          combined_entities=False, combined_attributes=True)
-            ta_event = token_agreement(_doc, focus_attribute, list(_comb),
-                                       combined_entities=False, combined_attributes=True)
-            _score_dict[_comb][_doc] = [ia_entity, ta_entity, ia_event, ta_event]
+        _ids = (id_for_annotator(_comb[0]), id_for_annotator(_comb[1]))
+        _score_dict[_comb] = [_s.get(_ids, (0, 0)) for _s in _scores]
     return _score_dict
-            
+
+
+@st.cache(allow_output_mutation=True, hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
+def label_matrices_obj(docs: tuple, annotators: tuple) -> LabelMatrices:
+    """
+    :param docs: ids of the documents
+    :param annotators: ids of the annotators
+    :return:
+    """
+    return LabelMatrices(documents=list(docs), annotators=list(annotators), db_connection=session.db_connection)
+
+
+@st.cache(hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
+def corpus_chance_agreement(annotators, docs, focus_entity, focus_attribute):
+    """
+    :return: `[(kappa, alpha) of all entity types, (kappa, alpha) of all event types]`: Fleiss' kappa and
+     Krippendorff's alpha of the character labels of all annotators over all documents
+    """
+    lm = label_matrices_obj(tuple(docs), tuple(id_for_annotator(a) for a in annotators))
+    _scores = []
+    for _instance, _combined_entities, _combined_attributes in [(focus_entity, True, False),
+                                                               (focus_attribute, False, True)]:
+        if _instance is None:
+            _scores.append((0, 0))
+            continue
+        instance_id, table = agreement_scope(_instance, _combined_entities, _combined_attributes)
+        _kappa, _alpha, _ = lm.scores(instance_id, table)
+        _scores.append((_kappa, _alpha))
+    return _scores
+
 
 @st.cache()
 def reversed_layers():
     return {x: y for y, x in layers.items()}
 
 
-@st.cache()
 def entity_type_ids():
-    res = [d[0] for d in session.db_connection.execute(
-        """
-        SELECT id
-        FROM annotation_types
-        WHERE layer IS {}
-        """.format(id_for_layer("entities"))
-    ) if len(d) >= 1]
-    return res
+    return session.catalog.annotation_type_ids_for_layer(id_for_layer("entities"))
 
 
 @st.cache()
@@ -96,16 +137,8 @@ def event_names_in_document(annotation_names, sort=False):
     return _evts if not sort else sorted(_evts)
 
 
-@st.cache()
 def event_type_ids():
-    res = [d[0] for d in session.db_connection.execute(
-        """
-        SELECT id
-        FROM annotation_types
-        WHERE layer IS {}
-        """.format(id_for_layer("events"))
-    ) if len(d) >= 1]
-    return res
+    return session.catalog.annotation_type_ids_for_layer(id_for_layer("events"))
 
 
 @st.cache()
@@ -161,169 +194,92 @@ def return_relation_html():
 
 @st.cache()
 def get_color_dict():
-    entities = [e[0] for e in session.db_connection.execute(
-        """
-        SELECT type FROM annotation_types
-        ORDER BY type;
-        """
-    ) if len(e) >= 1]
+    entities = session.catalog.annotation_type_names
     colors = color_palette('colorblind', len(entities)).as_hex()
     return {entity.upper(): color for entity, color in zip(entities, colors)}
 
 
-@st.cache()
+# the lookups in the small tables are answered by the catalog of the database (see `AnnotationCatalog`)
 def annotator_names() -> list:
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT annotator
-        FROM annotators
-        ORDER BY annotator;
-        """
-    ) if len(a) >= 1]
-    return res
+    return session.catalog.annotator_names
 
 
-@st.cache()
 def document_titles() -> list:
-    res = [doc[0] for doc in session.db_connection.execute(
-        """
-        SELECT DISTINCT document
-        FROM documents
-        ORDER BY document;
-        """
-    ) if len(doc) >= 1]
-    return res
+    return session.catalog.document_titles
 
 
-@st.cache()
 def annotation_types() -> list:
-    res = [a_type[0] for a_type in session.db_connection.execute(
-        """
-        SELECT id
-        FROM annotation_types
-        """
-    ) if len(a_type) >= 1]
-    return res
+    return session.catalog.annotation_type_ids
 
 
-@st.cache()
 def layer_for_annotation_type_id(a_id: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT layer
-        FROM annotation_types
-        WHERE id = '{}';
-        """.format(a_id)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.layer_for_annotation_type_id(a_id)
 
 
-@st.cache()
 def layer_for_id(lid: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT layer
-        FROM layers
-        WHERE id = '{}';
-        """.format(lid)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.layer_for_id(lid)
 
 
-@st.cache()
 def id_for_layer(layer: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT id
-        FROM layers
-        WHERE layer = '{}';
-        """.format(layer.lower())
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.id_for_layer(layer)
 
 
-@st.cache()
 def annotation_type_for_id(annotation_id: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT type
-        FROM annotation_types
-        WHERE id = '{}';
-        """.format(annotation_id)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.annotation_type_for_id(annotation_id)
 
 
-@st.cache()
 def id_for_annotation_type(annotation: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT id
-        FROM annotation_types
-        WHERE type = '{}';
-        """.format(annotation.lower())
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.id_for_annotation_type(annotation)
 
 
-@st.cache()
 def annotator_for_id(annotator_id: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT annotator
-        FROM annotators
-        WHERE id = '{}';
-        """.format(annotator_id)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.annotator_for_id(annotator_id)
 
 
-@st.cache()
 def id_for_annotator(annotator: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT id
-        FROM annotators
-        WHERE annotator = '{}';
-        """.format(annotator)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.id_for_annotator(annotator)
 
 
-@st.cache()
 def document_for_id(document_id: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT document
-        FROM documents
-        WHERE id = '{}';
-        """.format(document_id)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.document_for_id(document_id)
 
 
-@st.cache()
 def id_for_document(document: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT id
-        FROM documents
-        WHERE document = '{}';
-        """.format(document)
-    ) if len(a) >= 1]
-    return res[0] if len(res) >= 1 else None
+    return session.catalog.id_for_document(document)
 
 
-@st.cache()
 def annotation_types_for_layer_id(lid: str):
-    res = [a[0] for a in session.db_connection.execute(
-        """
-        SELECT type
-        FROM annotation_types
-        WHERE layer = '{}';
-        """.format(lid)
-    ) if len(a) >= 1]
-    return res
+    return session.catalog.annotation_types_for_layer(lid)
+
+
+@st.cache()
+def is_compact_db() -> bool:
+    """
+    :return: whether the database uses the compact schema (integer ids; the parts of a sentence id are columns)
+    """
+    return "sentence_index" in [c[1] for c in session.queries.execute("sentence_columns")]
+
+
+@st.cache()
+def sentence_key_column() -> str:
+    """
+    :return: the column (or expression) that yields the text id of a sentence ("doc-sentence" or
+     "doc-sentence-annotator") in both schemas
+    """
+    return compact_sentence_key if is_compact_db() else "id"
+
+
+@st.cache()
+def sentence_row_id(sent_id: str):
+    """
+    :param sent_id: the text id of a sentence
+    :return: the id the annotation tables reference the sentence with
+    """
+    if not is_compact_db():
+        return sent_id
+    document, sentence_index, *sentence_annotator = sent_id.split("-")
+    return session.queries.scalar("sentence_row_id", (document, sentence_index,
+                                                      sentence_annotator[0] if sentence_annotator else None))
 
 
 @st.cache()
@@ -348,14 +304,22 @@ def sentences_for_document(doc_id: str) -> OrderedDict[str, str]:
     #     ###
     #     if start_id == next_id:
     #         break
-    return collections.OrderedDict((sents[0], sents[1]) for sents in session.db_connection.execute(
-        """
-        SELECT id, text
-        FROM {0}
-        WHERE document = '{1}'
-        ORDER BY begin;
-        """.format(DefaultTableNames.sentences, doc_id)
-    ))
+    _rows = session.queries.execute("sentences_for_document", (doc_id,), sentence_key=sentence_key_column())
+    if not session.layout.document_texts:
+        # a database of an older version holds the text of every sentence
+        return collections.OrderedDict((sents[0], sents[3]) for sents in _rows)
+    return collections.OrderedDict((sents[0], document_text(sents[3])[sents[1]:sents[2]]) for sents in _rows)
+
+
+@st.cache()
+def document_text(text_hash: str) -> str:
+    """
+    :param text_hash: the hash of a document text (unlike its id, the same hash stands for the same text in every
+     database)
+    :return: the (decompressed) text
+    """
+    text, compressed = session.queries.execute("document_text", (text_hash,))[0]
+    return decode_document_text(text, compressed)
 
 
 def annotations_for_sentence_for_anno_list(anno_ids: List[str],
@@ -390,57 +354,35 @@ def annotations_for_sentence(anno_id: str, sent_id: str):
     #     where_and_clause = " AND annotator = '{}'".format(anno_id[0])
     # if len(anno_id) == 0:
     #     return {}
-    annotations = {}
-    cmd_str = ""
+    results = []
     # ToDo: no hard-coded list -> use a conf entry for annotation entities
     for _l in ["entities", "events"]:
         if _l not in reversed_layers():  # .keys():
             continue
-        cmd_str += """
-        SELECT id, begin, end, type
-        FROM {0}
-        WHERE sentence = '{1}' AND annotator = '{2}'
-        UNION ALL
-        """.format(reversed_layers()[_l], sent_id, anno_id)
-    cmd_str = cmd_str.rpartition("UNION ALL")[0]
-    cmd_str += "\nORDER BY begin;"
-    for result in session.db_connection.execute(cmd_str):
-        annotations[result[0]] = {"begin": result[1], "end": result[2], "type": result[3]}
-    return annotations
+        results.extend(session.queries.execute("annotations_for_sentence", (sentence_row_id(sent_id), anno_id),
+                                               table=reversed_layers()[_l]))
+    return {result[0]: {"begin": result[1], "end": result[2], "type": result[3]}
+            for result in sorted(results, key=lambda r: r[1])}
+
+
+def summary_column(name: str, params: tuple, **fields) -> list:
+    # the statements of `sentence_annotation_summary`; a database of an older version has no summary, its statements
+    # read every entity table instead
+    if session.layout.annotation_summary:
+        return session.queries.column(name, params, **fields)
+    return [value for _l in ["entities", "events"] if _l in reversed_layers()
+            for value in session.queries.column(name, params, table=reversed_layers()[_l], **fields)]
 
 
 @st.cache()
-def all_annotations_for_document(doc_id: str):
-    cmd_str = """
-    SELECT group_concat(id), sentence, group_concat(type) 
-    FROM
-    (
-    """
-    # ToDo: no hard-coded list -> use a conf entry for annotation entities
-    for _l in ["entities", "events"]:
-        if _l not in reversed_layers():  # .keys():
-            continue
-        cmd_str += """
-        SELECT group_concat(id) as id, sentence, group_concat(type) as type
-        FROM {0}
-        WHERE document = '{1}'
-        GROUP BY sentence
-        UNION ALL""".format(reversed_layers()[_l], doc_id)
-    cmd_str = cmd_str.rpartition("UNION ALL")[0]
-    cmd_str += "\nORDER BY sentence)\nGROUP BY sentence"
-    return {row[1]: {"ids": row[0].split(","), "types": row[2].split(",")}
-            for row in session.db_connection.execute(cmd_str)}
+def annotation_types_for_document(doc_id: str) -> Set[str]:
+    return {str(type_id) for type_id in summary_column("annotation_types_for_document", (doc_id,))}
 
 
 @st.cache()
 def sentences_with_annotations(doc_id: str) -> Dict[str, Set[str]]:
     _return = collections.defaultdict(set)
-    for sents in session.db_connection.execute(
-            """
-            SELECT id
-            FROM {0}
-            WHERE document = '{1}' AND has_annotation = 1;
-            """.format(DefaultTableNames.sentences, doc_id)):
+    for sents in session.queries.execute("sentences_with_annotations", (doc_id,), sentence_key=sentence_key_column()):
         sent_id_parts = sents[0].split("-")
         _return["-".join(sent_id_parts[:-1] if len(sent_id_parts) >= 3 else sent_id_parts[:])].add(sents[0])
     return _return
@@ -450,15 +392,7 @@ def sentences_with_annotations(doc_id: str) -> Dict[str, Set[str]]:
 def sentences_with_annotation_type(doc_id: str, anno_type: str):
     # ToDo: for showing only sentences in a doc that have the selected annotation
     anno_as_id = id_for_annotation_type(anno_type)
-    table = reversed_layers()["entities" if is_entity_categorie(anno_as_id) else "events"]
-
-    _sents = [sents[0] for sents in session.db_connection.execute(
-        """
-        SELECT sentence
-        FROM {0}
-        WHERE type = '{1}';
-        """.format(table, anno_as_id)
-    )]
+    _sents = summary_column("sentences_with_annotation_type", (doc_id, anno_as_id), sentence_key=sentence_key_column())
     return {s_id: s_set for s_id, s_set in sentences_with_annotations(doc_id).items() if s_id in _sents}
 
 
@@ -471,15 +405,15 @@ def doc_annotations_for_type(tid: str, doc_id: str, combined_drugs: bool = True)
     :param combined_drugs: whether all sub categories of the drugs should be handled as one
     :return:
     """
+    if combined_drugs and is_entity_categorie(tid):
+        type_ids = sorted(t for t in annotation_types_for_document(doc_id) if is_entity_categorie(t))
+    else:
+        type_ids = [tid]
     ids = list()
-    for id_types in all_annotations_for_document(doc_id).values():
-        for i in range(len(id_types.get("ids"))):
-            type_id = id_types.get("types")[i]
-            id_id = id_types.get("ids")[i]
-            if combined_drugs and is_entity_categorie(type_id) and is_entity_categorie(tid):
-                ids.append(id_id)
-            elif tid == type_id:
-                ids.append(id_id)
+    for type_id in type_ids:
+        table = reversed_layers()["entities" if is_entity_categorie(type_id) else "events"]
+        ids.extend(str(_id) for _id in session.queries.column("annotation_ids_for_type", (doc_id, type_id),
+                                                               table=table))
     return ids
 
 
@@ -487,7 +421,7 @@ def separate_annotations_by_annotators(annotation_ids: list, annotator_ids: list
     return {anno_id: [anno for anno in annotation_ids if anno.split("-")[0] == anno_id] for anno_id in annotator_ids}
 
 
-@st.cache(allow_output_mutation=True, hash_funcs={sqlite3.Connection: id})
+@st.cache(allow_output_mutation=True, hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
 def instance_agreement_obj_for_document(doc_id: str):
     """
     :param doc_id:
@@ -497,7 +431,7 @@ def instance_agreement_obj_for_document(doc_id: str):
                              doc_id=doc_id, db_connection=session.db_connection)
 
 
-@st.cache(allow_output_mutation=True, hash_funcs={sqlite3.Connection: id})
+@st.cache(allow_output_mutation=True, hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
 def token_agreement_obj_for_document(doc_id: str):
     """
     :param doc_id:
@@ -507,39 +441,44 @@ def token_agreement_obj_for_document(doc_id: str):
                           doc_id=doc_id, db_connection=session.db_connection)
 
 
-@st.cache(hash_funcs={sqlite3.Connection: id})
-def instance_agreement(doc_id: str, instance: str, annotators: list,
-                       combined_entities: bool = True, combined_attributes: bool = False):
+def agreement_scope(instance: str, combined_entities: bool = True, combined_attributes: bool = False) \
+        -> Tuple[Union[str, set], str]:
+    """
+    :param instance: name of the annotation type
+    :param combined_entities: compare all entity types with each other (if `instance` is an entity type)
+    :param combined_attributes: compare all event types with each other (if `instance` is an event type)
+    :return: the compared annotation type id(s) and the table that holds them
+    """
     # ToDo: combined_ents will never matter if combined_attrs is True
-    if instance is None:
-        return 0
     instance_id = id_for_annotation_type(instance)
-    annotators = [id_for_annotator(a) for a in annotators]
-    ia = instance_agreement_obj_for_document(doc_id)
     table = reversed_layers()["entities"] if is_entity_categorie(instance_id) \
         else reversed_layers()["events"]
     if combined_entities and is_entity_categorie(instance_id):
         instance_id = entity_type_ids()
     if combined_attributes and not is_entity_categorie(instance_id):
         instance_id = set(annotation_types()).difference(entity_type_ids())
+    return instance_id, table
+
+
+@st.cache(hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
+def instance_agreement(doc_id: str, instance: str, annotators: list,
+                       combined_entities: bool = True, combined_attributes: bool = False):
+    if instance is None:
+        return 0
+    instance_id, table = agreement_scope(instance, combined_entities, combined_attributes)
+    annotators = [id_for_annotator(a) for a in annotators]
+    ia = instance_agreement_obj_for_document(doc_id)
     return ia.agreement_fscore(instance_type=instance_id, annotators=annotators, table=table)
 
 
-@st.cache(hash_funcs={sqlite3.Connection: id})
+@st.cache(hash_funcs={sqlite3.Connection: id, ReadOnlyConnectionPool: id})
 def token_agreement(doc_id: str, instance: str, annotators: list,
                     combined_entities: bool = True, combined_attributes: bool = False):
-    # ToDo: combined_ents will never matter if combined_attrs is True
     if instance is None:
         return 0
-    instance_id = id_for_annotation_type(instance)
+    instance_id, table = agreement_scope(instance, combined_entities, combined_attributes)
     annotators = [id_for_annotator(a) for a in annotators]
     ta = token_agreement_obj_for_document(doc_id)
-    table = reversed_layers()["entities"] if is_entity_categorie(instance_id) \
-        else reversed_layers()["events"]
-    if combined_entities and is_entity_categorie(instance_id):
-        instance_id = entity_type_ids()
-    if combined_attributes and not is_entity_categorie(instance_id):
-        instance_id = set(annotation_types()).difference(entity_type_ids())
     return ta.agreement_fscore(instance_type=instance_id, annotators=annotators, table=table)
 
 
@@ -554,19 +493,50 @@ def highlight_row(row: pd.Series, foci: list):
 #     return sqlite3.connect("./data_base_tmp/tmp.db", check_same_thread=False)
 
 
+@st.cache(allow_output_mutation=True)
+def temp_db_manager() -> TempDatabaseManager:
+    # one manager for all sessions
+    return TempDatabaseManager(temp_db_dir, quota=temp_db_quota_mb * 1024 * 1024)
+
+
 # @st.cache()
-def create_temporary_db(file_io, is_db_file) -> sqlite3.Connection:
-    print(f"Created temporary db file under '{temp_db_file.resolve()}'")
-    if temp_db_file.exists():
-        temp_db_file.open('w').close()
-        time.sleep(0.5)
-    with temp_db_file.open('wb') as tmp:
-        if is_db_file:
-            tmp.write(file_io.read())
-        else:
-            #  ToDo: transform to sqlite db
-            pass
-    return sqlite3.connect(temp_db_file.resolve(), check_same_thread=False)
+def create_temporary_db(file_io, is_db_file) -> ReadOnlyConnectionPool:
+    session.db_file = ''
+    if not is_db_file:
+        #  ToDo: transform to sqlite db
+        return ReadOnlyConnectionPool.from_image()
+    if not temp_db_manager().fits(file_io.seek(0, 2)):
+        # larger than the whole quota: the database is kept in memory for this session only
+        return ReadOnlyConnectionPool.from_image(file_io)
+    # the stored database is named after its content and never changes, i.e. it can be opened `immutable`
+    session.db_file = temp_db_manager().acquire(session.session_id, file_io)
+    return ReadOnlyConnectionPool(session.db_file, immutable=True)
+
+
+def close_temporary_db() -> None:
+    # the database the session replaces or drops may be evicted from now on
+    if session.db_connection:
+        session.db_connection.close()
+    if session.db_file:
+        temp_db_manager().release(session.session_id)
+    session.db_connection = None
+    session.db_file = ''
+
+
+def open_temporary_db() -> None:
+    close_temporary_db()
+    session.db_connection = create_temporary_db(session.file_upload, session.upload_type == "db file")
+    try:
+        # databases of older versions are read with the statements of their layout
+        session.layout = database_layout(session.db_connection)
+    except ValueError:
+        st.error("This file isn't an annotation database (or one this version can't read): please build it "
+                 "(again) with 'database/database.py' and upload the new file.")
+        close_temporary_db()
+        session.file_upload = None
+        return
+    session.queries = QueryRepository(session.db_connection, statements_for_layout(session.layout))
+    session.catalog = AnnotationCatalog.load(session.queries)
 
 
 def main():
@@ -600,9 +570,12 @@ def main():
                                                           "Upload project folder"))
         continue_btn.button("Continue")
         if session.file_upload:
-            session.db_connection = create_temporary_db(session.file_upload, session.upload_type == "db file")
+            open_temporary_db()
 
     elif session.file_upload and session.db_connection:
+        if session.db_file and temp_db_manager().touch(session.session_id) is None:
+            # the database was evicted after the session had been inactive for too long: store it again
+            open_temporary_db()
         choice_desc.empty()
         upload_opt.empty()
         file_up.empty()
@@ -623,10 +596,7 @@ def main():
         _ = token_agreement_obj_for_document(doc_id)
 
         # --> Set of annotation categories
-        annotation_types = set(functools.reduce(
-            lambda x, y: x + y, [_id_type.get("types")
-                                 for _id_type in all_annotations_for_document(doc_id).values()], []
-        ))
+        annotation_types = annotation_types_for_document(doc_id)
         focus_entity = \
             st.sidebar.selectbox("Select focus entity", options=entity_names_in_document(annotation_types))
         fc_sentence_with_ents_only = st.sidebar.checkbox("Show only sentences with focus entity", False)
@@ -668,13 +638,16 @@ def main():
                                           focus_entity,
                                           focus_attribute)
         with st.beta_expander("Agreement for the whole corpus and all annotators"):
-            for _k, _v in all_agreements.items():
-                _k
-                _final = [0, 0, 0, 0]
-                for _l in _v.values():
-                    _final = np.add(_final, _l)
-                st.write(np.divide(_final, len(_v)))
-                _final = [0, 0, 0, 0]
+            st.table(pd.DataFrame(
+                [[_score[_i] for _score in _v for _i in (0, 1)] for _v in all_agreements.values()],
+                index=[" - ".join(_k) for _k in all_agreements.keys()],
+                columns=pd.MultiIndex.from_product(
+                    [["instance (Entities)", "token (Entities)", "instance (Events)", "token (Events)"],
+                     ["micro", "macro"]])))
+            st.table(pd.DataFrame(
+                corpus_chance_agreement(annotator_names(), [id_for_document(doc) for doc in document_titles()],
+                                        focus_entity, focus_attribute),
+                index=["(Entities)", "(Events)"], columns=["Fleiss' kappa", "Krippendorff's alpha"]))
         with st.beta_expander("Show Agreement", expanded=True):
             agreement_annotators = sel_annotators if use_only_selected_annotators else annotator_names()
             if len(agreement_annotators) <= 1:
@@ -745,9 +718,15 @@ def main():
                 a_focus = focus_attribute
             display_sentence_comparison(sel_annotators, sent_id, doc_id, e_focus, a_focus, disp_sent, ann_cols)
 
+        with st.beta_expander("Query timings"):
+            st.dataframe(pd.DataFrame.from_dict(session.queries.timings(), orient="index"))
+
 
-temp_db_file = pathlib.Path("./data_base_tmp/tmp.db")
-session = SessionState.get(db_connection='', file_upload='', upload_type='')
+temp_db_dir = pathlib.Path("./data_base_tmp")
+session = SessionState.get(db_connection='', file_upload='', upload_type='', queries=None, catalog=None, layout=None,
+                           session_id='', db_file='')
+if not session.session_id:
+    session.session_id = uuid.uuid4().hex
 st.set_page_config(layout="wide", page_icon="🧰", page_title="Annotation Visualizer")
 main()
 
@@ -0,0 +1,273 @@
+import os
+import sqlite3
+import unittest
+from itertools import combinations
+
+import numpy as np
+
+from agreement import InstanceAgreement, TokenAgreement, CorpusAgreement, LabelMatrices, fleiss_kappa, \
+    krippendorff_alpha
+from agreement.corpus import micro_fscore, macro_fscore
+from agreement.engine import InstanceAgreementEngine
+from agreement.instance_token import MATCHED_IDS_TABLE
+from agreement.metrics import label_statistics, combine_statistics
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DATABASES = [os.path.join(TEST_DIR, "brat-test-resources", "test_project.db"),
+                    os.path.join(TEST_DIR, "brat-test-resources", "test_deid.db"),
+                    os.path.join(TEST_DIR, "brat-test-resources", "backup_deid.db"),
+                    os.path.join(TEST_DIR, "uima-test-resources", "test_project.db")]
+ENTITY_COLUMNS = {"id", "annotator", "document", "sentence", "type", "begin", "end"}
+
+
+def _sample_connection(db_file: str) -> sqlite3.Connection:
+    return sqlite3.connect("file:{0}?mode=ro".format(db_file), uri=True)
+
+
+def _entity_tables(connection: sqlite3.Connection) -> list:
+    # the sample databases are built with different configurations: their entity tables are found by their columns
+    tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    return [table for table in tables
+            if ENTITY_COLUMNS.issubset(row[1] for row in connection.execute("PRAGMA table_info({0})".format(table)))]
+
+
+def _type_groups(connection: sqlite3.Connection, table: str) -> list:
+    # every single type and all types of the table as one group
+    types = sorted({str(row[0]) for row in connection.execute("SELECT type FROM {0}".format(table))})
+    return [[t] for t in types] + ([types] if len(types) > 1 else [])
+
+
+def _old_instance_counts(connection: sqlite3.Connection, doc_id: str, annotator_a: str, annotator_b: str,
+                         types: list, table: str) -> tuple:
+    # `(tp, fp, fn)` of one pair with the per-pair `GROUP BY` query of earlier versions of `InstanceAgreement`
+    rows = connection.execute("""
+        SELECT group_concat(annotator, "?"), count(annotator)
+        FROM {0}
+        WHERE type in ({1})
+         AND (annotator = ? OR annotator = ?)
+         AND document = ?
+        GROUP BY begin, end, sentence
+        """.format(table, ",".join(["?"] * len(types))), tuple(types) + (annotator_a, annotator_b, doc_id)).fetchall()
+    return (sum(1 for _, count in rows if count == 2),
+            sum(1 for annotators, count in rows if count == 1 and annotators == annotator_b),
+            sum(1 for annotators, count in rows if count == 1 and annotators == annotator_a))
+
+
+class InstanceAgreementTest(unittest.TestCase):
+    def test_pairs_equal_old_queries(self):
+        cases = 0
+        for db_file in SAMPLE_DATABASES:
+            connection = _sample_connection(db_file)
+            annotators = sorted(str(row[0]) for row in connection.execute("SELECT id FROM annotators"))
+            for doc_id in [str(row[0]) for row in connection.execute("SELECT id FROM documents")]:
+                engine = InstanceAgreementEngine(doc_id, connection)
+                agreement = InstanceAgreement(annotators, doc_id, connection)
+                for table in _entity_tables(connection):
+                    for types in _type_groups(connection, table):
+                        expected = [_old_instance_counts(connection, doc_id, a, b, types, table)
+                                    for a, b in combinations(annotators, 2)]
+                        self.assertEqual([engine.pair(a, b, types, table) for a, b in combinations(annotators, 2)],
+                                         expected, "{0}: {1} {2} {3}".format(db_file, doc_id, table, types))
+                        self.assertEqual((agreement.true_positives(types, annotators, table),
+                                          agreement.false_positives(types, annotators, table),
+                                          agreement.false_negatives(types, annotators, table)),
+                                         tuple(sum(c[i] for c in expected) for i in range(3)))
+                        cases += len(expected)
+            connection.close()
+        self.assertGreater(cases, 0)
+
+    def test_double_annotation_counts_as_match(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE entities (id text PRIMARY KEY, document text, annotator text, type text, "
+                           "sentence text, begin integer, end integer)")
+        connection.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            ("1", "d", "0", "x", "s", 0, 4), ("2", "d", "0", "x", "s", 0, 4), ("3", "d", "1", "x", "s", 6, 8),
+            ("4", "d", "0", "x", "s", 6, 8), ("5", "d", "1", "x", "s", 10, 12), ("6", "d", "2", "x", "s", 0, 4)])
+        engine = InstanceAgreementEngine("d", connection)
+        for a, b in combinations(["0", "1", "2", "3"], 2):
+            self.assertEqual(engine.pair(a, b, "x", "entities"),
+                             _old_instance_counts(connection, "d", a, b, ["x"], "entities"), (a, b))
+
+
+def _fscore(tp: int, errors: int) -> float:
+    return 2 * tp / (2 * tp + errors) if 2 * tp + errors > 0 else 0.0
+
+
+class CorpusAgreementTest(unittest.TestCase):
+    def test_counts_equal_document_counts(self):
+        cases = 0
+        for db_file in SAMPLE_DATABASES:
+            connection = _sample_connection(db_file)
+            annotators = sorted(str(row[0]) for row in connection.execute("SELECT id FROM annotators"))
+            documents = [str(row[0]) for row in connection.execute("SELECT id FROM documents")]
+            corpus = CorpusAgreement(documents, connection)
+            engines = {d: InstanceAgreementEngine(d, connection) for d in documents}
+            for table in _entity_tables(connection):
+                for types in _type_groups(connection, table):
+                    scores = {True: corpus.fscores(annotators, types, table, token=True),
+                              False: corpus.fscores(annotators, types, table)}
+                    for a, b in combinations(annotators, 2):
+                        instance = [engines[d].pair(a, b, types, table) for d in documents]
+                        token = []
+                        for d in documents:
+                            # a new `TokenAgreement` for every pair: `false_others` depends on the pairs counted before
+                            agreement = TokenAgreement([a, b], d, connection)
+                            token.append((agreement.true_positives(types, [a, b], table),
+                                          agreement.false_same_sentence(types, [a, b], table) +
+                                          agreement.false_others(types, [a, b], table)))
+                        for token_counts, expected in [(False, [(tp, fp + fn) for tp, fp, fn in instance]),
+                                                       (True, token)]:
+                            counts = corpus.token_counts(a, b, types, table) if token_counts \
+                                else corpus.instance_counts(a, b, types, table)
+                            message = "{0}: {1} {2} {3}-{4} token={5}".format(db_file, table, types, a, b,
+                                                                               token_counts)
+                            self.assertEqual(list(zip(counts.tp.tolist(), counts.errors.tolist())), expected,
+                                             message)
+                            micro = _fscore(sum(tp for tp, _ in expected), sum(e for _, e in expected))
+                            macro = sum(_fscore(tp, e) for tp, e in expected) / len(documents)
+                            self.assertAlmostEqual(micro_fscore(counts), micro, msg=message)
+                            self.assertAlmostEqual(macro_fscore(counts), macro, msg=message)
+                            self.assertEqual(scores[token_counts][(a, b)], (micro_fscore(counts), macro_fscore(counts)))
+                        cases += 1
+            connection.close()
+        self.assertGreater(cases, 0)
+
+    def test_unknown_documents_and_annotators(self):
+        connection = _sample_connection(SAMPLE_DATABASES[0])
+        table = _entity_tables(connection)[0]
+        types = _type_groups(connection, table)[0]
+        corpus = CorpusAgreement(["no document"], connection)
+        counts = corpus.instance_counts("no annotator", "neither", types, table)
+        self.assertEqual((counts.tp.tolist(), counts.errors.tolist()), ([0], [0]))
+        self.assertEqual((micro_fscore(counts), macro_fscore(counts)), (0.0, 0.0))
+        connection.close()
+
+
+def _old_false_others(connection: sqlite3.Connection, doc_id: str, annotator_a: str, annotator_b: str, types: list,
+                      table: str, same_sentence_ids: set) -> int:
+    # `false_others` of one pair with the literal id list of earlier versions of `TokenAgreement`
+    return len(connection.execute("""
+        SELECT id
+        FROM {0}
+        WHERE id not in ({1})
+        AND document = ?
+        AND (annotator = ? OR annotator = ?)
+        AND type in ({2})
+        """.format(table, ",".join("'{0}'".format(i) for i in same_sentence_ids), ",".join(["?"] * len(types))),
+        (doc_id, annotator_a, annotator_b) + tuple(types)).fetchall())
+
+
+class TokenAgreementTest(unittest.TestCase):
+    def test_false_others_equal_old_queries(self):
+        cases = 0
+        for db_file in SAMPLE_DATABASES:
+            connection = _sample_connection(db_file)
+            annotators = sorted(str(row[0]) for row in connection.execute("SELECT id FROM annotators"))
+            for doc_id in [str(row[0]) for row in connection.execute("SELECT id FROM documents")]:
+                for table in _entity_tables(connection):
+                    for types in _type_groups(connection, table):
+                        for use_matcher in (True, False):
+                            agreement = TokenAgreement(annotators, doc_id, connection, use_matcher=use_matcher)
+                            false_others = agreement.false_others(types, annotators, table)
+                            # the ids of all pairs of the same sentence are excluded for every pair
+                            self.assertEqual(false_others, sum(
+                                _old_false_others(connection, doc_id, a, b, types, table,
+                                                  agreement.same_sentence_token_ids)
+                                for a, b in combinations(annotators, 2)),
+                                "{0}: {1} {2} {3}".format(db_file, doc_id, table, types))
+                            cases += 1
+            connection.close()
+        self.assertGreater(cases, 0)
+
+    def test_matched_ids_on_read_only_connection(self):
+        connection = _sample_connection(SAMPLE_DATABASES[0])
+        connection.execute("PRAGMA query_only = ON")
+        agreement = TokenAgreement(["0", "1"], "0", connection, use_matcher=False)
+        agreement.same_sentence_token_ids = {"a", "b"}
+        agreement.store_matched_ids()
+        agreement.same_sentence_token_ids = {"c"}
+        agreement.store_matched_ids()
+        self.assertEqual(connection.execute("SELECT id FROM {0}".format(MATCHED_IDS_TABLE)).fetchall(), [("c",)])
+        # the connection stays read-only
+        self.assertEqual(connection.execute("PRAGMA query_only").fetchone()[0], 1)
+        with self.assertRaises(sqlite3.OperationalError):
+            connection.execute("CREATE TEMP TABLE t (id integer)")
+        connection.close()
+
+    def test_false_others_without_same_sentence_pairs(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE entities (id text PRIMARY KEY, document text, annotator text, type text, "
+                           "sentence text, begin integer, end integer)")
+        connection.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            ("1", "7", "0", "x", "s0", 0, 4), ("2", "7", "1", "x", "s1", 0, 4), ("3", "7", "1", "y", "s1", 0, 4)])
+        for use_matcher in (True, False):
+            agreement = TokenAgreement(["0", "1"], "7", connection, use_matcher=use_matcher)
+            self.assertEqual(agreement.false_others(["x"], ["0", "1"], "entities"), 2)
+            self.assertEqual(agreement.same_sentence_token_ids, set())
+
+
+# Fleiss (1971) as reproduced on Wikipedia ("Fleiss' kappa", worked example): 14 raters assign 10 subjects to 5
+# categories, the rows are the number of raters per category; kappa = 0.210
+FLEISS_EXAMPLE = [[0, 0, 0, 0, 14], [0, 2, 6, 4, 2], [0, 0, 3, 5, 6], [0, 3, 9, 2, 0], [2, 2, 8, 1, 1],
+                  [7, 7, 0, 0, 0], [3, 2, 6, 3, 0], [2, 5, 3, 2, 2], [6, 5, 2, 1, 0], [0, 2, 2, 3, 7]]
+# Krippendorff (2004), Content Analysis, binary data of two observers and ten units: alpha = 0.095 (and Scott's pi,
+# which Fleiss' kappa is for two raters, 0.048)
+KRIPPENDORFF_EXAMPLE = [[0, 1, 0, 0, 0, 0, 0, 0, 1, 0], [1, 1, 1, 0, 0, 1, 0, 0, 0, 0]]
+
+
+class MetricsTest(unittest.TestCase):
+    def test_fleiss_example(self):
+        # one row per rater: the labels of every subject in the numbers of the table
+        labels = np.array([[c for c, n in enumerate(row) for _ in range(n)] for row in FLEISS_EXAMPLE]).T
+        self.assertAlmostEqual(fleiss_kappa(label_statistics(labels, 5)), 0.210, places=3)
+
+    def test_krippendorff_example(self):
+        statistics = label_statistics(np.array(KRIPPENDORFF_EXAMPLE), 2)
+        self.assertAlmostEqual(krippendorff_alpha(statistics), 1 - 19 * 4 / (14 * 6))
+        self.assertAlmostEqual(krippendorff_alpha(statistics), 0.095, places=3)
+        self.assertAlmostEqual(fleiss_kappa(statistics), 0.048, places=3)
+
+    def test_perfect_and_undefined_agreement(self):
+        self.assertAlmostEqual(krippendorff_alpha(label_statistics(np.array([[0, 1, 2], [0, 1, 2]]), 3)), 1.0)
+        self.assertAlmostEqual(fleiss_kappa(label_statistics(np.array([[0, 1, 2], [0, 1, 2]]), 3)), 1.0)
+        for labels in [np.array([[1, 1, 1], [1, 1, 1]]), np.array([[0, 1, 2]]), np.zeros((2, 0), dtype=int)]:
+            statistics = label_statistics(labels, 3)
+            self.assertEqual((fleiss_kappa(statistics), krippendorff_alpha(statistics)), (0.0, 0.0))
+
+    def test_statistics_add_up(self):
+        labels = np.array(KRIPPENDORFF_EXAMPLE)
+        combined = combine_statistics([label_statistics(labels[:, :4], 2), label_statistics(labels[:, 4:], 2)])
+        whole = label_statistics(labels, 2)
+        self.assertEqual((combined.units, combined.raters, combined.squares, combined.totals.tolist()),
+                         (whole.units, whole.raters, whole.squares, whole.totals.tolist()))
+
+    def test_label_matrices_of_annotations(self):
+        # the Krippendorff example as annotations of type "x" on the characters of two documents
+        connection = sqlite3.connect(":memory:")
+        connection.executescript("""
+            CREATE TABLE sentences (id text PRIMARY KEY, document text, begin integer, end integer);
+            CREATE TABLE entities (id text PRIMARY KEY, document text, annotator text, type text, sentence text,
+                                   begin integer, end integer);
+            INSERT INTO sentences VALUES ('a-0', 'a', 0, 3), ('a-1', 'a', 4, 6), ('b-0', 'b', 0, 4);
+            """)
+        documents = {"a": range(0, 6), "b": range(6, 10)}
+        rows = []
+        for annotator, labels in enumerate(KRIPPENDORFF_EXAMPLE):
+            for document, units in documents.items():
+                for character, unit in enumerate(units):
+                    if labels[unit] == 1:
+                        sentence, begin = ("a-1", 4) if document == "a" and character >= 4 else (document + "-0", 0)
+                        rows.append(("{0}-{1}-{2}".format(document, annotator, character), document, str(annotator),
+                                     "x", sentence, character - begin, character - begin + 1))
+        connection.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        matrices = LabelMatrices(["a", "b"], ["0", "1"], connection)
+        self.assertEqual(np.concatenate([matrices.matrices("x", "entities")[d] for d in documents], axis=1).tolist(),
+                         KRIPPENDORFF_EXAMPLE)
+        kappa, alpha, per_document = matrices.scores("x", "entities")
+        self.assertAlmostEqual(alpha, 0.095, places=3)
+        self.assertAlmostEqual(kappa, 0.048, places=3)
+        self.assertEqual(sorted(per_document), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app_constants import db_construction, DefaultTableNames
+from database.database import DBUtils, DataSaver, DOCUMENT_TEXT_COLUMNS, SENTENCE_COLUMNS, XMI_ENTITY_COLUMNS, \
+    delete_pair_rows, document_text_row, ingest_brat, store_annotation_summary, store_xmi_rows
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+TEXT = "first one\nsecond one\nthird one\nfourth one"
+SENTENCES = [(0, 9), (10, 20), (21, 30), (31, 41)]
+
+
+def _pair_rows(annotator_id: str, annotated: list) -> list:
+    # the rows `xmi_rows_for_annotator` flattens the CAS of the pair ("0", annotator_id) into; one annotation of
+    # type "drug" in every sentence of `annotated`
+    text_row = document_text_row(TEXT)
+    return [("medication_entities", XMI_ENTITY_COLUMNS,
+             [("0-{0}-{1}".format(annotator_id, s), annotator_id, "0", "5", "0-{0}".format(s), "0", "drug")
+              for s in annotated]),
+            (str(DefaultTableNames.sentences), SENTENCE_COLUMNS,
+             [("0-{0}".format(s), str(b), str(e), "0", text_row[0], "0") for s, (b, e) in enumerate(SENTENCES)]),
+            (str(DefaultTableNames.document_texts), DOCUMENT_TEXT_COLUMNS, [text_row])]
+
+
+class SummaryTriggerTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DBUtils(in_memory=True)
+        self.db.create_connection()
+        self.ds = DataSaver(self.db, db_construction, reset_db=True, buffer_size=100)
+        self.types, self.layers, self.sentences = [], [], set()
+
+    def tearDown(self):
+        self.db.close_connection()
+
+    def store_pair(self, annotator_id: str, annotated: list):
+        with self.ds.unit(annotator_id):
+            store_xmi_rows(_pair_rows(annotator_id, annotated), "anno" + annotator_id, annotator_id, "doc", "0",
+                           self.types, self.layers, self.sentences, self.ds)
+
+    def flags(self) -> list:
+        self.ds.flush()
+        return [row[0] for row in self.ds.db_cursor.execute("SELECT has_annotation FROM sentences ORDER BY begin")]
+
+    def summary(self) -> list:
+        return sorted(self.ds.db_cursor.execute(
+            "SELECT sentence, annotator, type, count FROM sentence_annotation_summary"))
+
+    def test_insert_flags_annotated_sentences(self):
+        self.store_pair("0", [0, 1])
+        self.assertEqual(self.flags(), [1, 1, 0, 0])
+        self.store_pair("1", [1, 2])
+        self.assertEqual(self.flags(), [1, 1, 1, 0])
+        self.assertEqual(self.summary(), [("0-0", "0", "0", 1), ("0-1", "0", "0", 1), ("0-1", "1", "0", 1),
+                                          ("0-2", "1", "0", 1)])
+
+    def test_delete_pair_rows_recomputes_flags(self):
+        self.store_pair("0", [0, 1])
+        self.store_pair("1", [1, 2])
+        delete_pair_rows(self.ds, "0", "0", None)
+        # sentence "0-1", which annotator "1" annotated as well, keeps its flag
+        self.assertEqual(self.flags(), [0, 1, 1, 0])
+        self.assertEqual(self.summary(), [("0-1", "1", "0", 1), ("0-2", "1", "0", 1)])
+
+    def test_incremental_rerun_equals_full_ingestion(self):
+        self.store_pair("0", [0, 1])
+        self.store_pair("1", [1, 2])
+        # what an incremental ingestion does with a changed pair: delete its rows and store them anew
+        delete_pair_rows(self.ds, "0", "0", None)
+        self.store_pair("0", [3])
+        self.assertEqual(self.flags(), [0, 1, 1, 1])
+        incremental = self.summary()
+        self.tearDown()
+        self.setUp()
+        self.store_pair("0", [3])
+        self.store_pair("1", [1, 2])
+        self.assertEqual(self.flags(), [0, 1, 1, 1])
+        self.assertEqual(self.summary(), incremental)
+        # rebuilding the summary as a whole resets the flags to the same
+        store_annotation_summary(self.ds)
+        self.assertEqual(self.flags(), [0, 1, 1, 1])
+        self.assertEqual(self.summary(), incremental)
+
+
+class BratFlagTest(unittest.TestCase):
+    def test_brat_database_has_no_triggers(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_file = os.path.join(folder, "test_project.db")
+            # a database with the triggers (e.g. of an earlier ingestion) loses them
+            db = DBUtils(in_memory=False, db_file=db_file)
+            db.create_connection()
+            DataSaver(db, db_construction, reset_db=True)
+            db.close_connection()
+            ingest_brat(os.path.join(RESOURCES, "deid-test"), db_file, incremental=True)
+            connection = sqlite3.connect(db_file)
+            try:
+                self.assertEqual(connection.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+                                 .fetchall(), [])
+                # a shared sentence is flagged by the annotator it is taken from only
+                self.assertGreater(connection.execute(
+                    "SELECT COUNT(*) FROM sentences WHERE has_annotation = 0 AND id IN "
+                    "(SELECT sentence FROM sentence_annotation_summary)").fetchone()[0], 0)
+            finally:
+                connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
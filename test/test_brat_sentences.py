@@ -0,0 +1,162 @@
+import os
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+
+from app_constants import compact_schema, database_info
+from app_constants.base_config import DatabaseCategories
+from bratsubset.annotation import Annotations, TextBoundAnnotation
+from bratsubset.projectconfig import ProjectConfiguration
+from database.database import _assign_textbounds_to_sentences, _get_sentences, decode_document_text, ingest_brat
+
+RESOURCES = pathlib.Path(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+
+
+def _naive_assignment(sentences: list, textbounds: list) -> tuple:
+    # the per-sentence loop of earlier versions: a textbound is stored with the first sentence it overlaps with (the
+    # rows of later sentences were dropped as duplicates of its id), but every sentence it overlaps is flagged
+    assigned, has_annotation, seen = [], [], set()
+    for sentence in sentences:
+        assigned.append([])
+        has_annotation.append(False)
+        for t in textbounds:
+            if t.get_start() > sentence.end or t.get_end() < sentence.begin:
+                continue
+            has_annotation[-1] = True
+            if t.id not in seen:
+                seen.add(t.id)
+                assigned[-1].append(t)
+    return assigned, has_annotation
+
+
+def _project_documents(project: pathlib.Path):
+    # `(annotator folders, document name)` of every document of a brat project
+    annotators = sorted(p for p in project.iterdir() if p.is_dir())
+    for document in sorted(p.stem for p in annotators[0].glob("*.txt")):
+        yield [a for a in annotators if pathlib.Path(a, document + ".ann").exists()], document
+
+
+def _baseline_rows(project: pathlib.Path, annotators: dict, documents: dict, allow_disp_sent: bool) -> tuple:
+    # the sentence and entity rows the per-sentence loop of earlier versions of `store_brat_in_db` stored for the
+    # given annotator and document ids: `dict(id: row)` each, the first row stored with an id wins
+    config = ProjectConfiguration(str(project))
+    type_ids, type_id = {}, 0
+    for types in [config.get_entity_types(), config.get_event_types()]:
+        for _type in types:
+            type_ids[_type.lower()] = str(type_id)
+            type_id += 1
+    sentence_rows, entity_rows = {}, {}
+    for doc_id, doc_name in documents.items():
+        txt = [(a_id, pathlib.Path(project, annotator, doc_name + ".txt").read_text(encoding='utf-8'))
+               for a_id, annotator in annotators.items()]
+        ann_objects = {a_id: Annotations(pathlib.Path(project, annotator, doc_name).as_posix(), True)
+                       for a_id, annotator in annotators.items()}
+        sentences = None
+        for t_aid, _txt in txt:
+            if allow_disp_sent or sentences is None:
+                sentences = list(_get_sentences(txt=_txt))
+            for sentence in sentences:
+                sentence_id = "{0}-{1}{2}".format(doc_id, sentence.id, "-" + t_aid if allow_disp_sent else "")
+                has_annotations = False
+                for t in ann_objects[t_aid].get_textbounds():
+                    begin, end = t.get_start(), t.get_end()
+                    if begin > sentence.end or end < sentence.begin:
+                        continue
+                    has_annotations = True
+                    entity_rows.setdefault("{0}-{1}-{2}".format(doc_id, t_aid, t.id), (
+                        t_aid, str(begin - sentence.begin), str(end - sentence.begin), doc_id, sentence_id,
+                        type_ids[t.type.lower()]))
+                sentence_rows.setdefault(sentence_id, (str(sentence.begin), str(sentence.end), doc_id,
+                                                       _txt[sentence.begin:sentence.end],
+                                                       "1" if has_annotations else "0"))
+    return sentence_rows, entity_rows
+
+
+def _ingested_rows(connection: sqlite3.Connection) -> tuple:
+    # the sentence and entity rows of an ingested database in the layout of `_baseline_rows`
+    sentence_rows = {}
+    texts = {}
+    for row in connection.execute("SELECT s.id, s.begin, s.end, s.document, s.has_annotation, t.id, t.text, "
+                                  "t.compressed FROM sentences s JOIN document_texts t ON t.id = s.document_text"):
+        if row[5] not in texts:
+            texts[row[5]] = decode_document_text(row[6], row[7])
+        sentence_rows[row[0]] = (str(row[1]), str(row[2]), str(row[3]), texts[row[5]][int(row[1]):int(row[2])],
+                                 str(row[4]))
+    entity_rows = {}
+    for entity_table in database_info.get(DatabaseCategories.entities, {}).keys():
+        for row in connection.execute("SELECT id, annotator, begin, end, document, sentence, type FROM {0}".format(
+                entity_table.lower())):
+            entity_rows[row[0]] = tuple(str(v) for v in row[1:])
+    return sentence_rows, entity_rows
+
+
+class AssignTextboundsTest(unittest.TestCase):
+    def assert_projects(self, projects: list, disparate: bool):
+        pairs = 0
+        for project in projects:
+            for annotators, document in _project_documents(RESOURCES / project):
+                for annotator in annotators:
+                    # without disparate sentences every annotator's textbounds go into the first annotator's sentences
+                    txt_annotator = annotator if disparate else annotators[0]
+                    txt = pathlib.Path(txt_annotator, document + ".txt").read_text(encoding='utf-8')
+                    sentences = list(_get_sentences(txt=txt))
+                    textbounds = list(Annotations(pathlib.Path(annotator, document).as_posix(), True).get_textbounds())
+                    expected, expected_flags = _naive_assignment(sentences, textbounds)
+                    assigned, flags = _assign_textbounds_to_sentences(sentences, textbounds)
+                    self.assertEqual([[t.id for t in ts] for ts in assigned], [[t.id for t in ts] for ts in expected],
+                                     "{0}/{1}".format(annotator, document))
+                    self.assertEqual(flags, expected_flags, "{0}/{1}".format(annotator, document))
+                    pairs += 1
+        self.assertGreater(pairs, 0)
+
+    def test_shared_sentences(self):
+        self.assert_projects(["test-resources", "deid-test", "backup-test"], disparate=False)
+
+    def test_disparate_sentences(self):
+        self.assert_projects(["deid-test"], disparate=True)
+
+    def test_textbound_across_sentences(self):
+        # "first one" 0-9, "second one" 10-20, "third" 22-27
+        sentences = list(_get_sentences(txt="first one\nsecond one\n\nthird"))
+        textbounds = [TextBoundAnnotation([(5, 13)], "T1", "x", ""), TextBoundAnnotation([(9, 10)], "T2", "x", ""),
+                      TextBoundAnnotation([(21, 21)], "T3", "x", ""), TextBoundAnnotation([(0, 2)], "T4", "x", ""),
+                      TextBoundAnnotation([(30, 31)], "T5", "x", "")]
+        assigned, flags = _assign_textbounds_to_sentences(sentences, textbounds)
+        self.assertEqual([[t.id for t in ts] for ts in assigned], [["T1", "T2", "T4"], [], []])
+        self.assertEqual(flags, [True, True, False])
+        self.assertEqual((assigned, flags), _naive_assignment(sentences, textbounds))
+
+
+@unittest.skipIf(compact_schema, "the baseline rows have the composite text ids")
+class BaselineIngestionTest(unittest.TestCase):
+    def assert_project(self, project: str, allow_disp_sent: bool = False):
+        with tempfile.TemporaryDirectory() as folder:
+            db_file = os.path.join(folder, "test.db")
+            ingest_brat(RESOURCES / project, db_file, allow_disp_sent=allow_disp_sent)
+            connection = sqlite3.connect(db_file)
+            try:
+                annotators = {str(_id): name for _id, name in connection.execute(
+                    "SELECT id, annotator FROM annotators ORDER BY CAST(id AS INTEGER)")}
+                documents = {str(_id): name for _id, name in connection.execute(
+                    "SELECT id, document FROM documents ORDER BY CAST(id AS INTEGER)")}
+                sentence_rows, entity_rows = _ingested_rows(connection)
+            finally:
+                connection.close()
+        expected_sentences, expected_entities = _baseline_rows(RESOURCES / project, annotators, documents,
+                                                               allow_disp_sent)
+        self.assertGreater(len(expected_entities), 0)
+        self.assertEqual(sentence_rows, expected_sentences)
+        self.assertEqual(entity_rows, expected_entities)
+
+    def test_shared_sentences(self):
+        for project in ["test-resources", "deid-test", "backup-test"]:
+            with self.subTest(project=project):
+                self.assert_project(project)
+
+    def test_disparate_sentences(self):
+        self.assert_project("deid-test", allow_disp_sent=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
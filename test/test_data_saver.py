@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from database import database
+from database.database import DBUtils, DataSaver, ingest_brat
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+STRUCTURE = {
+    "documents": {"stm": "(id text PRIMARY KEY, document text NOT NULL);", "idx": ["document"]},
+    "entities": {"stm": "(id text PRIMARY KEY, document text NOT NULL, type text);", "idx": ["document", "type"]}
+}
+
+
+def _dump(connection: sqlite3.Connection) -> dict:
+    # the rows of every table in the order they were written
+    tables = [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return {table: connection.execute("SELECT * FROM {0} ORDER BY rowid".format(table)).fetchall()
+            for table in tables}
+
+
+def _indices(connection: sqlite3.Connection) -> list:
+    return sorted(row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%'"))
+
+
+class BufferedWritesTest(unittest.TestCase):
+    def write(self, buffer_size: int, bulk_load: bool) -> tuple:
+        # the same sequence of writes, deletes and a rolled back unit with the given buffering
+        db = DBUtils(in_memory=True)
+        db.create_connection()
+        ds = DataSaver(db, STRUCTURE, reset_db=True, buffer_size=buffer_size, bulk_load=bulk_load)
+        for doc_id in range(5):
+            with ds.unit(str(doc_id)):
+                ds.store_into_table("documents", id=doc_id, document="doc{0}".format(doc_id))
+                ds.store_into_table("entities", columns=("id", "document", "type"),
+                                    rows=[("{0}-{1}".format(doc_id, e), str(doc_id), "t{0}".format(e % 2))
+                                          for e in range(7)])
+                # duplicates are dropped
+                ds.store_into_table("entities", ignore_duplicates=True, id="{0}-0".format(doc_id),
+                                    document=str(doc_id), type="other")
+        with self.assertRaises(ValueError):
+            with ds.unit("broken"):
+                ds.store_into_table("documents", id=5, document="doc5")
+                raise ValueError("broken document")
+        ds.delete_from_table("entities", document="3")
+        ds.flush()
+        # the rows are visible before the load is finished
+        self.assertEqual(ds.db_cursor.execute("SELECT COUNT(*) FROM entities").fetchone()[0], 28)
+        ds.finish_bulk_insert()
+        ds.finish_bulk_load()
+        result = _dump(db.connection), _indices(db.connection)
+        db.close_connection()
+        return result
+
+    def test_buffered_writes_equal_unbuffered_writes(self):
+        unbuffered = self.write(buffer_size=0, bulk_load=False)
+        self.assertEqual(len(unbuffered[0]["documents"]), 5)
+        self.assertEqual(len(unbuffered[1]), 3)
+        for buffer_size in [1, 3, 100]:
+            with self.subTest(buffer_size=buffer_size):
+                self.assertEqual(self.write(buffer_size=buffer_size, bulk_load=True), unbuffered)
+
+    def test_buffered_ingestion_equals_unbuffered_ingestion(self):
+        with tempfile.TemporaryDirectory() as folder:
+            dumps = []
+            for buffer_size in [0, 3]:
+                db_file = os.path.join(folder, "{0}.db".format(buffer_size))
+                with mock.patch.object(database, "BULK_INSERT_BUFFER_SIZE", buffer_size):
+                    ingest_brat(os.path.join(RESOURCES, "test-resources"), db_file)
+                connection = sqlite3.connect(db_file)
+                try:
+                    dumps.append((_dump(connection), _indices(connection)))
+                finally:
+                    connection.close()
+        self.assertGreater(len(dumps[0][0]["sentences"]), 0)
+        self.assertEqual(dumps[0], dumps[1])
+
+
+class BulkLoadTest(unittest.TestCase):
+    def pragmas(self, db: DBUtils) -> tuple:
+        return db.connection.execute("PRAGMA journal_mode").fetchone()[0], \
+            db.connection.execute("PRAGMA synchronous").fetchone()[0]
+
+    def test_new_database_is_loaded_without_journal(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db = DBUtils(in_memory=False, db_file=os.path.join(folder, "test.db"))
+            db.create_connection()
+            ds = DataSaver(db, STRUCTURE, reset_db=True, bulk_load=True)
+            self.assertEqual(self.pragmas(db), ("memory", 0))  # <- synchronous OFF
+            self.assertEqual(_indices(db.connection), [])
+            ds.finish_bulk_load()
+            self.assertEqual(self.pragmas(db), ("delete", 2))  # <- synchronous FULL
+            self.assertEqual(len(_indices(db.connection)), 3)
+            db.close_connection()
+
+    def test_existing_database_is_written_with_write_ahead_log(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db = DBUtils(in_memory=False, db_file=os.path.join(folder, "test.db"))
+            db.create_connection()
+            DataSaver(db, STRUCTURE, reset_db=True)
+            ds = DataSaver(db, STRUCTURE, bulk_load=True)
+            self.assertEqual(self.pragmas(db), ("wal", 1))  # <- synchronous NORMAL
+            ds.store_into_table("documents", id=0, document="doc0")
+            ds.finish_bulk_load()
+            self.assertEqual(self.pragmas(db), ("delete", 2))
+            self.assertEqual(len(_indices(db.connection)), 3)
+            db.close_connection()
+            self.assertFalse(os.path.exists(os.path.join(folder, "test.db-wal")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from app_constants import db_construction
+from database.database import DBUtils, DataSaver, check_text_layout, decode_document_text, document_text_row, \
+    ingest_brat, prune_document_texts
+from database.queries import QueryRepository, database_layout, statements_for_layout
+
+RESOURCES = pathlib.Path(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+# the WebAnno sample is a database of the layout before `document_texts`
+LEGACY_DATABASE = RESOURCES.parent / "uima-test-resources" / "test_project.db"
+
+
+def _texts(db_file: str) -> list:
+    # `(hash, text)` of every stored document text
+    connection = sqlite3.connect(db_file)
+    try:
+        return sorted((text_hash, decode_document_text(text, compressed)) for text_hash, text, compressed in
+                      connection.execute("SELECT hash, text, compressed FROM document_texts"))
+    finally:
+        connection.close()
+
+
+def _unreferenced_texts(db_file: str) -> int:
+    connection = sqlite3.connect(db_file)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM document_texts WHERE id NOT IN "
+                                  "(SELECT document_text FROM sentences)").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class DocumentTextRowTest(unittest.TestCase):
+    def test_compressed_round_trip(self):
+        text = "Patient erhält 5 mg Ramipril täglich.\nKeine Änderung.\n" * 50
+        text_hash, compressed_text, compressed = document_text_row(text, compress=True)
+        self.assertEqual(compressed, "1")
+        self.assertIsInstance(compressed_text, bytes)
+        self.assertLess(len(compressed_text), len(text.encode('utf-8')))
+        self.assertEqual(decode_document_text(compressed_text, compressed), text)
+        # the hash is the one of the text, however it is stored
+        self.assertEqual(document_text_row(text, compress=False), (text_hash, text, "0"))
+        self.assertEqual(decode_document_text(text, "0"), text)
+
+    def test_compressed_round_trip_through_database(self):
+        text = "first one\nsecond one\n"
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE document_texts (hash text, text blob, compressed integer)")
+        connection.executemany("INSERT INTO document_texts VALUES (?, ?, ?)",
+                               [document_text_row(text, compress=True), document_text_row(text, compress=False)])
+        self.assertEqual([decode_document_text(t, c) for t, c in connection.execute(
+            "SELECT text, compressed FROM document_texts")], [text, text])
+        connection.close()
+
+
+class DocumentTextsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.project = pathlib.Path(self.folder.name, "project")
+        shutil.copytree(RESOURCES / "test-resources", self.project)
+        self.db_file = os.path.join(self.folder.name, "test.db")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def disk_texts(self) -> set:
+        return {path.read_text(encoding='utf-8') for path in self.project.glob("*/*.txt")}
+
+    def test_identical_texts_are_stored_once(self):
+        # with disparate sentences every annotator's text is stored; the annotators share most of them
+        ingest_brat(self.project, self.db_file, allow_disp_sent=True)
+        texts = _texts(self.db_file)
+        self.assertEqual(len(texts), len({text_hash for text_hash, _ in texts}))
+        self.assertEqual({text for _, text in texts}, self.disk_texts())
+        self.assertLess(len(texts), len(list(self.project.glob("*/*.txt"))))
+
+    def test_replaced_texts_are_pruned(self):
+        for allow_disp_sent in [False, True]:
+            with self.subTest(allow_disp_sent=allow_disp_sent):
+                self.tearDown()
+                self.setUp()
+                ingest_brat(self.project, self.db_file, allow_disp_sent=allow_disp_sent)
+                # the old text of the document is referenced by no annotator afterwards
+                for txt_file in self.project.glob("*/01.txt"):
+                    txt_file.write_text(txt_file.read_text(encoding='utf-8').replace("\n", "\n\n", 1),
+                                        encoding='utf-8')
+                ingest_brat(self.project, self.db_file, allow_disp_sent=allow_disp_sent, incremental=True)
+                self.assertEqual(_unreferenced_texts(self.db_file), 0)
+                texts = {text for _, text in _texts(self.db_file)}
+                self.assertTrue(texts.issubset(self.disk_texts()))
+                self.assertIn((self.project / "anno01" / "01.txt").read_text(encoding='utf-8'), texts)
+
+    def test_prune_document_texts(self):
+        ingest_brat(self.project, self.db_file)
+        db = DBUtils(in_memory=False, db_file=self.db_file)
+        db.create_connection()
+        ds = DataSaver(db, db_construction)
+        ds.store_into_table("document_texts", id="99", hash="unused", text="unused", compressed="0")
+        ds.commit()
+        self.assertEqual(_unreferenced_texts(self.db_file), 1)
+        prune_document_texts(ds)
+        ds.commit()
+        db.close_connection()
+        self.assertEqual(_unreferenced_texts(self.db_file), 0)
+        self.assertEqual(len(_texts(self.db_file)), 2)
+
+
+class LegacyLayoutTest(unittest.TestCase):
+    def test_legacy_sample_is_read(self):
+        connection = sqlite3.connect("file:{0}?mode=ro".format(LEGACY_DATABASE), uri=True)
+        try:
+            layout = database_layout(connection)
+            self.assertFalse(layout.document_texts)
+            queries = QueryRepository(connection, statements_for_layout(layout))
+            doc_id = queries.column("document_rows")[0]
+            sentences = queries.execute("sentences_for_document", (doc_id,), sentence_key="id")
+            self.assertGreater(len(sentences), 0)
+            # the legacy rows hold the text of the sentence itself
+            self.assertTrue(all(len(text) == int(end) - int(begin) for _, begin, end, text in sentences))
+        finally:
+            connection.close()
+
+    def test_legacy_database_is_not_updated_incrementally(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_file = os.path.join(folder, "legacy.db")
+            shutil.copy(LEGACY_DATABASE, db_file)
+            db = DBUtils(in_memory=False, db_file=db_file)
+            db.create_connection()
+            try:
+                with self.assertRaises(ValueError):
+                    check_text_layout(DataSaver(db, db_construction))
+            finally:
+                db.close_connection()
+            with self.assertRaises(ValueError):
+                ingest_brat(RESOURCES / "test-resources", db_file, incremental=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import pathlib
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from app_constants import compact_schema, database_info
+from app_constants.base_config import DatabaseCategories
+from database.database import decode_document_text, ingest_brat
+
+RESOURCES = pathlib.Path(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# an incremental ingestion (committing every pair) whose process is killed once it stored `kill_after` pairs
+KILLED_INGESTION = """
+import os, signal, sys
+from database import database
+
+project, db_file, kill_after = sys.argv[1], sys.argv[2], int(sys.argv[3])
+store_annotation_summary, stored = database.store_annotation_summary, []
+
+def store_and_kill(ds, marks=None):
+    store_annotation_summary(ds, marks)
+    stored.append(marks)
+    if len(stored) == kill_after:
+        os.kill(os.getpid(), signal.SIGKILL)
+
+database.store_annotation_summary = store_and_kill
+database.ingest_brat(project, db_file, incremental=True, commit_every=1)
+"""
+
+
+def _table_contents(db_file: str) -> dict:
+    # the rows of the tables an ingestion writes, with names in place of the ids it assigned (a full and an
+    # incremental ingestion number the annotators, documents and sentences differently)
+    connection = sqlite3.connect(db_file)
+    try:
+        annotators = {str(_id): name for _id, name in connection.execute("SELECT id, annotator FROM annotators")}
+        documents = {str(_id): name for _id, name in connection.execute("SELECT id, document FROM documents")}
+        types = {str(_id): name for _id, name in connection.execute("SELECT id, type FROM annotation_types")}
+        texts = {str(_id): decode_document_text(text, compressed) for _id, text, compressed in connection.execute(
+            "SELECT id, text, compressed FROM document_texts")}
+
+        def sentence(sentence_id: str) -> tuple:
+            # "doc-sentence" or "doc-sentence-annotator"
+            parts = sentence_id.split("-")
+            return (documents[parts[0]], parts[1]) + tuple(annotators[a] for a in parts[2:])
+
+        contents = {
+            "annotators": sorted(annotators.values()),
+            "documents": sorted(documents.values()),
+            "types": sorted(types.values()),
+            "document_texts": sorted(texts.values()),
+            "sentences": sorted(
+                (sentence(_id), begin, end, texts[str(text)][int(begin):int(end)], str(flag))
+                for _id, begin, end, text, flag in connection.execute(
+                    "SELECT id, begin, end, document_text, has_annotation FROM sentences")),
+            "summary": sorted(
+                (sentence(s), annotators[str(a)], types[str(t)], count) for s, a, t, count in connection.execute(
+                    "SELECT sentence, annotator, type, count FROM sentence_annotation_summary")),
+            "manifest": sorted(
+                (path, content_hash, documents[str(d)], annotators[str(a)]) for path, content_hash, d, a in
+                connection.execute("SELECT id, hash, document, annotator FROM ingest_manifest"))
+        }
+        for entity_table in database_info.get(DatabaseCategories.entities, {}).keys():
+            # "doc-annotator-T12": the brat id is kept
+            contents[entity_table.lower()] = sorted(
+                (annotators[str(a)], _id.split("-", 2)[2], begin, end, sentence(s), types[str(t)])
+                for _id, a, begin, end, s, t in connection.execute(
+                    "SELECT id, annotator, begin, end, sentence, type FROM {0}".format(entity_table.lower())))
+        return contents
+    finally:
+        connection.close()
+
+
+@unittest.skipIf(compact_schema, "the rows are compared by their composite text ids")
+class IncrementalIngestionTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.project = pathlib.Path(self.folder.name, "project")
+        shutil.copytree(RESOURCES / "test-resources", self.project)
+        self.db_file = os.path.join(self.folder.name, "incremental.db")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def change_files(self):
+        # edits an annotation of a document, deletes the annotation file of another one (which drops that
+        # document) and adds a new document
+        ann_file = self.project / "anno02" / "01.ann"
+        ann_file.write_text(ann_file.read_text(encoding='utf-8').replace(
+            "Medication 29 42\tan annotation", "Medication 32 42\tannotation"), encoding='utf-8')
+        (self.project / "anno03" / "02.ann").unlink()
+        for annotator in ["anno01", "anno02", "anno03", "anno04"]:
+            for suffix in [".ann", ".txt"]:
+                shutil.copy(self.project / annotator / ("01" + suffix), self.project / annotator / ("03" + suffix))
+
+    def assert_equals_full_ingestion(self, allow_disp_sent: bool):
+        ingest_brat(self.project, self.db_file, allow_disp_sent=allow_disp_sent, incremental=True)
+        full_db_file = os.path.join(self.folder.name, "full.db")
+        ingest_brat(self.project, full_db_file, allow_disp_sent=allow_disp_sent)
+        incremental, full = _table_contents(self.db_file), _table_contents(full_db_file)
+        self.assertGreater(len(full["sentences"]), 0)
+        self.assertEqual(incremental, full)
+
+    def test_changed_files(self):
+        for allow_disp_sent in [False, True]:
+            with self.subTest(allow_disp_sent=allow_disp_sent):
+                self.tearDown()
+                self.setUp()
+                ingest_brat(self.project, self.db_file, allow_disp_sent=allow_disp_sent)
+                self.change_files()
+                self.assert_equals_full_ingestion(allow_disp_sent)
+
+    def test_first_annotator_changes(self):
+        ingest_brat(self.project, self.db_file)
+        self.change_files()
+        # the shared sentences were taken from the files of "anno01"
+        shutil.rmtree(self.project / "anno01")
+        self.assert_equals_full_ingestion(allow_disp_sent=False)
+
+    def test_first_annotator_is_added(self):
+        ingest_brat(self.project, self.db_file)
+        shutil.copytree(self.project / "anno02", self.project / "anno00")
+        self.assert_equals_full_ingestion(allow_disp_sent=False)
+
+    @unittest.skipUnless(hasattr(signal, "SIGKILL"), "needs SIGKILL")
+    def test_killed_ingestion_is_resumed(self):
+        ingest_brat(self.project, self.db_file)
+        self.change_files()
+        killed = subprocess.run([sys.executable, "-c", KILLED_INGESTION, str(self.project), self.db_file, "3"],
+                                cwd=REPOSITORY, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.assertEqual(killed.returncode, -signal.SIGKILL)
+        connection = sqlite3.connect(self.db_file)
+        try:
+            self.assertEqual(connection.execute("PRAGMA integrity_check").fetchone()[0], "ok")
+            # the pairs that were committed before the process was killed are kept
+            self.assertGreater(connection.execute("SELECT COUNT(*) FROM ingest_manifest WHERE id LIKE '%/03.ann'")
+                               .fetchone()[0], 0)
+        finally:
+            connection.close()
+        self.assert_equals_full_ingestion(allow_disp_sent=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
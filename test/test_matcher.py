@@ -0,0 +1,96 @@
+import random
+import sqlite3
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from agreement import TokenAgreement
+from agreement.corpus import CorpusAgreement
+from agreement.matcher import Spans, matching_pairs, same_sentence_pairs
+
+
+def _spans(rows: list) -> Spans:
+    # rows: (id, sentence, begin, end)
+    columns = list(zip(*rows)) if len(rows) > 0 else [()] * 4
+    return Spans(id=np.array(columns[0], dtype=object), sentence=np.array(columns[1], dtype=object),
+                 begin=np.array(columns[2], dtype=np.int64), end=np.array(columns[3], dtype=np.int64))
+
+
+def _naive_matches(a: list, b: list) -> set:
+    # the containment test of `TokenAgreement._same_sentence_query` for every pair of the same sentence
+    def inside(x, y):
+        return y[2] <= x[2] <= y[3] and y[2] <= x[3] <= y[3]
+    return {(i, j) for i, x in enumerate(a) for j, y in enumerate(b)
+            if x[1] == y[1] and (inside(x, y) or inside(y, x))}
+
+
+def _random_rows(rng: random.Random, annotator: str, n_sentences: int, per_sentence: int) -> list:
+    rows = []
+    for s in range(n_sentences):
+        for k in range(rng.randint(0, per_sentence)):
+            begin = rng.randint(-8, 30)
+            rows.append(("{0}-{1}-{2}".format(annotator, s, k), "s{0}".format(s), begin,
+                         begin + rng.choice([0, 1, 3, 8, rng.randint(0, 40)])))
+    return rows
+
+
+def _token_db(rows: list) -> sqlite3.Connection:
+    # rows: (id, document, annotator, type, sentence, begin, end)
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE entities (id text PRIMARY KEY, document text, annotator text, type text, "
+                       "sentence text, begin integer, end integer)")
+    connection.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return connection
+
+
+class MatcherTest(unittest.TestCase):
+    def test_negative_begin_does_not_match_across_sentences(self):
+        a = _spans([("a", "s0", 0, 10)])
+        b = _spans([("b", "s1", -5, 3)])
+        index_a, index_b = matching_pairs(a, b)
+        self.assertEqual(len(index_a), 0)
+        self.assertEqual(len(index_b), 0)
+        self.assertEqual(len(same_sentence_pairs(a, b)[0]), 0)
+
+    def test_negative_begin_matches_in_same_sentence(self):
+        a = _spans([("a", "s1", -1, 10)])
+        b = _spans([("b", "s1", -1, 3), ("c", "s1", -3, 3), ("d", "s0", 0, 5)])
+        self.assertEqual(list(zip(*matching_pairs(a, b))), [(0, 0)])
+
+    def test_random_spans_against_naive_pairs(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            rows_a = _random_rows(rng, "0", 4, 6)
+            rows_b = _random_rows(rng, "1", 4, 6)
+            a, b = _spans(rows_a), _spans(rows_b)
+            expected = _naive_matches(rows_a, rows_b)
+            self.assertEqual(set(zip(*(x.tolist() for x in matching_pairs(a, b)))), expected)
+            index_a, index_b, matches = same_sentence_pairs(a, b)
+            pairs = list(zip(index_a.tolist(), index_b.tolist()))
+            self.assertEqual({p for p, m in zip(pairs, matches) if m}, expected)
+            self.assertEqual(Counter(pairs), Counter((i, j) for i, x in enumerate(rows_a)
+                                                     for j, y in enumerate(rows_b) if x[1] == y[1]))
+
+    def test_token_agreement_matcher_equals_sql(self):
+        rng = random.Random(11)
+        rows = [(i, "7", a, rng.choice("xy"), s, begin, end)
+                for a in "01" for i, s, begin, end in _random_rows(rng, a, 20, 6)]
+        connection = _token_db(rows)
+        for between in (True, False):
+            for types in (["x"], ["x", "y"]):
+                sql = TokenAgreement(["0", "1"], "7", connection, use_matcher=False)._same_sentence_rows(
+                    ["0", "1"], types, "entities", between)
+                matcher = TokenAgreement(["0", "1"], "7", connection)._same_sentence_rows(
+                    ["0", "1"], types, "entities", between)
+                self.assertEqual(Counter(sql), Counter(matcher))
+
+    def test_corpus_token_matches_stay_in_sentence(self):
+        connection = _token_db([("0-a", "7", "0", "x", "7-0", 0, 10), ("1-b", "7", "1", "x", "7-1", -5, 3)])
+        counts = CorpusAgreement(["7"], connection).token_counts("0", "1", "x", "entities")
+        self.assertEqual(counts.tp.tolist(), [0])
+        self.assertEqual(counts.errors.tolist(), [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import io
+import os
+import sys
+import sqlite3
+import subprocess
+import tempfile
+import time
+import threading
+import unittest
+
+from database.pool import ReadOnlyConnectionPool
+
+SAMPLE_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources", "test_project.db")
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# prints the growth of the peak memory (max. resident set size) while the database file is loaded, relative to its
+# size; the upload is read before the measurement starts
+PEAK_MEMORY_OF_LOAD = """
+import io, os, resource, sys
+from database.pool import ReadOnlyConnectionPool
+
+with open(sys.argv[1], 'rb') as db_file:
+    upload = io.BytesIO(db_file.read())
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+pool = ReadOnlyConnectionPool.from_image(upload)
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+assert pool.execute("SELECT COUNT(*) FROM t").fetchone()[0] == int(sys.argv[2])
+print((after - before) * 1024 / os.path.getsize(sys.argv[1]))  # <- ru_maxrss is in KiB on Linux
+"""
+
+
+def _in_thread(function):
+    # the result of `function` called in a new thread
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class FromImageTest(unittest.TestCase):
+    def setUp(self):
+        with open(SAMPLE_DATABASE, 'rb') as db_file:
+            self.image = db_file.read()
+        connection = sqlite3.connect("file:{0}?mode=ro".format(SAMPLE_DATABASE), uri=True)
+        self.sentences = connection.execute("SELECT COUNT(*) FROM sentences").fetchone()[0]
+        connection.close()
+
+    def assert_pool_has_sample(self, pool: ReadOnlyConnectionPool):
+        query = "SELECT COUNT(*) FROM sentences"
+        self.assertEqual(pool.execute(query).fetchone()[0], self.sentences)
+        # the connections of other threads share the in-memory database
+        self.assertEqual(_in_thread(lambda: pool.execute(query).fetchone()[0]), self.sentences)
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.execute("DELETE FROM sentences")
+
+    def test_bytes_upload(self):
+        pool = ReadOnlyConnectionPool.from_image(io.BytesIO(self.image))
+        try:
+            self.assert_pool_has_sample(pool)
+        finally:
+            pool.close()
+
+    def test_file_object(self):
+        with open(SAMPLE_DATABASE, 'rb') as db_file:
+            pool = ReadOnlyConnectionPool.from_image(db_file)
+        try:
+            self.assert_pool_has_sample(pool)
+        finally:
+            pool.close()
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "ru_maxrss is measured in KiB on Linux only")
+    def test_peak_memory_of_load(self):
+        # the image is held once by the upload and once by the shared in-memory database, not a third time
+        with tempfile.TemporaryDirectory() as folder:
+            db_file = os.path.join(folder, "large.db")
+            connection = sqlite3.connect(db_file)
+            connection.execute("CREATE TABLE t (id integer PRIMARY KEY, b blob)")
+            connection.executemany("INSERT INTO t (b) VALUES (randomblob(4000))", [()] * 10000)
+            connection.commit()
+            connection.close()
+            result = subprocess.run([sys.executable, "-c", PEAK_MEMORY_OF_LOAD, db_file, "10000"], cwd=REPOSITORY,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        self.assertLess(float(result.stdout.decode().strip()), 1.5)
+
+    def test_not_a_database(self):
+        with self.assertRaises(sqlite3.DatabaseError):
+            ReadOnlyConnectionPool.from_image(io.BytesIO(b"no database" * 100))
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ReadOnlyConnectionPool(SAMPLE_DATABASE, immutable=True, idle_timeout=60)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_connection_per_thread(self):
+        connection = self.pool.connection()
+        self.assertIs(self.pool.connection(), connection)
+        other = _in_thread(self.pool.connection)
+        self.assertIsNot(other, connection)
+        self.assertEqual(self.pool.size, 2)
+        # the connections are read-only
+        with self.assertRaises(sqlite3.OperationalError):
+            self.pool.execute("CREATE TABLE t (id integer)")
+
+    def test_idle_connections_are_closed(self):
+        other = _in_thread(self.pool.connection)
+        self.pool.connection()
+        self.pool.close_idle()
+        self.assertEqual(self.pool.size, 2)
+        self.pool._idle_timeout = 0
+        time.sleep(0.01)
+        # the connection of the calling thread is kept when another one is handed out
+        self.pool.connection()
+        self.assertEqual(self.pool.size, 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            other.execute("SELECT 1")
+
+    def test_checked_out_connection_is_not_closed(self):
+        checked_out, release = threading.Event(), threading.Event()
+        result = []
+
+        def long_use():
+            with self.pool.checkout() as connection:
+                checked_out.set()
+                release.wait()
+                result.append(connection.execute("SELECT COUNT(*) FROM sentences").fetchone()[0])
+
+        thread = threading.Thread(target=long_use)
+        thread.start()
+        try:
+            checked_out.wait()
+            self.pool._idle_timeout = 0
+            time.sleep(0.01)
+            self.pool.close_idle()
+            self.assertEqual(self.pool.size, 1)
+        finally:
+            release.set()
+            thread.join()
+        self.assertGreater(result[0], 0)
+        # once returned, the connection is idle again
+        time.sleep(0.01)
+        self.pool.close_idle()
+        self.assertEqual(self.pool.size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
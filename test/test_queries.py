@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app_constants import layers
+from database.database import ingest_brat
+from database.queries import QueryRepository, STATEMENTS, database_layout, statements_for_layout
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+SAMPLE_DATABASES = [os.path.join(RESOURCES, "test_project.db"), os.path.join(RESOURCES, "test_deid.db"),
+                    os.path.join(RESOURCES, "backup_deid.db")]
+# the WebAnno sample was built before `document_texts` and `sentence_annotation_summary`
+LEGACY_SAMPLE_DATABASE = os.path.join(os.path.dirname(RESOURCES), "uima-test-resources", "test_project.db")
+
+
+def _legacy_db() -> sqlite3.Connection:
+    # the layout of databases built before `document_texts` and `sentence_annotation_summary`
+    connection = sqlite3.connect(":memory:")
+    connection.executescript("""
+        CREATE TABLE annotators (id integer PRIMARY KEY, annotator text);
+        CREATE TABLE documents (id integer PRIMARY KEY, document text);
+        CREATE TABLE layers (id integer PRIMARY KEY, layer text);
+        CREATE TABLE annotation_types (id integer PRIMARY KEY, type text, layer integer);
+        CREATE TABLE sentences (id text PRIMARY KEY, begin integer, end integer, text text, document integer);
+        CREATE TABLE entities (id text PRIMARY KEY, annotator integer, begin integer, end integer, sentence text,
+                               document integer, type integer);
+        INSERT INTO documents VALUES (1, 'doc');
+        INSERT INTO sentences VALUES ('1-1', 6, 12, 'second', 1), ('1-0', 0, 5, 'first', 1);
+        INSERT INTO entities VALUES ('a', 0, 0, 3, '1-1', 1, 4), ('b', 1, 0, 3, '1-1', 1, 5);
+        """)
+    return connection
+
+
+class DatabaseLayoutTest(unittest.TestCase):
+    def test_legacy_layout_reads_sentence_texts(self):
+        connection = _legacy_db()
+        layout = database_layout(connection)
+        self.assertFalse(layout.document_texts)
+        queries = QueryRepository(connection, statements_for_layout(layout))
+        self.assertEqual(queries.execute("sentences_for_document", (1,), sentence_key="id"),
+                         [("1-0", 0, 5, "first"), ("1-1", 6, 12, "second")])
+
+    def test_other_database_is_rejected(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE sentences (id text PRIMARY KEY)")
+        with self.assertRaises(ValueError):
+            database_layout(connection)
+
+    def test_legacy_layout_reads_entity_tables(self):
+        connection = _legacy_db()
+        layout = database_layout(connection)
+        self.assertFalse(layout.annotation_summary)
+        queries = QueryRepository(connection, statements_for_layout(layout))
+        self.assertEqual(sorted(queries.column("annotation_types_for_document", (1,), table="entities")), [4, 5])
+        self.assertEqual(queries.column("sentences_with_annotation_type", (1, 5), sentence_key="id",
+                                        table="entities"), ["1-1"])
+
+    def test_new_database_has_current_layout(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_file = os.path.join(folder, "test_project.db")
+            ingest_brat(os.path.join(RESOURCES, "test-resources"), db_file)
+            connection = sqlite3.connect(db_file)
+            try:
+                layout = database_layout(connection)
+                self.assertTrue(layout.document_texts)
+                self.assertTrue(layout.annotation_summary)
+                # the summary gives what the legacy statements read from the entity tables
+                queries = QueryRepository(connection, STATEMENTS)
+                legacy = QueryRepository(connection, statements_for_layout(layout._replace(annotation_summary=False)))
+                tables = [table for table, layer in layers.items() if layer in ["entities", "events"]]
+                for doc_id in queries.column("document_rows"):
+                    types = queries.column("annotation_types_for_document", (doc_id,))
+                    self.assertEqual(sorted(types), sorted({t for table in tables for t in legacy.column(
+                        "annotation_types_for_document", (doc_id,), table=table)}))
+                    for type_id in types:
+                        self.assertEqual(
+                            sorted(queries.column("sentences_with_annotation_type", (doc_id, type_id),
+                                                  sentence_key="id")),
+                            sorted(s for table in tables for s in legacy.column(
+                                "sentences_with_annotation_type", (doc_id, type_id), sentence_key="id",
+                                table=table)))
+            finally:
+                connection.close()
+
+    def test_sample_databases_have_their_layout(self):
+        for db_file, layout in [(db_file, (True, True)) for db_file in SAMPLE_DATABASES] + \
+                [(LEGACY_SAMPLE_DATABASE, (False, False))]:
+            connection = sqlite3.connect("file:{0}?mode=ro".format(db_file), uri=True)
+            try:
+                self.assertEqual(tuple(database_layout(connection)), layout, db_file)
+            finally:
+                connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
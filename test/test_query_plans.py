@@ -0,0 +1,32 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from benchmark.query_plans import check_query_plans, hot_queries
+from database.database import ingest_brat
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brat-test-resources")
+
+
+class QueryPlansTest(unittest.TestCase):
+    def test_hot_queries_use_indices(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_file = os.path.join(folder, "test_project.db")
+            ingest_brat(os.path.join(RESOURCES, "test-resources"), db_file)
+            # with the `ANALYZE` statistics of a handful of rows a scan is the cheaper plan; without them the planner
+            # chooses by the indices of the schema, which is what is checked here
+            connection = sqlite3.connect(db_file)
+            connection.execute("DROP TABLE IF EXISTS sqlite_stat1;")
+            connection.commit()
+            connection.close()
+            connection = sqlite3.connect(db_file)
+            try:
+                self.assertGreater(len(hot_queries(connection)), 0)
+                self.assertEqual(check_query_plans(connection, verbose=False), [])
+            finally:
+                connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
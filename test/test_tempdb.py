@@ -0,0 +1,87 @@
+import io
+import os
+import time
+import tempfile
+import unittest
+
+from database.tempdb import TempDatabaseManager
+
+
+def _image(content: bytes) -> io.BytesIO:
+    return io.BytesIO(content)
+
+
+class TempDatabaseManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.manager = TempDatabaseManager(self.folder.name, quota=250)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _age(self, db_file, seconds: float):
+        # sets the last access of a database back by `seconds`
+        mtime = time.time() - seconds
+        os.utime(db_file, (mtime, mtime))
+
+    def test_same_content_is_stored_once(self):
+        first = self.manager.acquire("a", _image(b"1" * 100))
+        second = self.manager.acquire("b", _image(b"1" * 100))
+        self.assertEqual(first, second)
+        self.assertEqual(first.read_bytes(), b"1" * 100)
+        self.assertEqual(self.manager.usage(), 100)
+        self.assertEqual(self.manager.touch("b"), first)
+
+    def test_least_recently_used_database_is_evicted(self):
+        old = self.manager.acquire("a", _image(b"1" * 100))
+        recent = self.manager.acquire("b", _image(b"2" * 100))
+        self._age(old, 20)
+        self._age(recent, 10)
+        self.manager.release("a")
+        self.manager.release("b")
+        new = self.manager.acquire("c", _image(b"3" * 100))
+        self.assertFalse(old.exists())
+        self.assertTrue(recent.exists())
+        self.assertTrue(new.exists())
+        self.assertLessEqual(self.manager.usage(), self.manager.quota)
+        self.assertIsNone(self.manager.touch("a"))
+
+    def test_held_databases_are_not_evicted(self):
+        held = self.manager.acquire("a", _image(b"1" * 100))
+        released = self.manager.acquire("b", _image(b"2" * 100))
+        self._age(held, 20)
+        self.manager.release("b")
+        self.manager.acquire("c", _image(b"3" * 100))
+        self.assertTrue(held.exists())
+        self.assertFalse(released.exists())
+        self.assertEqual(self.manager.touch("a"), held)
+
+    def test_quota_is_exceeded_only_by_held_databases(self):
+        files = [self.manager.acquire(session, _image(content * 100)) for session, content in
+                 [("a", b"1"), ("b", b"2"), ("c", b"3")]]
+        self.assertTrue(all(db_file.exists() for db_file in files))
+        self.assertGreater(self.manager.usage(), self.manager.quota)
+        self.assertFalse(self.manager.fits(251))
+        self.assertTrue(self.manager.fits(250))
+
+    def test_acquire_releases_the_previous_database(self):
+        first = self.manager.acquire("a", _image(b"1" * 100))
+        self._age(first, 20)
+        self.manager.acquire("a", _image(b"2" * 100))
+        self.manager.acquire("b", _image(b"3" * 100))
+        self.assertFalse(first.exists())
+
+    def test_hold_expires(self):
+        manager = TempDatabaseManager(self.folder.name, quota=250, hold_timeout=0.05)
+        expired = manager.acquire("a", _image(b"1" * 100))
+        self._age(expired, 20)
+        time.sleep(0.1)
+        held = manager.acquire("b", _image(b"2" * 100))
+        manager.acquire("c", _image(b"3" * 100))
+        self.assertFalse(expired.exists())
+        self.assertTrue(held.exists())
+        self.assertIsNone(manager.touch("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
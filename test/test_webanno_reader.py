@@ -0,0 +1,94 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from uima import WebAnnoProjectReader
+
+SAMPLE_PROJECT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uima-test-resources", "test_project.zip")
+
+
+def _spooled_index(project_file: str) -> dict:
+    # `dict((document_name, annotator_name): (path, size, crc))` read from the fully decompressed inner archives
+    index = {}
+    with zipfile.ZipFile(project_file) as zfile:
+        for info in zfile.infolist():
+            if not info.filename.endswith(".zip"):
+                continue
+            doc = info.filename.split("/")[1]
+            with zipfile.ZipFile(io.BytesIO(zfile.read(info))) as inner_zfile:
+                for inner_info in inner_zfile.infolist():
+                    if inner_info.filename != "TypeSystem.xml":
+                        index[(os.path.splitext(doc)[0], os.path.splitext(inner_info.filename)[0])] = (
+                            "annotation/{0}/{1}".format(doc, inner_info.filename), inner_info.file_size,
+                            "{:08x}".format(inner_info.CRC))
+    return index
+
+
+def _inner_archive(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as inner_zfile:
+        for name, content in members.items():
+            inner_zfile.writestr(name, content)
+    return buffer.getvalue()
+
+
+class WebAnnoProjectReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        # one inner archive holds the XMI files of two annotators (and is larger than the tail read for its index
+        # in `test_inner_archives_are_decompressed_once`)
+        self.project_file = os.path.join(self.folder.name, "project.zip")
+        self.xmi = {("doc1", "anno1"): b"<xmi 1/>" * 1000, ("doc1", "anno2"): os.urandom(300000),
+                    ("doc2", "anno1"): b"<xmi 3/>"}
+        with zipfile.ZipFile(self.project_file, 'w', compression=zipfile.ZIP_DEFLATED) as zfile:
+            zfile.writestr("annotation/doc1.txt/export1.zip", _inner_archive(
+                {"anno1.xmi": self.xmi[("doc1", "anno1")], "anno2.xmi": self.xmi[("doc1", "anno2")],
+                 "TypeSystem.xml": b"<typeSystem/>"}))
+            zfile.writestr("annotation/doc2.txt/export2.zip", _inner_archive(
+                {"anno1.xmi": self.xmi[("doc2", "anno1")], "TypeSystem.xml": b"<typeSystem/>"}))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_index_equals_index_of_decompressed_archives(self):
+        for project_file in [SAMPLE_PROJECT, self.project_file]:
+            for tail_size in [WebAnnoProjectReader.INDEX_TAIL_SIZE, 1000, 10]:
+                with self.subTest(project_file=project_file, tail_size=tail_size), \
+                        mock.patch.object(WebAnnoProjectReader, "INDEX_TAIL_SIZE", tail_size):
+                    reader = WebAnnoProjectReader(project_file)
+                    self.assertEqual({pair: (path, size, crc) for pair, (path, size, _, crc) in
+                                      reader.manifest.items()}, _spooled_index(project_file))
+                    self.assertEqual(set(reader.pairs()), set(reader.manifest.keys()))
+                    self.assertTrue(reader.type_system().read().startswith(b"<"))
+
+    def test_inner_archives_are_decompressed_once(self):
+        opened = []
+        open_inner_zip = WebAnnoProjectReader._open_inner_zip.__func__
+
+        def count_open(cls, zfile, member):
+            opened.append(member)
+            return open_inner_zip(cls, zfile, member)
+
+        with mock.patch.object(WebAnnoProjectReader, "_open_inner_zip", classmethod(count_open)), \
+                mock.patch.object(WebAnnoProjectReader, "INDEX_TAIL_SIZE", 1000):
+            reader = WebAnnoProjectReader(self.project_file)
+            self.assertEqual(opened, [])
+            xmi = {(doc, anno): stream.read() for doc, anno, stream in reader.iter_xmi()}
+            self.assertEqual(xmi, self.xmi)
+            self.assertEqual(sorted(opened), ["annotation/doc1.txt/export1.zip", "annotation/doc2.txt/export2.zip"])
+            opened.clear()
+            # only the inner archives of the requested pairs are decompressed
+            self.assertEqual([(doc, anno) for doc, anno, _ in reader.iter_xmi({("doc2", "anno1")})],
+                             [("doc2", "anno1")])
+            self.assertEqual(opened, ["annotation/doc2.txt/export2.zip"])
+
+    def test_iter_xmi_follows_pairs(self):
+        reader = WebAnnoProjectReader(SAMPLE_PROJECT)
+        self.assertEqual([(doc, anno) for doc, anno, _ in reader], reader.pairs())
+
+
+if __name__ == "__main__":
+    unittest.main()
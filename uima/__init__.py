@@ -1,3 +1,4 @@
 from .uima import WebAnnoLayer
 from .deserialize import get_project_files
+from .deserialize import WebAnnoProjectReader
 from .deserialize import get_layer_information_from_type_system
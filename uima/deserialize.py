@@ -1,7 +1,12 @@
 import os
 import zipfile
+import datetime
 import io
 import typing
+import shutil
+import tempfile
+import contextlib
+import itertools
 import logging
 from xmltodict3 import xml_to_dict
 from collections import defaultdict
@@ -77,41 +82,185 @@ class WebAnnoLayerType:
             self._source = source
 
 
+class WebAnnoProjectReader:
+    """
+    Lazy reader for WebAnno project exports. Documents and annotators are listed from the index of the outer zip
+    archive and the central directories of the inner ones; an inner archive is only decompressed as a whole when
+    its XMI files are iterated, once for all the XMI files it holds, so that the memory needed stays at about one
+    CAS regardless of the size of the project.
+    """
+    SPOOL_MAX_SIZE = 64 * 1024 * 1024
+    # bytes at the end of an inner archive that are read for its central directory
+    INDEX_TAIL_SIZE = 1024 * 1024
+
+    def __init__(self, zipped_file: str, type_system: str = WebAnnoExport.TYPE_SYSTEM):
+        self._zipped_file = zipped_file
+        self._type_system = type_system
+        self._documents = dict()
+        self._annotators = dict()
+        self._members = defaultdict(dict)
+        self._manifest = dict()
+        self._type_system_member = None
+        if zipfile.is_zipfile(zipped_file):
+            self._read_index()
+
+    @property
+    def documents(self) -> typing.Dict[str, str]:
+        """
+        :return: `dict(document_name: document_id)` in the order of the export
+        """
+        return self._documents
+
+    @property
+    def annotators(self) -> typing.Dict[str, str]:
+        """
+        :return: `dict(annotator_name: annotator_id)` in the order of the export
+        """
+        return self._annotators
+
+    @property
+    def manifest(self) -> typing.Dict[typing.Tuple[str, str], typing.Tuple[str, int, int, str]]:
+        """
+        :return: `dict((document_name, annotator_name): (path, size, mtime, crc))` of all XMI files
+        """
+        return self._manifest
+
+    def __len__(self) -> int:
+        return len(self._manifest)
+
+    @classmethod
+    def _open_inner_zip(cls, zfile: zipfile.ZipFile, member: str) -> zipfile.ZipFile:
+        # the inner archive is copied to a spooled file: it stays in memory while it is small and needs to be
+        # decompressed only once (seeking in the compressed member would decompress it again on every seek)
+        spool = tempfile.SpooledTemporaryFile(max_size=cls.SPOOL_MAX_SIZE)
+        with zfile.open(member) as inner_stream:
+            shutil.copyfileobj(inner_stream, spool)
+        spool.seek(0)
+        return zipfile.ZipFile(spool, 'r')
+
+    @classmethod
+    def _inner_infolist(cls, zfile: zipfile.ZipFile, info: zipfile.ZipInfo) -> typing.List[zipfile.ZipInfo]:
+        # the central directory of an inner archive, read from the last `INDEX_TAIL_SIZE` bytes of the archive (the
+        # bytes before them are skipped, a compressed member is decompressed without being kept); the offsets of
+        # the entries are relative to the tail and not used
+        with zfile.open(info) as inner_stream:
+            inner_stream.seek(max(0, info.file_size - cls.INDEX_TAIL_SIZE))
+            tail = inner_stream.read()
+        try:
+            with zipfile.ZipFile(io.BytesIO(tail), 'r') as tail_zfile:
+                return tail_zfile.infolist()
+        except zipfile.BadZipFile:
+            logging.info("The central directory of '{0}' is larger than the tail that was read".format(info.filename))
+            with cls._open_inner_zip(zfile, info.filename) as inner_zfile:
+                return inner_zfile.infolist()
+
+    def _read_index(self) -> None:
+        with zipfile.ZipFile(self._zipped_file, 'r') as zfile:
+            for info in zfile.infolist():
+                z = info.filename
+                if not (z.startswith(WebAnnoExport.ROOT) and z.endswith(WebAnnoExport.ZIP_ENDING)):
+                    continue
+                root, doc, zip_name = z.split("/")
+                doc_name = os.path.splitext(doc)[0]
+                self._documents.setdefault(doc_name, str(len(self._documents)))
+                for inner_info in self._inner_infolist(zfile, info):
+                    inner_z = inner_info.filename
+                    if inner_z == self._type_system:
+                        if self._type_system_member is None:
+                            self._type_system_member = (z, inner_z)
+                        continue
+                    anno_name = os.path.splitext(inner_z)[0]
+                    self._annotators.setdefault(anno_name, str(len(self._annotators)))
+                    self._members[doc_name][anno_name] = (z, inner_z)
+                    self._manifest[(doc_name, anno_name)] = \
+                        _manifest_info("{}{}/{}".format(WebAnnoExport.ROOT, doc, inner_z), inner_info)
+
+    @property
+    def zipped_file(self) -> str:
+        return self._zipped_file
+
+    def member(self, doc_name: str, anno_name: str) -> typing.Tuple[str, str]:
+        """
+        :return: the names of the inner zip archive and of the XMI file in it for one (document, annotator) pair
+        """
+        return self._members[doc_name][anno_name]
+
+    @classmethod
+    @contextlib.contextmanager
+    def open_member(cls, zfile: zipfile.ZipFile, member: typing.Tuple[str, str]) -> typing.Iterator[typing.IO[bytes]]:
+        """
+        Opens the XMI file `member` (as returned by `member`) of the already opened project export `zfile`.
+        """
+        outer, inner = member
+        with cls._open_inner_zip(zfile, outer) as inner_zfile, inner_zfile.open(inner) as xmi:
+            yield xmi
+
+    def type_system(self) -> typing.Union[io.BytesIO, None]:
+        """
+        :return: the first type system file found in the export
+        """
+        if self._type_system_member is None:
+            return None
+        outer, inner = self._type_system_member
+        with zipfile.ZipFile(self._zipped_file, 'r') as zfile, self._open_inner_zip(zfile, outer) as inner_zfile:
+            return io.BytesIO(inner_zfile.read(inner))
+
+    def pairs(self) -> typing.List[typing.Tuple[str, str]]:
+        """
+        :return: all `(document_name, annotator_name)` pairs that have an XMI file, in the order of `iter_xmi`
+        """
+        return [(doc_name, anno_name) for doc_name, anno_members in self._members.items() for anno_name in anno_members]
+
+    def iter_xmi(self, pairs: typing.Union[typing.Set[typing.Tuple[str, str]], None] = None) \
+            -> typing.Iterator[typing.Tuple[str, str, typing.IO[bytes]]]:
+        """
+        Yields `(document_name, annotator_name, xmi_stream)` one at a time. A stream is only valid until
+        the next one is requested. Every inner archive is decompressed once for the XMI files of it that are
+        requested (the members of an inner archive follow each other in `pairs`).
+
+        :param pairs: if given, only these `(document_name, annotator_name)` pairs are opened
+        :return:
+        """
+        members = [(doc_name, anno_name, member) for doc_name, anno_members in self._members.items()
+                   for anno_name, member in anno_members.items()
+                   if pairs is None or (doc_name, anno_name) in pairs]
+        with zipfile.ZipFile(self._zipped_file, 'r') as zfile:
+            for outer, outer_members in itertools.groupby(members, key=lambda m: m[2][0]):
+                with self._open_inner_zip(zfile, outer) as inner_zfile:
+                    for doc_name, anno_name, (_, inner) in outer_members:
+                        with inner_zfile.open(inner) as xmi:
+                            yield doc_name, anno_name, xmi
+
+    def __iter__(self):
+        return self.iter_xmi()
+
+
 def get_project_files(zipped_file: str, type_system: str = "TypeSystem.xml")\
         -> typing.Dict[str, typing.Union[typing.Dict[str, io.BytesIO], io.BytesIO]]:
+    """
+    Reads the whole project export into memory; use `WebAnnoProjectReader` to read one XMI at a time.
+    """
     xmi_dict = defaultdict(dict)
-    doc_dict = dict()
-    anno_dict = dict()
-    anno_id = 0
-    doc_id = 0
-    type_system_file = None
-    if zipfile.is_zipfile(zipped_file):
-        with zipfile.ZipFile(zipped_file, 'r') as zfile:
-            for z in zfile.namelist():
-                if z.startswith(WebAnnoExport.ROOT) and z.endswith(WebAnnoExport.ZIP_ENDING):
-                    root, doc, zip_name = z.split("/")
-                    doc_name = os.path.splitext(doc)[0]
-                    if doc_name not in doc_dict.keys():
-                        doc_dict[doc_name] = str(doc_id)
-                        doc_id += 1
-                    inner_zip = io.BytesIO(zfile.read(z))
-                    with zipfile.ZipFile(inner_zip, 'r') as inner_zfile:
-                        for inner_z in inner_zfile.namelist():
-                            if inner_z == type_system:
-                                if type_system_file is None:
-                                    type_system_file = io.BytesIO(inner_zfile.read(inner_z))
-                                continue
-                            anno_name = os.path.splitext(inner_z)[0]
-                            if anno_name not in anno_dict.keys():
-                                anno_dict[anno_name] = str(anno_id)
-                                anno_id += 1
-                            xmi_dict[doc_name][anno_name] = io.BytesIO(inner_zfile.read(inner_z))
-    xmi_dict[type_system] = type_system_file
-    xmi_dict["documents"] = doc_dict
-    xmi_dict["annotators"] = anno_dict
+    reader = WebAnnoProjectReader(zipped_file, type_system)
+    for doc_name, anno_name, xmi in reader:
+        xmi_dict[doc_name][anno_name] = io.BytesIO(xmi.read())
+    xmi_dict[type_system] = reader.type_system()
+    xmi_dict["documents"] = reader.documents
+    xmi_dict["annotators"] = reader.annotators
+    xmi_dict["manifest"] = reader.manifest
     return xmi_dict
 
 
+def _manifest_info(path: str, info: zipfile.ZipInfo) -> typing.Tuple[str, int, int, str]:
+    """
+    Describes an XMI file by what the zip index already knows about it (no decompression needed).
+    The random name of the inner zip archive is not part of `path`, so the path stays the same between exports.
+
+    :return: path, size, modification time (in seconds) and the CRC-32 of the content as hex string
+    """
+    return path, info.file_size, int(datetime.datetime(*info.date_time).timestamp()), "{:08x}".format(info.CRC)
+
+
 def resolve_relations(annotation: WebAnnoLayerType,
                       annotations: Dict[str, WebAnnoLayerType], relations: Dict[str, WebAnnoLayerType]):
     for feat_name, feat in annotation.features.items():